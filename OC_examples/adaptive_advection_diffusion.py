@@ -0,0 +1,76 @@
+import sys
+import time
+from functools import partial
+from fem1d.mesh import Mesh
+from fem1d.adaptivity import AdaptiveSolver
+from fem1d.coefficients import Constant
+from advection_diffusion import u_exact, qoiFunc, read_config
+
+
+#
+# Discussion:
+#
+#   Solves the advection-diffusion case of advection_diffusion.py on a
+#   mesh adapted to the QoI instead of a uniform mesh of NELEM elements.
+#
+#   Starting from a uniform mesh of NELEM elements, the elements with the
+#   largest contributions to the VMS error estimate of the QoI are
+#   bisected until the estimate is below TOLERANCE or the mesh would have
+#   more than MAX_DOFS nodes. The configuration file takes the keys of
+#   advection_diffusion.py plus
+#
+#     TOLERANCE = 1e-6
+#     MAX_DOFS = 100000
+#     COARSEN_FRACTION = 0.5
+#
+#   Usage:
+#
+#     python adaptive_advection_diffusion.py case.cfg
+#
+
+
+def main(NELEM, VELOCITY, DIFFUSION, REACTION, SOURCE, TOLERANCE=1e-6,
+         MAX_DOFS=100000, COARSEN_FRACTION=0.5):
+
+    start = time.time()
+
+    x_left = 0
+    x_right = 1
+    L = x_right - x_left
+
+    solver = AdaptiveSolver(
+        Mesh.uniform_grid(x_left, x_right, int(NELEM)),
+        Constant(DIFFUSION), Constant(REACTION), Constant(VELOCITY),
+        Constant(SOURCE), 1, 0.0, 0.0,
+        partial(qoiFunc, L=L), partial(u_exact, lam=VELOCITY, nu=DIFFUSION),
+        tolerance=TOLERANCE, max_dofs=int(MAX_DOFS),
+        coarsen_fraction=COARSEN_FRACTION)
+    history = solver.solve()
+
+    print("")
+    print("  Iter     NELEM     NDOFS     QoI_VMS           Error_est     Indicators    Refined   Coarsened")
+    print("")
+    for iteration, step in enumerate(history):
+        print("  {:4d}  {:8d}  {:8d}  {:16.12f}  {:12.4e}  {:12.4e}  {:8d}  {:8d}".format(
+            iteration, step.num_elements, step.num_dofs, step.value,
+            step.error_est, step.indicator_sum, step.refined, step.coarsened))
+
+    qoi = solver.qoi
+    print("")
+    print(' Quantity of Interest values')
+    print(' ===========================')
+    print(' VMS:        ', qoi.value)
+    print(' Exact:      ', qoi.value_exact)
+    print(' Error_VMS:  ', abs(qoi.value_exact - qoi.value))
+    print(' Error_est:  ', abs(qoi.error_est))
+    print(' Elements:   ', solver.mesh.num_elements)
+    print(' Smallest h: ', solver.mesh.h.min())
+    print(' Time:       ', time.time() - start)
+
+
+if __name__ == '__main__':
+
+    filename = sys.argv[1]
+    dictionary = read_config(filename)
+
+    main(**dictionary)
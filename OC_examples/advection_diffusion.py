@@ -1,49 +1,115 @@
 import sys
 import math
+import time
 import numpy as np
-import matplotlib.pyplot as plt
+from functools import partial
 from fem1d.mesh import Mesh
 from fem1d.model import Model
 from fem1d.vms_model import VMSModel
 from fem1d.qoi import QoI
+from fem1d.coefficients import Constant
+from fem1d.plotting import plot_solution
 
 
-def p(x):
-    x = np.asarray(x)
-    return nu * np.ones_like(x)
+# The physical parameters are passed explicitly rather than through
+# module globals, so that several cases can be solved in the same process
+# or sent to worker processes. The coefficients are declared Constant, so
+# the models use closed-form element matrices; the exact solution and the
+# QoI functional are bound with functools.partial.
 
+def u_exact(x, lam, nu):
 
-def q(x):
-    x = np.asarray(x)
-    return react * np.ones_like(x)
+    # y(x) = c1 + c2* exp(a*x) + x/b
+    # y(0) = 0 = c1 + c2 --> c1 =-c2
+    # y(1) = 0 = c2 ( exp(a*x) - 1 ) + 1/b --> c2 = 1 / (( 1 - exp(a)) * b)
 
+    # Written as ( exp(a*(x-1)) - exp(-a) ) / (( exp(-a) - 1 ) * b) + x/b,
+    # which equals c1 + c2 * exp(a*x) + x/b but does not overflow for
+    # large Peclet numbers.
 
-def r(x):
+    a = lam / nu
+    b = lam
+    return ( np.exp(a*(x-1.0)) - math.exp(-a) ) / (( math.exp(-a) - 1.0 ) * b) + x/b
+
+def qoiFunc(x, L):
     x = np.asarray(x)
-    return lam * np.ones_like(x)
+    return 1.0 / L * np.ones_like(x)
 
 
-def f(x):
-    x = np.asarray(x)
-    return source * np.ones_like(x)
+def solve_case(NELEM, VELOCITY, DIFFUSION, REACTION, SOURCE):
+    #
+    # Discussion:
+    #
+    #   Solves one case with the Galerkin and VMS models and returns
+    #   the models and a dictionary with the QoI values, errors and the
+    #   efficiency index of the VMS error estimator.
+    #
+
+    start = time.time()
+
+    # Mesh properties
+    num_elements = int(NELEM)
+    bc_type = 1
+    quadrature_points = 2
+    bc_left = 0.0
+    bc_right = 0.0
+    x_left = 0
+    x_right = 1
+    L = x_right - x_left
 
+    # Physical properties
+    lam = VELOCITY
+    nu = DIFFUSION
+    react = REACTION
+    source = SOURCE
 
-def u_exact(x):
+    p_case = Constant(nu)
+    q_case = Constant(react)
+    r_case = Constant(lam)
+    f_case = Constant(source)
+    exact = partial(u_exact, lam=lam, nu=nu)
+    functional = partial(qoiFunc, L=L)
 
-    # y(x) = c1 + c2* exp(a*x) + x/b
-    # y(0) = 0 = c1 + c2 --> c1 =-c2
-    # y(1) = 0 = c2 ( exp(a*x) - 1 ) + 1/b --> c2 = 1 / (( 1 - exp(a)) * b)
+    # Compute Peclet number
+    h = L / float(num_elements)
+    peclet = h * lam / (2.0 * nu)
 
-    a = lam / nu
-    b = lam
-    c2 = 1.0 / (( 1.0 - math.exp(a)) * b)
-    c1 = -c2
-    return c1 + c2 * np.exp(a*x) + x/b
+    # Create the mesh, the Galerkin and VMS models, and solve them.
+    mesh = Mesh.uniform_grid(x_left, x_right, num_elements)
+    gal_model = Model(mesh, p_case, q_case, r_case, f_case, bc_type, bc_left, bc_right, quadrature_points)
+    vms_model = VMSModel(mesh, p_case, q_case, r_case, f_case, bc_type, bc_left, bc_right, quadrature_points)
+    gal_model.solve()
+    vms_model.solve()
+
+    # Compute Quantity of Interest
+    qoi_gal = QoI(gal_model, functional, exact, 20)
+    qoi_vms = QoI(vms_model, functional, exact, 20)
+    qoi_gal.compute()
+    qoi_vms.compute()
+    qoi_vms.error_estimator()
+
+    error_gal = abs(qoi_gal.value_exact - qoi_gal.value)
+    error_vms = abs(qoi_vms.value_exact - qoi_vms.value)
+
+    results = {
+        "NELEM": num_elements,
+        "VELOCITY": lam,
+        "DIFFUSION": nu,
+        "REACTION": react,
+        "SOURCE": source,
+        "PECLET": peclet,
+        "QOI_GAL": float(qoi_gal.value),
+        "QOI_VMS": float(qoi_vms.value),
+        "QOI_EXACT": float(qoi_gal.value_exact),
+        "ERROR_GAL": float(error_gal),
+        "ERROR_VMS": float(error_vms),
+        "ERROR_EST": float(abs(qoi_vms.error_est)),
+        "EFFICIENCY": float(abs(qoi_vms.error_est) / error_vms) if error_vms > 0 else float("nan"),
+        "TIME": time.time() - start,
+    }
+
+    return gal_model, vms_model, results
 
-def qoiFunc(x):
-    x = np.asarray(x)
-    return 1.0 / L * np.ones_like(x)
-    
 
 def main(NELEM, VELOCITY, DIFFUSION, REACTION, SOURCE):
     #
@@ -77,111 +143,74 @@ def main(NELEM, VELOCITY, DIFFUSION, REACTION, SOURCE):
     #     c2 = 1 / (( 1 - exp( lambda / nu )) * lambda )
     #
 
-    # Initialize variables that define the problem.
-    # =============================================
-    # Mesh properties
-    num_elements = NELEM
-    bc_type = 1
-    quadrature_points = 2
-    bc_left = 0.0
-    bc_right = 0.0
-    x_left = 0
-    x_right = 1
-    global L
-    L = x_right - x_left
-
-    # Physical properties
-    global lam
-    global nu
-    global react
-    global source
-    lam = VELOCITY
-    nu = DIFFUSION
-    react = REACTION
-    source = SOURCE
-
-    # Compute Peclet number
-    h = L / float(num_elements)
-    peclet = h * lam / (2.0 * nu)
-    print 'The local Peclet number is: ', peclet
-
-    # Create the mesh object that describes the geometry of the problem.
-    # ==================================================================
-    mesh = Mesh.uniform_grid(x_left, x_right, num_elements)
-
-    # Create the Galerkin model object.
-    # =================================
-    gal_model = Model(mesh, p, q, r, f, bc_type, bc_left, bc_right, quadrature_points)
-    vms_model = VMSModel(mesh, p, q, r, f, bc_type, bc_left, bc_right, quadrature_points)
-
-    # Solve the Galerkin problem.
-    # ===========================
-    gal_model.solve()
-    vms_model.solve()
+    # Solve the Galerkin and VMS problems.
+    # =====================================
+    gal_model, vms_model, results = solve_case(NELEM, VELOCITY, DIFFUSION, REACTION, SOURCE)
+    mesh = gal_model.mesh
+    exact = partial(u_exact, lam=VELOCITY, nu=DIFFUSION)
+    print('The local Peclet number is: ', results["PECLET"])
 
     # Compute the exact solution
     # ==========================
-    u_e = u_exact(mesh.x)
+    u_e = exact(mesh.x)
     gal_error = np.abs(u_e - gal_model.u)
     vms_error = np.abs(u_e - vms_model.u)
     
-    # Compute Quantity of Interest
-    # ============================
-    qoi_gal = QoI(gal_model, qoiFunc, u_exact, 20)
-    qoi_vms = QoI(vms_model, qoiFunc, u_exact, 20)
-    qoi_gal.compute()
-    qoi_vms.compute()
-    qoi_vms.error_estimator()
-    
     # Print nodal error
     # =================
     '''
     print("")
     print("        X           U_Gal(X)      U_VMS(X)      U(exact)      Error_Gal     Error_VMS")
     print("")
-    for i in range(0, num_elements + 1):
+    for i in range(0, mesh.num_elements + 1):
         print("  {:12.6f}  {:12.6f}  {:12.6f}  {:12.6f}  {:12.6f}  {:12.6f}".format(mesh.x[i], gal_model.u[i], vms_model.u[i], u_e[i], gal_error[i], vms_error[i]))
     '''
 
     # Print QoI value
     # ===============
     print("")
-    print ' Quantity of Interest values'
-    print ' ==========================='
-    print ' Galerkin:   ', qoi_gal.value
-    print ' VMS:        ', qoi_vms.value
-    print ' Exact:      ', qoi_gal.value_exact
-    print ' Error_Gal:  ', abs(qoi_gal.value_exact - qoi_gal.value )
-    print ' Error_VMS:  ', abs(qoi_vms.value_exact - qoi_vms.value )
-    print ' Error_est:  ', abs(qoi_vms.error_est)
-    print ' Efficiency: ', abs(qoi_vms.error_est) / abs(qoi_vms.value_exact - qoi_vms.value )
+    print(' Quantity of Interest values')
+    print(' ===========================')
+    print(' Galerkin:   ', results["QOI_GAL"])
+    print(' VMS:        ', results["QOI_VMS"])
+    print(' Exact:      ', results["QOI_EXACT"])
+    print(' Error_Gal:  ', results["ERROR_GAL"])
+    print(' Error_VMS:  ', results["ERROR_VMS"])
+    print(' Error_est:  ', results["ERROR_EST"])
+    print(' Efficiency: ', results["EFFICIENCY"])
                 
         
     # Plot solution
     # =============
-    fine_mesh = Mesh.uniform_grid(x_left, x_right, num_elements*100)
-    plt.plot(fine_mesh.x, u_exact(fine_mesh.x), "k", linewidth=1, label='exact')
-    plt.plot(gal_model.mesh.x, gal_model.u, "k*-", linewidth=1, label='Galerkin')
-    plt.plot(vms_model.mesh.x, vms_model.u, "ks-", linewidth=1, label='VMS')
-    plt.ylim(bottom=0.0)
-    plt.legend(loc='best')
-    plt.title(r'Galerkin and VMS solutions for $\nu=0.01$ and $N_{el}=20$ ($Pe=2.5$)')
-    plt.ylabel(r'u(x)')
-    plt.xlabel(r'x')
-    #plt.savefig("fem_results.eps")
-    #plt.show()
-
-
-if __name__ == '__main__':
-
-    filename = sys.argv[1]
+    axes = plot_solution(gal_model, exact, "k*-", 'Galerkin')
+    plot_solution(vms_model, style="ks-", label='VMS', axes=axes)
+    axes.set_ylim(bottom=0.0)
+    axes.legend(loc='best')
+    axes.set_title(r'Galerkin and VMS solutions for $\nu=0.01$ and $N_{el}=20$ ($Pe=2.5$)')
+    axes.set_ylabel(r'u(x)')
+    axes.set_xlabel(r'x')
+    # To save or show the figure, with show from fem1d.plotting:
+    #show("fem_results.eps")
+    #show()
+
+
+def read_config(filename):
+    # Reads a file of KEY = VALUE lines into a dictionary of floats.
     file = open(filename,'r')
     data = file.readlines()
+    file.close()
     dictionary= {}
     for datum in data:
         if( len(datum.split('=')) > 1 ):
             key = datum.split('=')[0].strip()
             value = float(datum.split('=')[1].strip())
             dictionary.update({key:value})
+    return dictionary
+
+
+if __name__ == '__main__':
+
+    filename = sys.argv[1]
+    dictionary = read_config(filename)
     
     main(dictionary.get('NELEM'), dictionary.get('VELOCITY'), dictionary.get('DIFFUSION'), dictionary.get('REACTION'), dictionary.get('SOURCE'))
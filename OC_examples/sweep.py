@@ -0,0 +1,173 @@
+import os
+
+# Every case is small, so the parallelism comes from the process pool.
+# Keep the BLAS libraries single threaded to avoid oversubscribing cores.
+for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(variable, "1")
+
+import sys
+import csv
+import argparse
+import itertools
+import multiprocessing
+import traceback
+from advection_diffusion import solve_case
+
+
+#
+# Discussion:
+#
+#   Runs a parameter sweep of the advection-diffusion case in
+#   advection_diffusion.py over a process pool.
+#
+#   The cases are given either as a grid, in the same KEY = VALUE format
+#   as a single case but with comma separated lists of values, e.g.
+#
+#     NELEM = 10, 20, 40
+#     VELOCITY = 1.0
+#     DIFFUSION = 0.1, 0.01, 0.001
+#     REACTION = 0.0
+#     SOURCE = 1.0
+#
+#   which runs every combination, or as a CSV file with one case per row
+#   and the parameter names as header.
+#
+#   Every case is solved in a worker process with its parameters passed
+#   explicitly, and its QoI values, errors and efficiency index are
+#   written as one row of the results table as soon as it finishes.
+#
+#   Usage:
+#
+#     python sweep.py grid.cfg --processes 8 --output results.csv
+#     python sweep.py --cases cases.csv --output results.csv
+#
+
+PARAMETERS = ("NELEM", "VELOCITY", "DIFFUSION", "REACTION", "SOURCE")
+
+COLUMNS = ("CASE",) + PARAMETERS + ("PECLET", "QOI_GAL", "QOI_VMS",
+    "QOI_EXACT", "ERROR_GAL", "ERROR_VMS", "ERROR_EST", "EFFICIENCY", "TIME",
+    "STATUS")
+
+
+def read_grid(filename):
+    # Reads a file of KEY = VALUE1, VALUE2, ... lines into a dictionary
+    # of lists of floats.
+    grid = {}
+    with open(filename, 'r') as file:
+        for datum in file:
+            if len(datum.split('=')) > 1:
+                key, values = datum.split('=', 1)
+                grid[key.strip()] = [float(value) for value in values.split(',')
+                                     if value.strip()]
+    return grid
+
+
+def expand_grid(grid):
+    # Returns the list of all combinations of the values in the grid.
+    missing = [name for name in PARAMETERS if name not in grid]
+    if missing:
+        raise ValueError("Missing parameters: {}".format(", ".join(missing)))
+
+    return [dict(zip(PARAMETERS, values))
+            for values in itertools.product(*[grid[name] for name in PARAMETERS])]
+
+
+def read_cases(filename):
+    # Reads a CSV file with one case per row.
+    with open(filename, 'r') as file:
+        return [dict((name, float(row[name])) for name in PARAMETERS)
+                for row in csv.DictReader(file)]
+
+
+def run_case(indexed_case):
+    # Solves one case in a worker process. Failures are reported in the
+    # STATUS column instead of stopping the sweep.
+    index, case = indexed_case
+
+    try:
+        results = solve_case(*[case[name] for name in PARAMETERS])[2]
+        results["STATUS"] = "ok"
+    except Exception:
+        results = dict(case)
+        results["STATUS"] = traceback.format_exc().strip().splitlines()[-1]
+
+    results["CASE"] = index
+    return results
+
+
+def sweep(cases, processes=None, output=None, chunksize=None):
+    """Solves every case over a process pool.
+
+    Arguments:
+        cases: List of dictionaries with the parameters in PARAMETERS.
+        processes: Number of worker processes, defaults to the number of
+            cores.
+        output: Optional file object. Each result is written to it as a
+            CSV row as soon as its case finishes.
+        chunksize: Number of cases sent to a worker at a time. Defaults
+            to about four chunks per worker.
+
+    Yields:
+        A dictionary with the columns in COLUMNS for every case, in
+        completion order. The CASE column is the index of the case. If
+        the generator is closed before the last case, the remaining
+        cases are cancelled.
+    """
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    if chunksize is None:
+        chunksize = max(1, len(cases) // (4 * processes))
+
+    writer = None
+    if output is not None:
+        writer = csv.DictWriter(output, fieldnames=COLUMNS, restval="")
+        writer.writeheader()
+
+    pool = multiprocessing.Pool(processes)
+    finished = False
+    try:
+        for results in pool.imap_unordered(run_case, enumerate(cases), chunksize):
+            if writer is not None:
+                writer.writerow(results)
+                output.flush()
+            yield results
+        finished = True
+    finally:
+        # A consumer that stops early, or an error, should not wait for
+        # the remaining cases.
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep of the advection-diffusion case.")
+    parser.add_argument("grid", nargs="?", help="KEY = VALUE1, VALUE2, ... grid file")
+    parser.add_argument("--cases", help="CSV file with one case per row")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=None)
+    parser.add_argument("--output", help="CSV results file, defaults to stdout")
+    args = parser.parse_args(argv)
+
+    if args.cases:
+        cases = read_cases(args.cases)
+    elif args.grid:
+        cases = expand_grid(read_grid(args.grid))
+    else:
+        parser.error("give a grid file or --cases")
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for results in sweep(cases, args.processes, output, args.chunksize):
+            pass
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
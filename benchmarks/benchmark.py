@@ -0,0 +1,366 @@
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import datetime
+import subprocess
+import tracemalloc
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.qoi import QoI
+
+
+#
+# Discussion:
+#
+#   Benchmarks of the main operations of fem1d over a range of mesh sizes
+#   and basis function orders.
+#
+#   Every case is timed REPEAT times and the best time is kept, then run
+#   once more under tracemalloc to record its peak memory, which numpy
+#   reports for its arrays. The setup of a case, e.g. solving the model
+#   before timing the QoI, is not measured. The coefficient field of the
+#   mesh is cleared before every call, so that every call evaluates the
+#   coefficients as the first one does, see uncached().
+#
+#   A run is appended to a JSON history file, with the git commit, the
+#   machine and the numpy version, so that runs can be compared later:
+#
+#     python benchmark.py run --sizes 100,1000,10000 --orders 1,2
+#     python benchmark.py run --label "after assembly change"
+#     python benchmark.py compare
+#     python benchmark.py compare 0 3 --threshold 0.2
+#
+#   compare matches the cases of two runs, by default the last two, and
+#   flags those whose time or peak memory grew by more than THRESHOLD;
+#   it exits with status 1 if any did. Times of small cases are noisy, so
+#   a time only counts as grown if it did by more than MIN_DELTA seconds.
+#
+
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.json")
+
+SIZES = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+ORDERS = (1, 2, 4, 8)
+
+# Cases whose number of degrees of freedom exceeds MAX_DOFS are skipped.
+MAX_DOFS = 20000000
+
+NU = 0.01
+VELOCITY = 1.0
+
+
+def p(x):
+    return NU * (1 + x)
+
+
+def r(x):
+    return VELOCITY + 0 * x
+
+
+def f(x):
+    return np.ones_like(x)
+
+
+def qoi_function(x):
+    return np.ones_like(x)
+
+
+def new_model(model_class, num_elements, order):
+    # The advection-diffusion problem of the benchmarks, with coefficient
+    # functions so that the quadrature path is measured.
+    return model_class(Mesh.uniform_grid(0, 1, num_elements), p, 0.0, r, f,
+                       1, 0.0, 0.0, order + 1, order)
+
+
+def uncached(function, mesh):
+    # Clears the coefficient values stored on the mesh before every call
+    # of FUNCTION, otherwise repeated calls would skip their evaluation.
+    def call():
+        mesh.coefficient_field.clear()
+        function()
+    return call
+
+
+def solved_qoi(num_elements, order):
+    model = new_model(VMSModel, num_elements, order)
+    model.solve()
+    return QoI(model, qoi_function, 0.0, order + 2)
+
+
+def case_mesh_uniform(num_elements, order):
+    return lambda: Mesh.uniform_grid(0, 1, num_elements)
+
+
+def case_mesh_non_uniform(num_elements, order):
+    return lambda: Mesh.non_uniform_grid(0, 1, num_elements, 1.0 + 1.0 / num_elements)
+
+
+def case_model_assemble(num_elements, order):
+    model = new_model(Model, num_elements, order)
+    return uncached(model.assemble, model.mesh)
+
+
+def case_vms_assemble(num_elements, order):
+    model = new_model(VMSModel, num_elements, order)
+    return uncached(model.assemble, model.mesh)
+
+
+def case_model_solve(num_elements, order):
+    model = new_model(Model, num_elements, order)
+    return uncached(model.solve, model.mesh)
+
+
+def case_qoi_compute(num_elements, order):
+    qoi = solved_qoi(num_elements, order)
+    return uncached(qoi.compute, qoi.model.mesh)
+
+
+def case_qoi_error_estimator(num_elements, order):
+    qoi = solved_qoi(num_elements, order)
+    qoi.compute()
+    return uncached(qoi.error_estimator, qoi.model.mesh)
+
+
+# Every case returns the function to time; meshes do not depend on the
+# basis function order, so they only run for the first one.
+CASES = {
+    "mesh_uniform": case_mesh_uniform,
+    "mesh_non_uniform": case_mesh_non_uniform,
+    "model_assemble": case_model_assemble,
+    "vms_assemble": case_vms_assemble,
+    "model_solve": case_model_solve,
+    "qoi_compute": case_qoi_compute,
+    "qoi_error_estimator": case_qoi_error_estimator,
+}
+
+MESH_CASES = ("mesh_uniform", "mesh_non_uniform")
+
+
+def measure(function, repeat):
+    """Times a function and measures its peak memory.
+
+    Arguments:
+        function: Callable without arguments.
+        repeat: Number of timed calls.
+
+    Returns:
+        Dictionary with the best time and all times in seconds, and the
+        peak memory in bytes allocated during one more call.
+    """
+
+    times = []
+    for i in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"time": min(times), "times": times, "peak_memory": peak}
+
+
+def run(cases=None, sizes=SIZES, orders=ORDERS, repeat=3, max_dofs=MAX_DOFS,
+        output=sys.stdout):
+    """Runs the benchmarks.
+
+    Arguments:
+        cases: Names of the cases in CASES, defaults to all.
+        sizes: Numbers of elements.
+        orders: Basis function orders.
+        repeat: Number of timed calls per case.
+        max_dofs: Cases with more degrees of freedom are skipped.
+        output: Optional file object where a line per case is printed.
+
+    Returns:
+        List of result dictionaries with the keys case, num_elements,
+        order, num_dofs, time, times and peak_memory.
+    """
+
+    results = []
+
+    for name in (cases or list(CASES)):
+        for order in (orders[:1] if name in MESH_CASES else orders):
+            for num_elements in sizes:
+                num_dofs = num_elements * order + 1
+                if num_dofs > max_dofs:
+                    continue
+
+                function = CASES[name](num_elements, order)
+                result = {"case": name, "num_elements": num_elements,
+                          "order": order, "num_dofs": num_dofs}
+                result.update(measure(function, repeat))
+                results.append(result)
+                del function
+
+                if output is not None:
+                    output.write("{:22s} N={:<9d} order={}  {:10.4e} s  {:10.3f} MB\n".format(
+                        name, num_elements, order, result["time"],
+                        result["peak_memory"] / 1e6))
+                    output.flush()
+
+    return results
+
+
+def environment():
+    # Where and on what the run happened.
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "system": platform.system()}
+
+
+def read_history(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'r') as file:
+        return json.load(file)["runs"]
+
+
+def write_history(filename, runs):
+    # Written to a temporary file first, so that an interrupted run does
+    # not corrupt the history.
+    temporary = filename + ".tmp"
+    with open(temporary, 'w') as file:
+        json.dump({"runs": runs}, file, indent=1)
+    os.replace(temporary, filename)
+
+
+def compare(base, new, threshold=0.1, min_delta=1e-3):
+    """Compares the results of two runs.
+
+    Arguments:
+        base, new: Runs of the history, dictionaries with a results list.
+        threshold: Relative growth of the time or of the peak memory from
+            which a case is flagged as a regression.
+        min_delta: Smallest change of the time, in seconds, that counts.
+
+    Returns:
+        List of dictionaries with the keys case, num_elements, order,
+        time_ratio, memory_ratio and status, which is "regression",
+        "improvement" or "ok", for the cases present in both runs.
+    """
+
+    def key(result):
+        return (result["case"], result["num_elements"], result["order"])
+
+    base_results = dict((key(result), result) for result in base["results"])
+    rows = []
+
+    for result in new["results"]:
+        reference = base_results.get(key(result))
+        if reference is None:
+            continue
+
+        time_ratio = result["time"] / reference["time"] \
+            if reference["time"] > 0 else float("inf")
+        memory_ratio = result["peak_memory"] / reference["peak_memory"] \
+            if reference["peak_memory"] > 0 else 1.0
+
+        significant = abs(result["time"] - reference["time"]) > min_delta
+
+        if (significant and time_ratio > 1 + threshold) or \
+                memory_ratio > 1 + threshold:
+            status = "regression"
+        elif significant and time_ratio < 1 / (1 + threshold):
+            status = "improvement"
+        else:
+            status = "ok"
+
+        rows.append({"case": result["case"],
+                     "num_elements": result["num_elements"],
+                     "order": result["order"], "time_ratio": time_ratio,
+                     "memory_ratio": memory_ratio, "status": status})
+
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of fem1d.")
+    parser.add_argument("--history", default=HISTORY, help="JSON history file")
+    commands = parser.add_subparsers(dest="command")
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--cases", default=",".join(CASES))
+    run_parser.add_argument("--sizes", default=",".join(str(n) for n in SIZES))
+    run_parser.add_argument("--orders", default=",".join(str(n) for n in ORDERS))
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--max-dofs", type=int, default=MAX_DOFS)
+    run_parser.add_argument("--label", default="")
+
+    compare_parser = commands.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("base", nargs="?", type=int, default=-2,
+                                help="index of the base run, default the one before last")
+    compare_parser.add_argument("new", nargs="?", type=int, default=-1,
+                                help="index of the new run, default the last")
+    compare_parser.add_argument("--threshold", type=float, default=0.1)
+    compare_parser.add_argument("--min-delta", type=float, default=1e-3)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        cases = [name.strip() for name in args.cases.split(",") if name.strip()]
+        unknown = [name for name in cases if name not in CASES]
+        if unknown:
+            parser.error("unknown cases: {}".format(", ".join(unknown)))
+
+        entry = environment()
+        entry["label"] = args.label
+        entry["results"] = run(cases, [int(n) for n in args.sizes.split(",")],
+                               [int(n) for n in args.orders.split(",")],
+                               args.repeat, args.max_dofs)
+
+        runs = read_history(args.history)
+        runs.append(entry)
+        write_history(args.history, runs)
+        print("Run {} saved to {}".format(len(runs) - 1, args.history))
+        return 0
+
+    if args.command == "compare":
+        runs = read_history(args.history)
+        if len(runs) < 2:
+            parser.error("the history needs at least two runs")
+
+        base, new = runs[args.base], runs[args.new]
+        rows = compare(base, new, args.threshold, args.min_delta)
+
+        print("Base: {} {} {}".format(base["timestamp"], base["commit"], base["label"]))
+        print("New:  {} {} {}".format(new["timestamp"], new["commit"], new["label"]))
+        print("")
+        for row in rows:
+            print("{:22s} N={:<9d} order={}  time x{:6.3f}  memory x{:6.3f}  {}".format(
+                row["case"], row["num_elements"], row["order"],
+                row["time_ratio"], row["memory_ratio"],
+                row["status"].upper() if row["status"] == "regression" else row["status"]))
+
+        return 1 if any(row["status"] == "regression" for row in rows) else 0
+
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,10 @@
 import sys
 import math
 import numpy as np
-import matplotlib.pyplot as plt
 sys.path.insert(0, "..")
 from fem1d.mesh import Mesh
 from fem1d.model import Model
+from fem1d.plotting import plot_solution, show
 
 
 def p(x):
@@ -111,11 +111,9 @@ def main():
             model.u[i], u_e[i], error[i]))
 
     # Plot solution
-    fine_mesh = Mesh.uniform_grid(x_left, x_right, num_elements*100)
-    plt.plot(fine_mesh.x, u_exact(fine_mesh.x), "k", linewidth=1)
-    plt.plot(model.mesh.x, model.u, "k*-", linewidth=1)
-    #plt.savefig("fem_results.eps")
-    plt.show()
+    plot_solution(model, u_exact)
+    #show("fem_results.eps")
+    show()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,210 @@
+import numpy as np
+from collections import namedtuple
+from fem1d.vms_model import VMSModel
+from fem1d.qoi import QoI
+
+
+AdaptiveStep = namedtuple(
+    "AdaptiveStep", ["num_elements", "num_dofs", "value", "error_est",
+                     "indicator_sum", "refined", "coarsened"])
+
+
+class AdaptiveSolver(object):
+    #
+    # Discussion:
+    #
+    #   Goal-oriented adaptive refinement driven by the VMS error
+    #   estimator of a quantity of interest.
+    #
+    #   Every iteration solves a VMSModel on the current mesh, estimates
+    #   the QoI error of every element with QoI.error_estimator, and
+    #
+    #     - bisects the elements with the largest indicators, marked by
+    #       the Doerfler (bulk) criterion: the smallest set of elements
+    #       whose indicators add up to refine_fraction of the total,
+    #
+    #     - merges pairs of neighbouring elements whose indicators are
+    #       below coarsen_fraction * tolerance / num_elements, i.e. that
+    #       are negligible with respect to the target.
+    #
+    #   The indicator of element E is |residual[E] + jump[E]|. The
+    #   solution is transferred to the new mesh and kept as the initial
+    #   guess of the next solve, which an iterative solver, e.g.
+    #   solver="multigrid", starts from; the direct solver ignores it.
+    #
+    #   The loop stops when the sum of the indicators is below tolerance,
+    #   when the next mesh would exceed max_dofs, or after max_iterations.
+    #   The sum of the indicators bounds the estimated QoI error, which
+    #   alone can be small by cancellation between elements.
+    #
+
+    def __init__(self, mesh, p, q, r, f, bc_type, bc_left, bc_right, qFunc,
+        u_exact=0.0, num_quad_points=2, basis_function_order=1,
+        qoi_quad_points=20, tolerance=1e-6, max_dofs=100000,
+        max_iterations=50, refine_fraction=0.5, coarsen_fraction=0.0,
+        solver="direct", solver_options=None):
+        #
+        # Inputs
+        #
+        #     (fem1d.mesh.Mesh) mesh
+        #         The initial mesh.
+        #
+        #     p, q, r, f, bc_type, bc_left, bc_right, num_quad_points,
+        #     basis_function_order
+        #         The problem, as for fem1d.model.Model.
+        #
+        #     (function) qFunc
+        #         The functional of the QoI, see fem1d.qoi.QoI.
+        #
+        #     (function) u_exact
+        #         The exact solution if known, only used to report the
+        #         exact QoI.
+        #
+        #     (int) qoi_quad_points
+        #         The number of quadrature points per element of the QoI
+        #         and of the estimator.
+        #
+        #     (float) tolerance
+        #         The target for the sum of the error indicators.
+        #
+        #     (int) max_dofs
+        #         The largest number of degrees of freedom allowed.
+        #
+        #     (int) max_iterations
+        #         The largest number of solves.
+        #
+        #     (float) refine_fraction
+        #         The Doerfler parameter, between 0 and 1.
+        #
+        #     (float) coarsen_fraction
+        #         Elements with an indicator below coarsen_fraction *
+        #         tolerance / num_elements are coarsened; 0 disables
+        #         coarsening.
+        #
+        #     (str) solver, (dict) solver_options
+        #         The linear solver of every solve, as for
+        #         fem1d.model.Model.
+        #
+
+        self.mesh = mesh
+        self.p = p
+        self.q = q
+        self.r = r
+        self.f = f
+        self.bc_type = bc_type
+        self.bc_left = bc_left
+        self.bc_right = bc_right
+        self.qFunc = qFunc
+        self.u_exact = u_exact
+        self.num_quad_points = num_quad_points
+        self.basis_function_order = basis_function_order
+        self.qoi_quad_points = qoi_quad_points
+        self.tolerance = tolerance
+        self.max_dofs = max_dofs
+        self.max_iterations = max_iterations
+        self.refine_fraction = refine_fraction
+        self.coarsen_fraction = coarsen_fraction
+        self.solver = solver
+        self.solver_options = solver_options
+        self.model = None
+        self.qoi = None
+        self.history = []
+
+
+    def solve(self):
+        #
+        # Discussion:
+        #
+        #   Runs the adaptive loop from the current mesh.
+        #
+        # Outputs:
+        #
+        #     (list) history
+        #         One AdaptiveStep per solve, also kept in self.history.
+        #
+
+        order = self.basis_function_order
+        previous = None
+
+        for iteration in range(self.max_iterations):
+
+            model = VMSModel(self.mesh, self.p, self.q, self.r, self.f,
+                             self.bc_type, self.bc_left, self.bc_right,
+                             self.num_quad_points, order,
+                             solver=self.solver,
+                             solver_options=self.solver_options)
+
+            # Warm start of an iterative solver from the solution on the
+            # previous mesh.
+            if previous is not None:
+                model.u = previous.interpolate_at(self.mesh.dof_coordinates(order))
+
+            model.solve()
+
+            qoi = QoI(model, self.qFunc, self.u_exact, self.qoi_quad_points)
+            qoi.compute()
+            contributions = qoi.error_estimator()
+            indicators = np.abs(contributions.residual + contributions.jump)
+
+            self.model = model
+            self.qoi = qoi
+            previous = model
+
+            refine, coarsen = self.mark(indicators)
+            step = AdaptiveStep(self.mesh.num_elements, len(model.u),
+                                qoi.value, qoi.error_est, indicators.sum(), 0, 0)
+
+            if step.indicator_sum <= self.tolerance:
+                self.history.append(step)
+                break
+
+            # Coarsening only merges unmarked elements, so every marked
+            # element survives it and is found again by its midpoint.
+            coarse = self.mesh.coarsen(coarsen)
+            midpoints = self.mesh.x_left[refine] + 0.5 * self.mesh.h[refine]
+            mesh = coarse.refine(coarse.locate(midpoints))
+
+            if mesh.num_dofs(order) > self.max_dofs:
+                self.history.append(step)
+                break
+
+            self.history.append(step._replace(
+                refined=int(refine.sum()),
+                coarsened=self.mesh.num_elements - coarse.num_elements))
+            self.mesh = mesh
+
+        return self.history
+
+
+    def mark(self, indicators):
+        #
+        # Discussion:
+        #
+        #   Marks the elements to refine and to coarsen.
+        #
+        # Inputs:
+        #
+        #     (numpy.ndarray) indicators, shape (num_elements,)
+        #         The error indicator of every element.
+        #
+        # Outputs:
+        #
+        #     (numpy.ndarray) refine, coarsen
+        #         Boolean masks of shape (num_elements,).
+        #
+
+        refine = np.zeros(len(indicators), dtype=bool)
+        total = indicators.sum()
+
+        if total > 0.0:
+            # Doerfler marking: the largest indicators up to the fraction.
+            order = np.argsort(indicators)[::-1]
+            bulk = np.cumsum(indicators[order])
+            count = np.searchsorted(bulk, self.refine_fraction * total) + 1
+            refine[order[:count]] = True
+
+        coarsen = indicators < self.coarsen_fraction * self.tolerance / len(indicators)
+        coarsen &= ~refine
+
+        return refine, coarsen
+
@@ -0,0 +1,566 @@
+import os
+import tempfile
+import numpy as np
+
+
+# Number of right-hand sides from which BandedLU.solve sweeps the rows of
+# the whole block with numpy instead of solving column by column with
+# Python floats. Found by timing; the Thomas solve is cheaper per column,
+# so it pays off later.
+TRIDIAGONAL_BLOCK_COLUMNS = 32
+BANDED_BLOCK_COLUMNS = 8
+
+# Rows per window of OutOfCoreBandedLU.
+CHUNK_ROWS = 65536
+
+class BandedMatrix(object):
+    """Square matrix that only stores the diagonals inside its band.
+
+    Entry (i, j) of the matrix is stored in data[i, lower + j - i], so row
+    i of data holds the entries A[i, i-lower], ..., A[i, i+upper]. Entries
+    of data that fall outside the matrix are kept at zero.
+
+    A few entries outside the band, e.g. the corners that periodic
+    boundary conditions add, are kept in a dictionary. The matrix is then
+    factorized by CyclicBandedLU.
+
+    Attributes:
+        size (int): Number of rows and columns.
+        lower (int): Number of sub-diagonals.
+        upper (int): Number of super-diagonals.
+        data (numpy.ndarray): The band, shape (size, lower + upper + 1).
+        corners (dict): The entries outside the band, by (i, j).
+    """
+
+    def __init__(self, size, lower, upper, data=None):
+        self.size = size
+        self.lower = lower
+        self.upper = upper
+
+        if data is None:
+            data = np.zeros((size, lower + upper + 1))
+
+        self.data = data
+        self.corners = {}
+
+    @property
+    def shape(self):
+        return (self.size, self.size)
+
+    def add_element_matrices(self, K_e, dofs):
+        """Adds element matrices to the band.
+
+        Arguments:
+            K_e: Element matrices, shape (num_elements, num_nodes, num_nodes).
+            dofs: Global indices of the element nodes, shape
+                (num_elements, num_nodes). The nodes of an element must
+                lie within the band of each other.
+        """
+
+        for i in range(dofs.shape[1]):
+            rows = dofs[:, i]
+
+            for j in range(dofs.shape[1]):
+                # Within one (I, J) pair every element writes to a
+                # different row, so no two updates collide.
+                columns = self.lower + dofs[:, j] - rows
+                self.data[rows, columns] += K_e[:, i, j]
+
+    def add_element_matrices_strided(self, K_e, stride):
+        """Adds element matrices of elements whose nodes are numbered
+        e*stride, ..., e*stride + num_nodes - 1, as for Mesh.dofs().
+
+        Every local node then maps to a strided slice of rows, so every
+        (I, J) pair is a single add on a view of the band, without
+        gathering or scattering indices.
+
+        Arguments:
+            K_e: Element matrices, shape (num_elements, num_nodes, num_nodes).
+            stride: Index step between the first nodes of two consecutive
+                elements.
+        """
+
+        num_elements, num_nodes = K_e.shape[0], K_e.shape[1]
+        end = stride * (num_elements - 1) + 1
+
+        for i in range(num_nodes):
+            for j in range(num_nodes):
+                self.data[i:i+end:stride, self.lower + j - i] += K_e[:, i, j]
+
+    def set_identity_row(self, i):
+        """Replaces row i by the corresponding row of the identity."""
+
+        self.data[i, :] = 0.0
+        self.data[i, self.lower] = 1.0
+
+        for key in [key for key in self.corners if key[0] == i]:
+            del self.corners[key]
+
+    def add_entry(self, i, j, value):
+        """Adds value to entry (i, j), in the band or in the corners."""
+
+        if -self.lower <= j - i <= self.upper:
+            self.data[i, self.lower + j - i] += value
+        else:
+            self.corners[(i, j)] = self.corners.get((i, j), 0.0) + value
+
+    def row_entries(self, i):
+        """Returns the nonzero entries of row i as a list of (j, value)."""
+
+        entries = [(i + d, self.data[i, self.lower + d])
+                   for d in range(-self.lower, self.upper + 1)
+                   if 0 <= i + d < self.size and self.data[i, self.lower + d] != 0.0]
+
+        return entries + sorted((j, value) for (row, j), value in
+                                self.corners.items() if row == i)
+
+    def dot(self, u):
+        """Computes the matrix-vector product A * u.
+
+        Arguments:
+            u: Vector of length size, or array of shape (size, m) holding
+                m vectors as columns.
+
+        Returns:
+            The product, with the same shape as u.
+        """
+
+        u = np.asarray(u, dtype=float)
+        result = np.zeros_like(u)
+        data = self.data if u.ndim == 1 else self.data[:, :, None]
+
+        for d in range(-self.lower, self.upper + 1):
+            column = self.lower + d
+            if d >= 0:
+                result[:self.size-d] += data[:self.size-d, column] * u[d:]
+            else:
+                result[-d:] += data[-d:, column] * u[:self.size+d]
+
+        for (i, j), value in self.corners.items():
+            result[i] += value * u[j]
+
+        return result
+
+    def to_dense(self):
+        """Returns the matrix as a dense numpy.ndarray, for debugging."""
+
+        dense = np.zeros(self.shape)
+        rows = np.arange(self.size)
+
+        for d in range(-self.lower, self.upper + 1):
+            inside = (rows + d >= 0) & (rows + d < self.size)
+            dense[rows[inside], rows[inside] + d] = \
+                self.data[rows[inside], self.lower + d]
+
+        for (i, j), value in self.corners.items():
+            dense[i, j] = value
+
+        return dense
+
+    def factorize(self):
+        """Returns the LU factorization of the matrix."""
+
+        return factorize_corners(BandedLU(self), self)
+
+    def solve(self, b):
+        """Solves A * x = b."""
+
+        return self.factorize().solve(b)
+
+
+class BandedLU(object):
+    """LU factorization of a BandedMatrix without pivoting.
+
+    The factors have the same band as the matrix and overwrite a copy of
+    it: the unit lower triangular L below the diagonal and U on and above
+    it. Factorizing costs O(size * lower * upper) and every solve costs
+    O(size * (lower + upper)).
+
+    No pivoting is done, which is safe for the matrices produced by the
+    models: their symmetric part is positive definite apart from the rows
+    replaced by Dirichlet conditions.
+    """
+
+    def __init__(self, matrix):
+        self.size = matrix.size
+        self.lower = matrix.lower
+        self.upper = matrix.upper
+        self.data = self._factorize(np.array(matrix.data, dtype=float))
+
+    def _factorize(self, data):
+        lower, upper = self.lower, self.upper
+
+        if lower == 1 and upper == 1:
+            return self._factorize_tridiagonal(data)
+
+        # The elimination is inherently sequential, so it runs on Python
+        # floats, which is much faster than indexing numpy rows.
+        rows = data.tolist()
+
+        for k in range(self.size - 1):
+            row_k = rows[k]
+            pivot = row_k[lower]
+
+            if pivot == 0.0:
+                raise ZeroDivisionError(
+                    "Zero pivot in row {} of banded matrix".format(k))
+
+            for m in range(1, min(lower, self.size - 1 - k) + 1):
+                row_i = rows[k + m]
+                multiplier = row_i[lower - m] / pivot
+
+                if multiplier == 0.0:
+                    continue
+
+                row_i[lower - m] = multiplier
+
+                for d in range(1, upper + 1):
+                    row_i[lower - m + d] -= multiplier * row_k[lower + d]
+
+        if rows and rows[-1][lower] == 0.0:
+            raise ZeroDivisionError(
+                "Zero pivot in row {} of banded matrix".format(self.size - 1))
+
+        return np.array(rows, dtype=float).reshape(data.shape)
+
+    def _factorize_tridiagonal(self, data):
+        # Thomas algorithm: the only multiplier of row K is stored in its
+        # sub-diagonal and the pivot replaces its diagonal.
+        sub = data[:, 0].tolist()
+        diag = data[:, 1].tolist()
+        pivot = diag[0]
+
+        for k, (a, b, c) in enumerate(zip(sub[1:], diag[1:], data[:-1, 2].tolist())):
+            if pivot == 0.0:
+                raise ZeroDivisionError(
+                    "Zero pivot in row {} of banded matrix".format(k))
+            multiplier = a / pivot
+            pivot = b - multiplier * c
+            sub[k + 1] = multiplier
+            diag[k + 1] = pivot
+
+        if pivot == 0.0:
+            raise ZeroDivisionError(
+                "Zero pivot in row {} of banded matrix".format(self.size - 1))
+
+        data[:, 0] = sub
+        data[:, 1] = diag
+
+        return data
+
+    def solve(self, b):
+        """Solves A * x = b using the stored factors.
+
+        Arguments:
+            b: Right-hand side of length size, or array of shape
+                (size, m) holding m right-hand sides as columns.
+
+        Returns:
+            The solution, with the same shape as b.
+        """
+
+        b = np.asarray(b, dtype=float)
+        tridiagonal = self.lower == 1 and self.upper == 1
+
+        if b.ndim == 2 and b.shape[1] >= (TRIDIAGONAL_BLOCK_COLUMNS if tridiagonal
+                                          else BANDED_BLOCK_COLUMNS):
+            return self._solve_block(np.array(b))
+
+        if tridiagonal:
+            factors = [self.data[:, column].tolist() for column in range(3)]
+            solve_vector = self._solve_tridiagonal
+        else:
+            factors = self.data.tolist()
+            solve_vector = self._solve_banded
+
+        if b.ndim == 1:
+            return np.array(solve_vector(factors, b.tolist()))
+
+        x = np.empty_like(b)
+        for column in range(b.shape[1]):
+            x[:, column] = solve_vector(factors, b[:, column].tolist())
+
+        return x
+
+    def _solve_banded(self, rows, x):
+        lower, upper, size = self.lower, self.upper, self.size
+
+        # Forward substitution with the unit lower triangular factor.
+        for i in range(1, size):
+            row = rows[i]
+            value = x[i]
+            for m in range(1, min(lower, i) + 1):
+                value -= row[lower - m] * x[i - m]
+            x[i] = value
+
+        # Back substitution with the upper triangular factor.
+        for i in range(size - 1, -1, -1):
+            row = rows[i]
+            value = x[i]
+            for d in range(1, min(upper, size - 1 - i) + 1):
+                value -= row[lower + d] * x[i + d]
+            x[i] = value / row[lower]
+
+        return x
+
+    def _solve_tridiagonal(self, factors, x):
+        sub, diag, sup = factors
+
+        value = x[0]
+        for i, multiplier in enumerate(sub[1:], 1):
+            value = x[i] - multiplier * value
+            x[i] = value
+
+        value = 0.0
+        for i in range(self.size - 1, -1, -1):
+            value = (x[i] - sup[i] * value) / diag[i]
+            x[i] = value
+
+        return x
+
+    def _solve_block(self, x):
+        # Same substitutions as _solve_banded, but every step updates a
+        # whole row of the block of right-hand sides at once.
+        lower, upper, size = self.lower, self.upper, self.size
+        rows = self.data.tolist()
+        block = list(x)
+
+        for i in range(1, size):
+            row = rows[i]
+            value = block[i]
+            for m in range(1, min(lower, i) + 1):
+                value -= row[lower - m] * block[i - m]
+
+        for i in range(size - 1, -1, -1):
+            row = rows[i]
+            value = block[i]
+            for d in range(1, min(upper, size - 1 - i) + 1):
+                value -= row[lower + d] * block[i + d]
+            value /= row[lower]
+
+        return x
+
+
+class OutOfCoreBandedLU(object):
+    """LU factorization of a BandedMatrix computed in place, a window of
+    rows at a time.
+
+    The factors and their layout are those of BandedLU, but the band is
+    never loaded as a whole: the elimination and the substitutions walk
+    it in windows of chunk_rows rows, plus the lower rows that every
+    window updates ahead. A band stored in a numpy.memmap, see
+    scratch_array(), is then factorized and solved with a working memory
+    bounded by the window. The band of the matrix is overwritten by the
+    factors.
+    """
+
+    def __init__(self, matrix, chunk_rows=CHUNK_ROWS):
+        self.size = matrix.size
+        self.lower = matrix.lower
+        self.upper = matrix.upper
+        self.data = matrix.data
+        self.chunk_rows = max(int(chunk_rows), 1)
+        self._factorize()
+
+    def _factorize(self):
+        data, lower, upper, size = self.data, self.lower, self.upper, self.size
+
+        for start in range(0, size, self.chunk_rows):
+            stop = min(start + self.chunk_rows, size)
+            end = min(stop + lower, size)
+            rows = data[start:end].tolist()
+
+            for k in range(stop - start):
+                row_k = rows[k]
+                pivot = row_k[lower]
+
+                if pivot == 0.0:
+                    raise ZeroDivisionError(
+                        "Zero pivot in row {} of banded matrix".format(start + k))
+
+                for m in range(1, min(lower, size - 1 - start - k) + 1):
+                    row_i = rows[k + m]
+                    multiplier = row_i[lower - m] / pivot
+
+                    if multiplier == 0.0:
+                        continue
+
+                    row_i[lower - m] = multiplier
+
+                    for d in range(1, upper + 1):
+                        row_i[lower - m + d] -= multiplier * row_k[lower + d]
+
+            data[start:end] = rows
+
+        if isinstance(data, np.memmap):
+            data.flush()
+
+    def solve(self, b, out=None):
+        """Solves A * x = b using the stored factors.
+
+        Arguments:
+            b: Right-hand side of length size, or array of shape
+                (size, m) holding m right-hand sides as columns. It may be
+                a numpy.memmap, which is read a window at a time.
+            out: Optional array of the shape of b for the solution, e.g.
+                a numpy.memmap.
+
+        Returns:
+            The solution, out if given.
+        """
+
+        b = np.asarray(b, dtype=float)
+
+        if out is None:
+            out = np.empty(b.shape)
+
+        if b.ndim == 2:
+            for column in range(b.shape[1]):
+                out[:, column] = self.solve(b[:, column])
+            return out
+
+        data, lower, upper, size = self.data, self.lower, self.upper, self.size
+        chunk = self.chunk_rows
+
+        # Forward substitution with the unit lower triangular factor; the
+        # last lower values of every window carry over to the next.
+        carry = []
+        for start in range(0, size, chunk):
+            stop = min(start + chunk, size)
+            rows = data[start:stop].tolist()
+            values = carry + b[start:stop].tolist()
+            offset = len(carry)
+
+            for i in range(stop - start):
+                row = rows[i]
+                value = values[offset + i]
+                for m in range(1, min(lower, start + i) + 1):
+                    value -= row[lower - m] * values[offset + i - m]
+                values[offset + i] = value
+
+            out[start:stop] = values[offset:]
+            carry = values[len(values) - lower:]
+
+        # Back substitution with the upper triangular factor, from the
+        # last window to the first.
+        carry = []
+        for stop in range(size, 0, -chunk):
+            start = max(stop - chunk, 0)
+            rows = data[start:stop].tolist()
+            values = out[start:stop].tolist() + carry
+
+            for i in range(stop - start - 1, -1, -1):
+                row = rows[i]
+                value = values[i]
+                for d in range(1, min(upper, size - 1 - start - i) + 1):
+                    value -= row[lower + d] * values[i + d]
+                values[i] = value / row[lower]
+
+            out[start:stop] = values[:stop - start]
+            carry = values[:upper]
+
+        if isinstance(out, np.memmap):
+            out.flush()
+
+        return out
+
+
+class CyclicBandedLU(object):
+    """Factorization of a BandedMatrix with a few entries outside its band,
+    e.g. a cyclic matrix, from the factorization of its band.
+
+    With A = B + U * V^T, where B is the band, U holds the columns of the
+    identity of the k rows with entries outside the band and V^T those
+    entries, the Sherman-Morrison-Woodbury formula gives
+
+        x = z - Y * ( I + V^T * Y )^-1 * V^T * z
+
+    with z = B^-1 * b and Y = B^-1 * U. Y and the k x k capacitance
+    matrix are computed once, so a solve costs one banded solve and
+    O(size * k) more. The band B itself must be nonsingular.
+
+    Attributes:
+        factorization: The factorization of the band, e.g. a BandedLU.
+        rows (list): The k rows with entries outside the band.
+        columns (list): The columns of those entries, one array per row.
+        values (list): The entries, one array per row.
+    """
+
+    def __init__(self, factorization, size, corners):
+        self.factorization = factorization
+        self.rows = sorted(set(i for i, j in corners))
+        self.columns = []
+        self.values = []
+
+        for row in self.rows:
+            entries = sorted((j, value) for (i, j), value in corners.items() if i == row)
+            self.columns.append(np.array([j for j, value in entries]))
+            self.values.append(np.array([value for j, value in entries]))
+
+        U = np.zeros((size, len(self.rows)))
+        U[self.rows, np.arange(len(self.rows))] = 1.0
+
+        self.Y = factorization.solve(U)
+        self.capacitance = np.eye(len(self.rows)) + self._project(self.Y)
+
+    def _project(self, z):
+        # V^T * z, for a vector or a block of columns.
+        return np.array([np.dot(values, z[columns])
+                         for columns, values in zip(self.columns, self.values)])
+
+    def solve(self, b, out=None):
+        """Solves A * x = b.
+
+        Arguments:
+            b: Right-hand side of length size, or array of shape
+                (size, m) holding m right-hand sides as columns.
+            out: Optional array for the solution, passed to the
+                factorization of the band, e.g. an OutOfCoreBandedLU.
+
+        Returns:
+            The solution, with the same shape as b.
+        """
+
+        z = self.factorization.solve(b) if out is None else \
+            self.factorization.solve(b, out)
+        z -= np.dot(self.Y, np.linalg.solve(self.capacitance, self._project(z)))
+
+        return z
+
+
+def factorize_corners(factorization, matrix):
+    """Returns a factorization of matrix from the factorization of its
+    band: the band one itself, or a CyclicBandedLU if the matrix has
+    entries outside its band."""
+
+    if not matrix.corners:
+        return factorization
+
+    return CyclicBandedLU(factorization, matrix.size, matrix.corners)
+
+
+def scratch_array(shape, directory=None):
+    """Returns a zero-filled array of floats backed by a temporary file.
+
+    The file is created in directory, or in the default temporary
+    directory, and on POSIX systems removed right away, so its space is
+    freed together with the array.
+
+    Arguments:
+        shape: Shape of the array.
+        directory: Optional directory of the file.
+
+    Returns:
+        A numpy.memmap.
+    """
+
+    handle, filename = tempfile.mkstemp(suffix=".npy", dir=directory)
+    os.close(handle)
+
+    array = np.lib.format.open_memmap(filename, mode="w+", dtype=float,
+                                      shape=tuple(np.atleast_1d(shape)))
+
+    if os.name == "posix":
+        os.unlink(filename)
+
+    return array
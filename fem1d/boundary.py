@@ -0,0 +1,261 @@
+import numbers
+from fem1d.banded import BandedMatrix
+
+
+#
+# Discussion:
+#
+#   Boundary conditions of a Model, given by its bc_type.
+#
+#   The legacy integer codes 1 to 4 combine Dirichlet and Neumann
+#   conditions, see Model. Any other combination is given as a pair of
+#   end conditions, e.g. (Robin(2.0), Dirichlet()), or as Periodic().
+#   The values of the conditions stay in bc_left and bc_right, so that
+#   they can change between solves, see Model.solve_rhs(), or in time,
+#   see fem1d.transient.
+#
+#   A condition acts on the assembled operator K and load vector F in
+#   two steps. The natural part adds the boundary terms of the weak form
+#   to K and F. The constraints then replace or combine rows, which has
+#   to be done on the final system matrix, e.g. M + dt * K in a
+#   transient solve. Both edit K in place, a dense array or a
+#   BandedMatrix.
+#
+
+
+def add_entry(K, i, j, value):
+    # Adds VALUE to entry (I, J) of a dense or banded matrix.
+    if isinstance(K, BandedMatrix):
+        K.add_entry(i, j, value)
+    else:
+        K[i, j] += value
+
+
+def set_identity_row(K, i):
+    # Replaces row I by the corresponding row of the identity.
+    if isinstance(K, BandedMatrix):
+        K.set_identity_row(i)
+    else:
+        K[i, :] = 0.0
+        K[i, i] = 1.0
+
+
+class Neumann(object):
+    """p * U' has the boundary value at the end."""
+
+    constrained = False
+
+    def add_operator(self, K, node, sign):
+        pass
+
+    def subtract_operator(self, F, u, node, sign):
+        pass
+
+    def add_load(self, F, node, sign, value):
+        # The boundary term -[ p * U' * W ] of the weak form, with the
+        # outward normal SIGN.
+        F[node] += sign * value
+
+    def constrain(self, K, node):
+        pass
+
+    def constrain_load(self, F, node, value):
+        pass
+
+    def subtract_constraint(self, F, u, node):
+        pass
+
+    def __repr__(self):
+        return "Neumann()"
+
+
+class Dirichlet(Neumann):
+    """U has the boundary value at the end."""
+
+    constrained = True
+
+    def add_load(self, F, node, sign, value):
+        pass
+
+    def constrain(self, K, node):
+        set_identity_row(K, node)
+
+    def constrain_load(self, F, node, value):
+        F[node] = value
+
+    def subtract_constraint(self, F, u, node):
+        F[node] -= u[node]
+
+    def __repr__(self):
+        return "Dirichlet()"
+
+
+class Robin(Neumann):
+    """p * U' + alpha * U has the boundary value at the end.
+
+    Neumann() is Robin(0.0). The problem is coercive for alpha >= 0 at
+    the right end and alpha <= 0 at the left end, e.g. for a flux
+    proportional to the difference with an outside value.
+
+    Attributes:
+        alpha (float): The coefficient of U.
+    """
+
+    def __init__(self, alpha):
+        self.alpha = float(alpha)
+
+    def add_operator(self, K, node, sign):
+        add_entry(K, node, node, sign * self.alpha)
+
+    def subtract_operator(self, F, u, node, sign):
+        F[node] -= sign * self.alpha * u[node]
+
+    def __repr__(self):
+        return "Robin({!r})".format(self.alpha)
+
+
+class BoundaryConditions(object):
+    """A condition at each end of the mesh.
+
+    Attributes:
+        left: Dirichlet, Neumann or Robin condition at X_LEFT.
+        right: Dirichlet, Neumann or Robin condition at X_RIGHT.
+    """
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+    def ends(self, size):
+        # Condition, node and outward normal of both ends.
+        return ((self.left, 0, -1), (self.right, size - 1, 1))
+
+    def constrained_dofs(self, size):
+        """Returns the rows of a system of SIZE rows replaced by
+        constraints."""
+
+        return [node for condition, node, sign in self.ends(size)
+                if condition.constrained]
+
+    def add_operator(self, K):
+        """Adds the boundary terms of the weak form to K."""
+
+        for condition, node, sign in self.ends(K.shape[0]):
+            condition.add_operator(K, node, sign)
+
+    def subtract_operator(self, F, u):
+        """Subtracts the boundary terms of K times u from F."""
+
+        for condition, node, sign in self.ends(len(F)):
+            condition.subtract_operator(F, u, node, sign)
+
+    def add_load(self, F, bc_left, bc_right):
+        """Adds the boundary values of the natural conditions to F."""
+
+        for (condition, node, sign), value in zip(self.ends(len(F)), (bc_left, bc_right)):
+            condition.add_load(F, node, sign, value)
+
+    def constrain(self, K):
+        """Replaces the rows of the constrained nodes of K."""
+
+        for condition, node, sign in self.ends(K.shape[0]):
+            condition.constrain(K, node)
+
+    def constrain_load(self, F, bc_left, bc_right):
+        """Sets the values of the constrained nodes in F."""
+
+        for (condition, node, sign), value in zip(self.ends(len(F)), (bc_left, bc_right)):
+            condition.constrain_load(F, node, value)
+
+    def subtract_constraints(self, F, u):
+        """Subtracts the constrained rows of the system times u from F,
+        for residuals."""
+
+        for condition, node, sign in self.ends(len(F)):
+            condition.subtract_constraint(F, u, node)
+
+    def __repr__(self):
+        return "BoundaryConditions({!r}, {!r})".format(self.left, self.right)
+
+
+class Periodic(object):
+    """U and p * U' are the same at both ends.
+
+    The equation of the last node is added to that of the first node and
+    replaced by U(last) - U(first) = 0. A banded K then gets entries in
+    its corners, outside the band, and is solved by the Sherman-Morrison-
+    Woodbury formula in O(N), see fem1d.banded.CyclicBandedLU.
+
+    Without a reaction term q or a time derivative, U is only defined up
+    to a constant and the system is singular. The boundary values are
+    not used.
+    """
+
+    def constrained_dofs(self, size):
+        return [size - 1]
+
+    def add_operator(self, K):
+        pass
+
+    def subtract_operator(self, F, u):
+        pass
+
+    def add_load(self, F, bc_left, bc_right):
+        pass
+
+    def constrain(self, K):
+        last = K.shape[0] - 1
+
+        if isinstance(K, BandedMatrix):
+            for j, value in K.row_entries(last):
+                K.add_entry(0, j, value)
+        else:
+            K[0, :] += K[last, :]
+
+        set_identity_row(K, last)
+        add_entry(K, last, 0, -1.0)
+
+    def constrain_load(self, F, bc_left, bc_right):
+        F[0] += F[-1]
+        F[-1] = 0.0
+
+    def subtract_constraints(self, F, u):
+        F[-1] -= u[-1] - u[0]
+
+    def __repr__(self):
+        return "Periodic()"
+
+
+# The legacy bc_type codes.
+CODES = {
+    1: (Dirichlet, Dirichlet),
+    2: (Dirichlet, Neumann),
+    3: (Neumann, Dirichlet),
+    4: (Neumann, Neumann),
+}
+
+
+def from_bc_type(bc_type):
+    """Returns the boundary conditions of a bc_type.
+
+    Arguments:
+        bc_type: A legacy code from 1 to 4, a pair of end conditions,
+            BoundaryConditions or Periodic.
+
+    Raises:
+        ValueError: For an unknown bc_type.
+    """
+
+    if isinstance(bc_type, numbers.Integral):
+        if bc_type not in CODES:
+            raise ValueError("Invalid boundary condition type: {}".format(bc_type))
+        left, right = CODES[bc_type]
+        return BoundaryConditions(left(), right())
+
+    if isinstance(bc_type, (tuple, list)) and len(bc_type) == 2:
+        return BoundaryConditions(*bc_type)
+
+    if hasattr(bc_type, "constrain"):
+        return bc_type
+
+    raise ValueError("Invalid boundary condition type: {!r}".format(bc_type))
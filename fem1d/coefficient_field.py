@@ -0,0 +1,63 @@
+from fem1d.utils import Utils
+
+
+class CoefficientField(object):
+    """Values of coefficient functions at named sets of points of a mesh.
+
+    Every mesh has one, see Mesh.coefficient_field, shared by the Model,
+    VMSModel and QoI objects built on it: a function is evaluated once on
+    a set of points, e.g. the quadrature points of every element, and
+    later requests for the same function on the same points return the
+    stored array, which is read-only.
+
+    A value is stored per name, e.g. "p", and set of points, together
+    with the function that produced it, so it is replaced as soon as the
+    coefficient of that name is another function. The field is cleared
+    when the nodes of the mesh change. Functions are assumed to always
+    return the same values; one that depends on outside state, e.g. a
+    global parameter, needs clear() when that state changes.
+
+    Attributes:
+        mesh (Mesh): The mesh.
+        hits (int): Number of requests answered from the stored values.
+        misses (int): Number of requests that called the function.
+    """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, name, function, x, points):
+        """Returns function evaluated on x, see Utils.evaluate.
+
+        Arguments:
+            name: Name of the coefficient, e.g. "p" or "qoi".
+            function: The coefficient function or constant.
+            x: Array of points.
+            points: Hashable name of the points x, e.g. ("quadrature", 3).
+        """
+
+        key = (name, points)
+        entry = self.values.get(key)
+
+        if entry is not None and entry[0] is function and entry[1].shape == x.shape:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = Utils.evaluate(function, x)
+        value.flags.writeable = False
+        self.values[key] = (function, value)
+
+        return value
+
+    def clear(self):
+        """Removes the stored values."""
+
+        self.values = {}
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
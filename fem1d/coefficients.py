@@ -0,0 +1,124 @@
+import numbers
+import numpy as np
+
+
+class Constant(object):
+    """Coefficient function with the same value everywhere.
+
+    Plain numbers are also treated as constants; the wrapper is for code
+    that expects a callable, e.g. the element loop of Model, and makes
+    the intent explicit. Models with constant coefficients use closed-form
+    element matrices instead of quadrature where they can.
+
+    Attributes:
+        value (float): The value of the coefficient.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = float(value)
+
+    def __call__(self, x):
+        return np.full(np.shape(x), self.value) if np.ndim(x) else self.value
+
+    def __repr__(self):
+        return "Constant({!r})".format(self.value)
+
+
+def constant_value(coefficient):
+    """Returns the value of a constant coefficient, or None.
+
+    Arguments:
+        coefficient: A Constant, a number, or a coefficient function.
+
+    Returns:
+        The value as a float if the coefficient is a Constant or a
+        number, otherwise None.
+    """
+
+    if isinstance(coefficient, Constant):
+        return coefficient.value
+
+    if isinstance(coefficient, numbers.Real):
+        return float(coefficient)
+
+    return None
+
+
+def as_function(coefficient):
+    """Returns a coefficient as a callable, wrapping numbers in Constant."""
+
+    return coefficient if callable(coefficient) else Constant(coefficient)
+
+
+class Nonlinear(object):
+    """Coefficient function of x, the solution u and its derivative du/dx.
+
+    The function is called as function(x, u, u_x) on arrays of the same
+    shape. Models with nonlinear coefficients are solved by Newton's
+    method, see fem1d.newton, which also needs the partial derivatives
+    with respect to u and u_x. They can be given as functions with the
+    same arguments; missing ones are approximated by forward differences.
+    Only the Galerkin Model supports them: VMSModel raises a ValueError,
+    as its stabilization would depend on u.
+
+    Attributes:
+        function: The coefficient c(x, u, u_x).
+        du: The partial derivative dc/du, or None.
+        du_x: The partial derivative dc/du_x, or None.
+    """
+
+    __slots__ = ("function", "du", "du_x")
+
+    def __init__(self, function, du=None, du_x=None):
+        self.function = function
+        self.du = du
+        self.du_x = du_x
+
+    def __call__(self, x, u, u_x):
+        return np.broadcast_to(self.function(x, u, u_x), np.shape(u))
+
+    def partial_u(self, x, u, u_x, value=None):
+        """Returns dc/du at the given points.
+
+        Arguments:
+            x, u, u_x: Arrays of points, solution values and derivatives.
+            value: The coefficient at these points, if already known;
+                only used by the finite difference approximation.
+        """
+
+        if self.du is not None:
+            return np.broadcast_to(self.du(x, u, u_x), np.shape(u))
+
+        if value is None:
+            value = self(x, u, u_x)
+
+        step = _difference_step(u)
+        return (self(x, u + step, u_x) - value) / step
+
+    def partial_u_x(self, x, u, u_x, value=None):
+        """Returns dc/du_x at the given points, see partial_u."""
+
+        if self.du_x is not None:
+            return np.broadcast_to(self.du_x(x, u, u_x), np.shape(u))
+
+        if value is None:
+            value = self(x, u, u_x)
+
+        step = _difference_step(u_x)
+        return (self(x, u, u_x + step) - value) / step
+
+    def __repr__(self):
+        return "Nonlinear({!r})".format(self.function)
+
+
+def _difference_step(values):
+    # Forward difference step that balances truncation and round-off.
+    return np.sqrt(np.finfo(float).eps) * (1.0 + np.abs(values))
+
+
+def is_nonlinear(coefficient):
+    """Returns whether a coefficient depends on the solution."""
+
+    return isinstance(coefficient, Nonlinear)
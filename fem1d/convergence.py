@@ -0,0 +1,318 @@
+import copy
+import math
+import time
+import multiprocessing
+import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from fem1d.qoi import QoI
+
+
+ConvergenceLevel = namedtuple(
+    "ConvergenceLevel", ["num_elements", "num_dofs", "h", "l2", "h1", "nodal",
+                         "qoi", "qoi_error", "time"])
+
+# Errors of a level, in the order of the table.
+ERRORS = ("l2", "h1", "nodal", "qoi_error")
+
+
+class ConvergenceStudy(object):
+    """Solves a model on a sequence of refined meshes and measures the
+    convergence of its errors.
+
+    The levels are copies of the model, on its mesh and on the meshes
+    obtained by bisecting every element, or on a given sequence of
+    meshes. Every level computes, with the exact solution u_exact:
+
+        l2:        the L2 norm of u_h - u,
+        h1:        the L2 norm of du_h/dx - du/dx, if du_exact is given,
+        nodal:     the largest error at the nodes,
+        qoi:       the QoI of qFunc, see fem1d.qoi, if one is given,
+        qoi_error: its error, |Q(u_h) - Q(u)|,
+
+    all from the values at the quadrature points of every element at
+    once. On a level the coefficients and the exact solution are
+    evaluated once per set of points through the coefficient field of
+    its mesh, shared by the solve, the QoI and the errors. The nodes of
+    bisected meshes are nested, so u_exact is evaluated at the nodes of
+    the finest level only and every coarser level takes its own every
+    2**k-th value; a nonlinear model also starts Newton's method from
+    the solution of the previous level, interpolated.
+
+    The levels are independent, so with workers they are solved in a
+    pool of processes, without the warm start. The model is inherited by
+    the workers with the "fork" start method; with the other start
+    methods it is pickled, so its coefficients must then be module-level
+    functions.
+
+    Attributes:
+        levels (list): One ConvergenceLevel per mesh, coarsest first,
+            after run().
+    """
+
+    def __init__(self, model, u_exact, du_exact=None, qFunc=None,
+                 num_refinements=4, meshes=None, num_quad_points=None,
+                 workers=None):
+        """Sets up the study.
+
+        Arguments:
+            model: The Model or VMSModel, with the coarsest mesh.
+            u_exact: The exact solution, a function of x.
+            du_exact: Optional derivative of the exact solution.
+            qFunc: Optional function of the QoI.
+            num_refinements: Number of uniform bisections of the mesh of
+                the model, unless meshes is given.
+            meshes: Optional sequence of meshes, coarsest first.
+            num_quad_points: Quadrature points per element of the errors,
+                by default basis_function_order + 2.
+            workers: Optional number of processes.
+        """
+
+        self.model = model
+        self.u_exact = u_exact
+        self.du_exact = du_exact
+        self.qFunc = qFunc
+        self.num_quad_points = num_quad_points or model.basis_function_order + 2
+        self.workers = workers
+        self.nested = meshes is None
+
+        if meshes is None:
+            meshes = [model.mesh]
+            for refinement in range(num_refinements):
+                meshes.append(meshes[-1].refine(np.ones(meshes[-1].num_elements, dtype=bool)))
+
+        self.meshes = list(meshes)
+        self.nodal_exact = None
+        self.levels = []
+
+    def run(self):
+        """Solves every level.
+
+        Returns:
+            The list of ConvergenceLevel.
+        """
+
+        if self.nested:
+            # Values at the nodes of the finest mesh, for every level.
+            x = self.meshes[-1].dof_coordinates(self.model.basis_function_order)
+            self.nodal_exact = self.meshes[-1].coefficient_field.evaluate(
+                "u_exact", self.u_exact, x, "nodes")
+
+        indices = range(len(self.meshes))
+
+        if self.workers is not None and self.workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=min(self.workers, len(self.meshes)),
+                mp_context=multiprocessing.get_context(),
+                initializer=_initialize, initargs=(self,))
+            with executor:
+                self.levels = list(executor.map(_solve_level, indices))
+        else:
+            self.levels = []
+            previous = None
+            for index in indices:
+                level, previous = self.solve_level(index, previous)
+                self.levels.append(level)
+
+        return self.levels
+
+    def solve_level(self, index, previous=None):
+        """Solves the level of the mesh of the given index.
+
+        Arguments:
+            index: Index of the mesh.
+            previous: Optional solved model of the previous level, whose
+                solution starts Newton's method for nonlinear models.
+
+        Returns:
+            Tuple of the ConvergenceLevel and the solved model.
+        """
+
+        mesh = self.meshes[index]
+        order = self.model.basis_function_order
+        n = self.num_quad_points
+
+        model = copy.copy(self.model)
+        model.mesh = mesh
+        model.u = None
+        model.K = None
+        model.F = None
+        model.factorization = None
+        model.load_data = None
+
+        if previous is not None and model.nonlinear():
+            model.u = previous.interpolate_at(mesh.dof_coordinates(order))
+
+        start = time.perf_counter()
+        model.solve()
+        elapsed = time.perf_counter() - start
+
+        quad = model.quadrature_data(n)
+        points = model.quadrature_points(n)
+        field = mesh.coefficient_field
+
+        error = model.interpolate_field(n) - field.evaluate("u_exact", self.u_exact, quad.x, points)
+        l2 = math.sqrt(np.sum(quad.w * error**2))
+
+        h1 = None
+        if self.du_exact is not None:
+            error = model.interpolate_field(n, 1) - \
+                field.evaluate("du_exact", self.du_exact, quad.x, points)
+            h1 = math.sqrt(np.sum(quad.w * error**2))
+
+        if self.nodal_exact is not None:
+            stride = 2**(len(self.meshes) - 1 - index)
+            exact = self.nodal_exact[::stride]
+        else:
+            exact = field.evaluate("u_exact", self.u_exact,
+                                   mesh.dof_coordinates(order), "nodes")
+        nodal = float(np.max(np.abs(model.u - exact)))
+
+        value = value_error = None
+        if self.qFunc is not None:
+            qoi = QoI(model, self.qFunc, self.u_exact, n)
+            qoi.compute()
+            value = float(qoi.value)
+            value_error = float(abs(qoi.value - qoi.value_exact))
+
+        level = ConvergenceLevel(mesh.num_elements, len(model.u), float(np.max(mesh.h)),
+                                 l2, h1, nodal, value, value_error, elapsed)
+
+        return level, model
+
+    def rates(self, name):
+        """Returns the observed rates of an error between consecutive
+        levels, see observed_rates()."""
+
+        return observed_rates([level.h for level in self.levels],
+                              [getattr(level, name) for level in self.levels])
+
+    def fitted_rate(self, name):
+        """Returns the least-squares rate of an error over all levels,
+        see fit_rate()."""
+
+        return fit_rate([level.h for level in self.levels],
+                        [getattr(level, name) for level in self.levels])
+
+    def extrapolated_qoi(self, order=None):
+        """Returns the Richardson extrapolation of the QoI, see richardson()."""
+
+        return richardson([level.qoi for level in self.levels],
+                          [level.h for level in self.levels], order)
+
+    def table(self):
+        """Returns the results as a table, one line per level, with the
+        rate of every error and the extrapolated QoI."""
+
+        columns = ["{:>9s} {:>9s} {:>10s}".format("N", "dofs", "h")]
+        for name in ERRORS:
+            columns.append("{:>11s} {:>6s}".format(name, "rate"))
+        columns.append("{:>17s} {:>17s}".format("qoi", "extrapolated"))
+        lines = [" ".join(columns)]
+
+        rates = dict((name, self.rates(name)) for name in ERRORS)
+        extrapolated = self.extrapolated_qoi()[0] if self.qFunc is not None \
+            else [None] * len(self.levels)
+
+        for i, level in enumerate(self.levels):
+            columns = ["{:9d} {:9d} {:10.4e}".format(level.num_elements,
+                                                     level.num_dofs, level.h)]
+            for name in ERRORS:
+                columns.append("{:>11s} {:>6s}".format(
+                    _format(getattr(level, name), "{:11.4e}"),
+                    _format(rates[name][i], "{:6.2f}")))
+            columns.append("{:>17s} {:>17s}".format(_format(level.qoi, "{:17.10e}"),
+                                                    _format(extrapolated[i], "{:17.10e}")))
+            lines.append(" ".join(columns))
+
+        fitted = ["{} {:.3f}".format(name, self.fitted_rate(name)) for name in ERRORS
+                  if getattr(self.levels[0], name) is not None]
+        lines.append("Fitted rates: " + ", ".join(fitted))
+
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.table()
+
+
+def observed_rates(h, errors):
+    """Returns log(e_k-1 / e_k) / log(h_k-1 / h_k) for every level k, or
+    None for the first level and where an error is missing or zero."""
+
+    rates = [None]
+
+    for k in range(1, len(h)):
+        if errors[k - 1] and errors[k]:
+            rates.append(math.log(errors[k - 1] / errors[k]) / math.log(h[k - 1] / h[k]))
+        else:
+            rates.append(None)
+
+    return rates
+
+
+def fit_rate(h, errors):
+    """Returns the slope of the least-squares line of log(error) against
+    log(h), over the levels with an error, or None."""
+
+    points = [(math.log(size), math.log(error)) for size, error in zip(h, errors)
+              if error]
+
+    if len(points) < 2:
+        return None
+
+    x, y = np.array(points).T
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def richardson(values, h, order=None):
+    """Richardson extrapolation of a sequence of values that converge as
+    h**order.
+
+    For every level k the extrapolated value is
+
+        Q_k + ( Q_k - Q_k-1 ) / ( (h_k-1 / h_k)**order - 1 ).
+
+    Without an order, the order is estimated from the last three levels,
+    so the first two have no extrapolated value.
+
+    Returns:
+        Tuple of the lists of extrapolated values and of orders, with
+        None where they are not available.
+    """
+
+    extrapolated = [None] * len(values)
+    orders = [None] * len(values)
+
+    for k in range(1, len(values)):
+        p = order
+
+        if p is None and k >= 2:
+            previous = values[k - 1] - values[k - 2]
+            last = values[k] - values[k - 1]
+            if previous != 0.0 and last != 0.0 and previous / last > 0.0:
+                p = math.log(previous / last) / math.log(h[k - 1] / h[k])
+
+        if p is not None and p > 0.0:
+            orders[k] = p
+            extrapolated[k] = values[k] + (values[k] - values[k - 1]) / \
+                ((h[k - 1] / h[k])**p - 1.0)
+
+    return extrapolated, orders
+
+
+def _format(value, style):
+    return "-" if value is None else style.format(value)
+
+
+# Study of the current worker process.
+_state = {}
+
+
+def _initialize(study):
+    # Records of the workers would be lost, or written concurrently.
+    study.model.stats = None
+    _state["study"] = study
+
+
+def _solve_level(index):
+    return _state["study"].solve_level(index)[0]
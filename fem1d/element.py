@@ -1,5 +1,112 @@
 import sys
 import numpy as np
+from collections import namedtuple
+from functools import lru_cache
+from fem1d.quadrature_rule import QuadratureRule
+
+
+# Highest supported order of the Lagrange basis functions.
+MAX_ORDER = 8
+
+ReferenceBasis = namedtuple(
+    "ReferenceBasis", ["xi", "w", "basis", "basis_xi", "basis_xixi",
+                       "products"])
+
+
+@lru_cache(maxsize=None)
+def lagrange_coefficients(order):
+    """Legendre coefficients of the Lagrange basis functions.
+
+    The basis function of local node A is the polynomial of degree order
+    that is 1 at node A and 0 at the other nodes, which are equally
+    spaced on -1 <= xi <= 1 and numbered from left to right. Expanding
+    in Legendre polynomials keeps the interpolation well conditioned.
+
+    Arguments:
+        order: Order of the basis functions, between 1 and MAX_ORDER.
+
+    Returns:
+        Read-only array of shape (order + 1, order + 1) whose column A
+        holds the Legendre coefficients of basis function A.
+    """
+
+    if not 1 <= order <= MAX_ORDER:
+        raise ValueError("Invalid basis function order: {}".format(order))
+
+    xi_at_node = np.linspace(-1, 1, order + 1)
+    coefficients = np.linalg.inv(
+        np.polynomial.legendre.legvander(xi_at_node, order))
+    coefficients.setflags(write=False)
+
+    return coefficients
+
+
+def shape_functions(order, xi, derivative=0):
+    """Evaluates the basis functions on the reference element -1 <= xi <= 1.
+
+    Arguments:
+        order: Order of the basis functions.
+        xi: Array of reference coordinates.
+        derivative: Order of the derivative with respect to xi.
+
+    Returns:
+        Array of shape xi.shape + (order + 1,) with the value of every
+        basis function, or of its derivative, at xi.
+    """
+
+    xi = np.asarray(xi, dtype=float)
+    coefficients = lagrange_coefficients(order)
+
+    if derivative:
+        coefficients = np.polynomial.legendre.legder(
+            coefficients, m=derivative, axis=0)
+
+    return np.moveaxis(np.polynomial.legendre.legval(xi, coefficients), 0, -1)
+
+
+@lru_cache(maxsize=32)
+def reference_basis(order, num_quad_points, family="legendre"):
+    """Tabulates the basis functions at the reference quadrature points.
+
+    The table is the same for every element, so it is computed once per
+    (order, num_quad_points, family) and kept in a bounded LRU cache.
+    Physical derivatives follow by scaling with dxi/dx = 2 / h.
+
+    Arguments:
+        order: Order of the basis functions.
+        num_quad_points: Number of quadrature points.
+        family: Quadrature family, see QuadratureRule.
+
+    Returns:
+        A read-only ReferenceBasis with the quadrature points xi and
+        weights w, the arrays basis, basis_xi and basis_xixi of shape
+        (num_quad_points, order + 1) holding the basis functions and
+        their first and second derivatives with respect to xi, and a
+        dict products of basis products flattened over the (I, J) pairs
+        to shape (num_quad_points, (order + 1)**2). The keys name the
+        two factors: "N" is W, "B" is dW/dxi and "C" is d2W/dxi2, so
+        "NB" is W_I * dW_J/dxi.
+    """
+
+    quad_rule = QuadratureRule(num_quad_points, family)
+    factors = {"N": shape_functions(order, quad_rule.xi_q),
+               "B": shape_functions(order, quad_rule.xi_q, 1),
+               "C": shape_functions(order, quad_rule.xi_q, 2)}
+
+    products = {}
+    for left in "NBC":
+        for right in "NBC":
+            products[left + right] = np.einsum(
+                'qi,qj->qij', factors[left], factors[right]).reshape(
+                    num_quad_points, -1)
+
+    table = ReferenceBasis(quad_rule.xi_q, quad_rule.w_q, factors["N"],
+                           factors["B"], factors["C"], products)
+
+    for array in tuple(factors.values()) + tuple(products.values()):
+        array.setflags(write=False)
+
+    return table
 
 
 class LinearElement(object):
@@ -11,6 +118,8 @@ class LinearElement(object):
         x_r (float): x-coordinate of the right boundary of the element.
     """
 
+    __slots__ = ("num_nodes", "index", "x_left", "x_right", "h")
+
     def __init__(self, index, x_left, x_right):
         self.num_nodes = 2
         self.index = index
@@ -74,3 +183,23 @@ class LinearElement(object):
             raise ValueError("Invalid local node")
 
         return phi_x
+
+    def basis_hessian(self, x, local_node):
+        #
+        # Inputs:
+        #
+        #   (int OR numpy.ndarray) local_node, the index of the basis
+        #       function.
+        #
+        #   (float) x, the evaluation point.
+        #
+        # Outputs:
+        #
+        #   (float) phi_xx, the value of the second derivative of the
+        #       basis function, which is zero for linear elements.
+        #
+
+        if local_node not in (0, 1):
+            raise ValueError("Invalid local node")
+
+        return np.zeros_like(np.asarray(x, dtype=float))
@@ -1,61 +1,91 @@
 import sys
 import numpy as np
+from fem1d.element import shape_functions
 
 
 class Element(object):
-    """1D element with basis functions of arbitrary order.
+    """1D element with Lagrange basis functions of arbitrary order.
+
+    The element has basis_function_order + 1 nodes, equally spaced between
+    its boundaries and numbered from left to right, so local node 0 is the
+    left boundary and local node basis_function_order the right one.
 
     Attributes:
         index (int): Index of the element.
-        x_l (float): x-coordinate of the left boundary of the element.
-        x_r (float): x-coordinate of the right boundary of the element.
+        basis_function_order (int): Order of the basis functions.
+        x_left (float): x-coordinate of the left boundary of the element.
+        x_right (float): x-coordinate of the right boundary of the element.
     """
 
-    def __init__(self, index, basis_function_order, x_l, x_r):
-        self.local_nodes = 2
+    __slots__ = ("num_nodes", "index", "basis_function_order", "x_left",
+                 "x_right", "h")
+
+    def __init__(self, index, basis_function_order, x_left, x_right):
+        self.num_nodes = basis_function_order + 1
         self.index = index
         self.basis_function_order = basis_function_order
-        self.x_l = x_l
-        self.x_r = x_r
-        self.xi_at_node = np.linspace(x_l, x_r, basis_function_order)
+        self.x_left = x_left
+        self.x_right = x_right
+        self.h = x_right - x_left
 
-    def basis_function(self, x, local_node):
-        x = np.asarray(x)
-        y = np.zeros_like(x)
-
-        if local_node == 0:
-            y += ((x >= self.x_l) & (x <= self.x_r)) * \
-                 (self.x_r - x) / (self.x_r - self.x_l)
-        elif local_node == 1:
-            y += ((x >= self.x_l) & (x <= self.x_r)) * \
-                 (x - self.x_l) / (self.x_r - self.x_l)
-        else:
-            raise ValueError("Invalid local node")
+    @property
+    def x_at_node(self):
+        return np.linspace(self.x_left, self.x_right, self.num_nodes)
 
-        return y
+    def _reference(self, x, local_node, derivative):
+        if not 0 <= local_node < self.num_nodes:
+            raise ValueError("Invalid local node")
 
-    def test(self, node, xi):
-        value = 1.0
+        x = np.asarray(x, dtype=float)
+        xi = 2.0 * (x - self.x_left) / self.h - 1.0
+        inside = (x >= self.x_left) & (x <= self.x_right)
 
-        A = node
+        value = shape_functions(self.basis_function_order, xi, derivative)
+        return inside * value[..., local_node] * (2.0 / self.h)**derivative
 
-        for B in range(basis_function_order):
-            if B != A:
-                value *= (xi - xi_at_node(B)) / (xi_at_node(A) - xi_at_node(B))
+    def basis_function(self, x, local_node):
+        #
+        # Inputs:
+        #
+        #   (int) local_node, the index of the basis function.
+        #
+        #   (float OR numpy.ndarray) x, the evaluation point.
+        #
+        # Outputs:
+        #
+        #   (float) phi, the value of the basis function at x.
+        #
 
-        return value
+        return self._reference(x, local_node, 0)
 
     def basis_gradient(self, x, local_node):
-        x = np.asarray(x)
-        y = np.zeros_like(x)
-
-        if local_node == 0:
-            y += ((x >= self.x_l) & (x <= self.x_r)) * \
-                 -1 / (self.x_r - self.x_l)
-        elif local_node == 1:
-            y += ((x >= self.x_l) & (x <= self.x_r)) * \
-                 1 / (self.x_r - self.x_l)
-        else:
-            raise ValueError("Invalid local node")
+        #
+        # Inputs:
+        #
+        #   (int) local_node, the index of the basis function.
+        #
+        #   (float OR numpy.ndarray) x, the evaluation point.
+        #
+        # Outputs:
+        #
+        #   (float) phi_x, the value of the derivative of the basis
+        #       function at x.
+        #
+
+        return self._reference(x, local_node, 1)
+
+    def basis_hessian(self, x, local_node):
+        #
+        # Inputs:
+        #
+        #   (int) local_node, the index of the basis function.
+        #
+        #   (float OR numpy.ndarray) x, the evaluation point.
+        #
+        # Outputs:
+        #
+        #   (float) phi_xx, the value of the second derivative of the
+        #       basis function at x.
+        #
 
-        return y
+        return self._reference(x, local_node, 2)
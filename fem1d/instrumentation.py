@@ -0,0 +1,209 @@
+import time
+import numbers
+from fem1d.coefficients import Constant, Nonlinear
+
+
+class Stats(object):
+    """Timings, call counts and values recorded by an instrumented Model,
+    VMSModel or QoI, see Model.instrument() and QoI.instrument().
+
+    Phases are named sections of the computation, e.g. "assemble" or
+    "linear_solve". Their times are inclusive: "assemble" contains
+    "coefficients", the evaluation of the coefficient functions.
+
+    Every record is also passed to the sink, if any, as a dictionary
+    with the keys "type" ("phase", "call" or "value"), "name" and "time"
+    or "value", e.g. to log it or write it as a line of JSON.
+
+    Attributes:
+        phases (dict): Total wall time in seconds of every phase.
+        phase_counts (dict): Number of times every phase ran.
+        calls (dict): Number of calls of every coefficient function.
+        call_times (dict): Total time in seconds spent in every
+            coefficient function.
+        values (dict): Last value of every recorded quantity, e.g.
+            "matrix_size", "matrix_nnz" and "residual".
+        sink: Callable that receives every record, or None.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.reset()
+
+    def reset(self):
+        """Clears all the records."""
+
+        self.phases = {}
+        self.phase_counts = {}
+        self.calls = {}
+        self.call_times = {}
+        self.values = {}
+
+    def phase(self, name):
+        """Returns a context manager that times a phase."""
+
+        return _Phase(self, name)
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        self.phase_counts[name] = self.phase_counts.get(name, 0) + 1
+
+        if self.sink is not None:
+            self.sink({"type": "phase", "name": name, "time": seconds})
+
+    def add_call(self, name, seconds):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.call_times[name] = self.call_times.get(name, 0.0) + seconds
+
+        if self.sink is not None:
+            self.sink({"type": "call", "name": name, "time": seconds})
+
+    def set_value(self, name, value):
+        self.values[name] = value
+
+        if self.sink is not None:
+            self.sink({"type": "value", "name": name, "value": value})
+
+    def as_dict(self):
+        """Returns the records as a dictionary of dictionaries."""
+
+        return {"phases": dict(self.phases),
+                "phase_counts": dict(self.phase_counts),
+                "calls": dict(self.calls),
+                "call_times": dict(self.call_times),
+                "values": dict(self.values)}
+
+    def __str__(self):
+        lines = ["Phase                     Time [s]     Count"]
+        for name in sorted(self.phases, key=self.phases.get, reverse=True):
+            lines.append("{:24s} {:10.4e} {:9d}".format(
+                name, self.phases[name], self.phase_counts[name]))
+
+        if self.calls:
+            lines.append("Function                  Time [s]     Calls")
+            for name in sorted(self.calls):
+                lines.append("{:24s} {:10.4e} {:9d}".format(
+                    name, self.call_times[name], self.calls[name]))
+
+        for name in sorted(self.values):
+            lines.append("{:24s} {}".format(name, self.values[name]))
+
+        return "\n".join(lines)
+
+
+class _Phase(object):
+
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.stats.add_phase(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullPhase(object):
+
+    # Shared do-nothing context manager of disabled instrumentation.
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+def phase(stats, name):
+    """Returns a context manager that times a phase in stats, or one that
+    does nothing if stats is None.
+
+    With instrumentation disabled a phase only costs this call and an
+    empty with block.
+    """
+
+    return NULL_PHASE if stats is None else _Phase(stats, name)
+
+
+class CountedFunction(object):
+    """Wrapper of a coefficient function that records its calls in a
+    Stats object.
+
+    Attributes:
+        function: The wrapped function.
+        name (str): Name of the function in the records.
+        stats (Stats): Where the calls are recorded.
+    """
+
+    __slots__ = ("function", "name", "stats")
+
+    def __init__(self, function, name, stats):
+        self.function = function
+        self.name = name
+        self.stats = stats
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        try:
+            return self.function(*args)
+        finally:
+            self.stats.add_call(self.name, time.perf_counter() - start)
+
+    def __repr__(self):
+        return "CountedFunction({!r}, {!r})".format(self.function, self.name)
+
+
+def counted(coefficient, name, stats):
+    """Wraps a coefficient so that the calls of its functions are recorded.
+
+    Constants and numbers are returned unchanged, since they are never
+    called, so the models keep using their closed-form element matrices.
+    The functions of a Nonlinear coefficient are wrapped one by one, the
+    derivatives as name + "_du" and name + "_du_x".
+
+    Arguments:
+        coefficient: A coefficient of a Model or a function of a QoI.
+        name: Name of the coefficient in the records.
+        stats: The Stats object.
+    """
+
+    coefficient = uncounted(coefficient)
+
+    if coefficient is None or isinstance(coefficient, (Constant, numbers.Number)):
+        return coefficient
+
+    if isinstance(coefficient, Nonlinear):
+        return Nonlinear(
+            counted(coefficient.function, name, stats),
+            counted(coefficient.du, name + "_du", stats),
+            counted(coefficient.du_x, name + "_du_x", stats))
+
+    if callable(coefficient):
+        return CountedFunction(coefficient, name, stats)
+
+    return coefficient
+
+
+def uncounted(coefficient):
+    """Returns the coefficient wrapped by counted()."""
+
+    if isinstance(coefficient, CountedFunction):
+        return coefficient.function
+
+    if isinstance(coefficient, Nonlinear) and any(
+            isinstance(function, CountedFunction) for function in
+            (coefficient.function, coefficient.du, coefficient.du_x)):
+        return Nonlinear(uncounted(coefficient.function),
+                         uncounted(coefficient.du), uncounted(coefficient.du_x))
+
+    return coefficient
@@ -2,13 +2,229 @@ import sys
 import math
 import numpy as np
 from fem1d.element import LinearElement
+from fem1d.coefficient_field import CoefficientField
+
+
+class ElementList(object):
+    """Read-only sequence of the elements of a Mesh.
+
+    The mesh only stores arrays, so the LinearElement objects are built
+    on demand when they are indexed or iterated over and are not kept.
+
+    Attributes:
+        mesh (Mesh): The mesh the elements belong to.
+    """
+
+    __slots__ = ("mesh",)
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+
+    def __len__(self):
+        return self.mesh.num_elements
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("Element index out of range")
+
+        return LinearElement(index, self.mesh.x[index], self.mesh.x[index+1])
+
+    def __iter__(self):
+        x = self.mesh.x
+        for i in range(len(self)):
+            yield LinearElement(i, x[i], x[i+1])
 
 
 class Mesh(object):
-    def __init__(self, x, elements):
+    """1D mesh stored as contiguous arrays.
+
+    The element sizes and the connectivity are computed on first use, so
+    a mesh whose x is a numpy.memmap does not load the nodes until they
+    are needed, e.g. for the chunked assembly of Model. They are computed
+    again, and the coefficient field is cleared, when x is assigned.
+
+    Attributes:
+        x (numpy.ndarray): Node coordinates, shape (num_elements + 1,).
+        h (numpy.ndarray): Element sizes, shape (num_elements,).
+        connectivity (numpy.ndarray): Indices of the left and right node
+            of every element, shape (num_elements, 2).
+        num_elements (int): Number of elements.
+        coefficient_field (CoefficientField): Coefficient values at the
+            points of the mesh, shared by the models built on it.
+        elements (ElementList): The elements, built lazily as
+            LinearElement objects.
+    """
+
+    def __init__(self, x, elements=None):
+        self._coefficient_field = None
         self.x = x
+
+        # Elements are built lazily from the arrays. An explicit list of
+        # elements is still accepted for backwards compatibility.
+        if elements is None:
+            elements = ElementList(self)
+
         self.elements = elements
-        self.num_elements = len(elements)
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, x):
+        self._x = np.ascontiguousarray(x, dtype=float)
+        self.num_elements = len(self._x) - 1
+        self._h = None
+        self._connectivity = None
+
+        if self._coefficient_field is not None:
+            self._coefficient_field.clear()
+
+    @property
+    def coefficient_field(self):
+        if self._coefficient_field is None:
+            self._coefficient_field = CoefficientField(self)
+        return self._coefficient_field
+
+    @property
+    def h(self):
+        if self._h is None:
+            self._h = np.diff(self.x)
+        return self._h
+
+    @property
+    def connectivity(self):
+        if self._connectivity is None:
+            index = np.arange(self.num_elements)
+            self._connectivity = np.stack((index, index + 1), axis=-1)
+        return self._connectivity
+
+    @property
+    def x_left(self):
+        """Left node coordinate of every element."""
+        return self.x[:-1]
+
+    def num_dofs(self, order=1):
+        """Number of nodes of a discretization with basis functions of
+        the given order."""
+        return self.num_elements * order + 1
+
+    def dofs(self, order=1):
+        """Global node indices of every element for basis functions of the
+        given order.
+
+        The nodes are numbered from left to right, so element e holds the
+        nodes e*order, ..., (e+1)*order and shares its first and last node
+        with its neighbours.
+
+        Returns:
+            Array of shape (num_elements, order + 1).
+        """
+
+        if order == 1:
+            return self.connectivity
+
+        return order * np.arange(self.num_elements)[:, None] + \
+            np.arange(order + 1)[None, :]
+
+    def dof_coordinates(self, order=1):
+        """x-coordinates of the nodes of a discretization with basis
+        functions of the given order, equally spaced within every element.
+
+        Returns:
+            Array of shape (num_dofs(order),).
+        """
+
+        if order == 1:
+            return self.x
+
+        x = np.empty(self.num_dofs(order))
+        fraction = np.arange(order) / float(order)
+        x[:-1] = (self.x_left[:, None] + fraction[None, :] *
+                  self.h[:, None]).ravel()
+        x[-1] = self.x[-1]
+
+        return x
+
+    def locate(self, x):
+        """Index of the element that contains each point.
+
+        Points on a node belong to the element on their right, except for
+        the last node, and points outside the mesh to the closest element.
+
+        Arguments:
+            x: Array of points.
+
+        Returns:
+            Integer array with the shape of x.
+        """
+
+        index = np.searchsorted(self.x, x, side="right") - 1
+        return np.clip(index, 0, self.num_elements - 1)
+
+    def refine(self, marked):
+        """Bisects the marked elements.
+
+        Arguments:
+            marked: Boolean mask of shape (num_elements,) or array of
+                element indices.
+
+        Returns:
+            A new Mesh.
+        """
+
+        marked = self._mask(marked)
+        midpoints = self.x_left[marked] + 0.5 * self.h[marked]
+
+        # Every midpoint goes right after the left node of its element.
+        x = np.insert(self.x, np.flatnonzero(marked) + 1, midpoints)
+
+        return type(self)(x)
+
+    def coarsen(self, marked):
+        """Merges pairs of neighbouring marked elements.
+
+        The node between two marked elements is removed, skipping every
+        other candidate node so that at most two elements are merged into
+        one and the ends of the domain are kept.
+
+        Arguments:
+            marked: Boolean mask of shape (num_elements,) or array of
+                element indices.
+
+        Returns:
+            A new Mesh.
+        """
+
+        marked = self._mask(marked)
+
+        # Interior node i is shared by elements i-1 and i.
+        candidates = np.flatnonzero(marked[:-1] & marked[1:]) + 1
+
+        removed = []
+        for node in candidates.tolist():
+            if not removed or node > removed[-1] + 1:
+                removed.append(node)
+
+        return type(self)(np.delete(self.x, removed))
+
+    def _mask(self, marked):
+        marked = np.asarray(marked)
+
+        if marked.dtype == bool:
+            if marked.shape != (self.num_elements,):
+                raise ValueError("Mask must have one entry per element")
+            return marked
+
+        mask = np.zeros(self.num_elements, dtype=bool)
+        mask[marked] = True
+        return mask
 
     @classmethod
     def uniform_grid(cls, x_start, x_end, num_elements):
@@ -25,10 +241,7 @@ class Mesh(object):
 
         x = np.linspace(x_start, x_end, num_elements+1)
 
-        # Create list of instances of Element
-        elements = [LinearElement(i, x[i], x[i+1]) for i in range(len(x)-1)]
-
-        return cls(x, elements)
+        return cls(x)
 
     @classmethod
     def non_uniform_grid(cls, x_start, x_end, num_elements, ratio):
@@ -51,7 +264,4 @@ class Mesh(object):
         # Scale to start at x_start and end at x_end
         x = x_start + x * (x_end-x_start)
 
-        # Create list of instances of Element
-        elements = [LinearElement(i, x[i], x[i+1]) for i in range(len(x)-1)]
-
-        return cls(x, elements)
+        return cls(x)
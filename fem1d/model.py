@@ -1,9 +1,38 @@
 import sys
+import copy
 import numpy as np
 import math
+from collections import namedtuple
 from functools import partial
 from fem1d.utils import Utils
+from fem1d.coefficients import as_function, constant_value, is_nonlinear
 from fem1d.quadrature_rule import QuadratureRule
+from fem1d.banded import BandedMatrix, OutOfCoreBandedLU, CHUNK_ROWS, scratch_array, \
+    factorize_corners
+from fem1d.boundary import from_bc_type
+from fem1d.mesh import Mesh
+from fem1d.multigrid import Multigrid
+from fem1d.parallel import assemble_parallel
+from fem1d.newton import NewtonSolver
+from fem1d.instrumentation import Stats, phase, counted, uncounted
+from fem1d.element import reference_basis, shape_functions
+from fem1d.element_2 import Element
+
+
+QuadratureData = namedtuple(
+    "QuadratureData", ["x", "w", "h", "basis", "basis_xi", "basis_xixi",
+                       "dxi_dx", "products"])
+
+Coefficients = namedtuple("Coefficients", ["p", "q", "r", "f"])
+
+# Integrals over the reference linear element, with the element size
+# factored out, used by Model.element_templates().
+STIFFNESS = np.array([[1.0, -1.0], [-1.0, 1.0]])
+MASS = np.array([[2.0, 1.0], [1.0, 2.0]]) / 6.0
+ADVECTION = np.array([[-1.0, 1.0], [-1.0, 1.0]]) / 2.0
+LOAD = np.array([1.0, 1.0]) / 2.0
+GRADIENT = np.array([-1.0, 1.0])
+
 
 class Model(object):
     #
@@ -15,15 +44,21 @@ class Model(object):
     #
     #     -d/dx ( p(x) du/dx ) + q(x) * u + r(x) * du/dx = f(x)
     #
-    #   The finite element method uses piecewise linear basis
-    #   functions.
+    #   The finite element method uses piecewise Lagrange basis
+    #   functions of order 1 (linear) up to 8.
     #
     #   Here U is an unknown scalar function of X defined on the
-    #   interval [XL, XR], and P, Q, and F are given functions of X.
+    #   interval [XL, XR], and P, Q, R and F are given functions of X.
+    #   They may also depend on U and dU/dX, as
+    #   fem1d.coefficients.Nonlinear functions, in which case solve()
+    #   uses Newton's method, see fem1d.newton.
     #
 
     def __init__(self, mesh, p, q, r, f, bc_type, bc_left, bc_right,
-        num_quad_points=2, basis_function_order=2):
+        num_quad_points=2, basis_function_order=1, assembly="vectorized",
+        storage="banded", solver="direct", solver_options=None,
+        nonlinear_options=None, chunk_size=None, directory=None,
+        workers=None):
         #
         #
         #
@@ -51,6 +86,10 @@ class Model(object):
         #            at the right endpoint, U has the value U_RIGHT.
         #         4, at the left endpoint, U' has the value U_LEFT,
         #            at the right endpoint, U' has the value U_RIGHT.
+        #         Other conditions are given as a pair of
+        #         fem1d.boundary conditions for the left and right
+        #         endpoints, e.g. (Robin(2.0), Dirichlet()), or as
+        #         fem1d.boundary.Periodic(). U' stands for p * dU/dx.
         #
         #     (float) bc_left
         #         The value of the boundary condition at X = X_LEFT.
@@ -59,7 +98,66 @@ class Model(object):
         #         The value of the boundary condition at X = X_RIGHT.
         #
         #     (int) num_quad_points
-        #         The number of quadrature points per element.
+        #         The number of quadrature points per element. Use at
+        #         least basis_function_order + 1 points.
+        #
+        #     (int) basis_function_order
+        #         The order of the Lagrange basis functions, from 1 to 8.
+        #         Element E holds the nodes E*ORDER, ..., (E+1)*ORDER, so
+        #         U has num_elements * ORDER + 1 entries located at
+        #         mesh.dof_coordinates(ORDER).
+        #
+        #     (str) assembly
+        #         "vectorized" builds all element matrices at once,
+        #         "loop" builds them one scalar at a time.
+        #
+        #     (str) storage
+        #         "banded" stores K by its diagonals and solves it with a
+        #         banded LU factorization in O(N); the bandwidth is the
+        #         basis function order. "dense" stores K as a
+        #         full matrix and uses numpy.linalg.solve, which is only
+        #         meant for debugging small problems. "memmap" is the
+        #         banded storage with K, F and U in memory-mapped files,
+        #         for meshes larger than memory: K is factorized in place
+        #         by fem1d.banded.OutOfCoreBandedLU, a window of rows at a
+        #         time, so it holds the LU factors after solve().
+        #
+        #     (str) solver
+        #         "direct" solves K with the factorization of its storage.
+        #         "multigrid" uses the geometric multigrid solver of
+        #         fem1d.multigrid, which needs banded storage and an even
+        #         number of elements to build coarser levels. The
+        #         iterations of the last solve are kept in solver_info.
+        #         The unstabilized Galerkin method is not a good target for
+        #         convection-dominated problems, where its coarse levels
+        #         are unstable; use a VMSModel there.
+        #
+        #     (dict) solver_options
+        #         Keyword arguments of fem1d.multigrid.Multigrid, e.g.
+        #         tolerance and max_iterations.
+        #
+        #     (int) chunk_size
+        #         Assemble a chunk of CHUNK_SIZE elements at a time, see
+        #         assemble_chunks(), instead of all elements at once. It is
+        #         also the number of element rows per window of the
+        #         out-of-core factorization.
+        #
+        #     (str) directory
+        #         Where the files of the "memmap" storage are created,
+        #         by default the temporary directory.
+        #
+        #     (int) workers
+        #         Assemble contiguous partitions of the elements in a pool
+        #         of WORKERS processes, see fem1d.parallel, for the banded
+        #         and "memmap" storages. The partitions have CHUNK_SIZE
+        #         elements if given, and the result is the same, bit for
+        #         bit, for any number of workers.
+        #
+        #     (dict) nonlinear_options
+        #         Keyword arguments of fem1d.newton.NewtonSolver, e.g.
+        #         method ("newton" or "picard") and tolerance. Only used
+        #         if p, q, r or f is a fem1d.coefficients.Nonlinear
+        #         function of x, u and du/dx.
         #
 
         self.mesh = mesh
@@ -72,33 +170,989 @@ class Model(object):
         self.bc_right = bc_right
         self.num_quad_points = num_quad_points
         self.basis_function_order = basis_function_order
+        self.assembly = assembly
+        self.storage = storage
+        self.solver = solver
+        self.solver_options = solver_options or {}
+        self.chunk_size = chunk_size
+        self.directory = directory
+        self.workers = workers
+        self.nonlinear_options = nonlinear_options or {}
+        # Time step of a transient solve, see fem1d.transient; VMSModel
+        # limits tau with it.
+        self.time_step = None
+        # Instrumentation, disabled unless instrument() is called.
+        self.stats = None
+        self.solver_info = None
         self.K = None
         self.u = None
         self.F = None
+        self.factorization = None
+        self.load_data = None
 
 
     def solve(self):
 
-        self.u = np.zeros(self.mesh.num_elements+1)
+        # A solution of the right size, e.g. one transferred from another
+        # mesh, is kept as the initial guess.
+        num_dofs = self.mesh.num_dofs(self.basis_function_order)
+        if self.u is None or len(self.u) != num_dofs:
+            self.u = self.new_vector()
+
+        if self.nonlinear():
+            # Newton's method from the current solution; the iteration
+            # counts and timings are kept in solver_info.
+            newton = NewtonSolver(self, **self.nonlinear_options)
+            with phase(self.stats, "newton"):
+                self.u = newton.solve(self.u)
+            self.solver_info = newton.info
+
+            if self.stats is not None:
+                self.stats.set_value("iterations", newton.info.iterations)
+                self.stats.set_value("jacobian_updates", newton.info.jacobian_updates)
+                self.stats.set_value("residual", newton.info.residuals[-1])
+            return
+
+        self.factorize()
+
+        self.u = self.__solveFactorized(self.F)
+
+        if self.stats is not None:
+            self.record_solution_stats()
+
+
+    def instrument(self, stats=None, sink=None):
+        #
+        # Discussion:
+        #
+        #   Enables the instrumentation: from now on the wall time of
+        #   every phase of solve() and the calls of p, q, r and f are
+        #   recorded in self.stats, together with the size and number of
+        #   nonzeros of K and the relative residual of the solution.
+        #
+        #   While it is disabled, which is the default, every phase only
+        #   costs an empty with block.
+        #
+        # Inputs:
+        #
+        #     (fem1d.instrumentation.Stats) stats
+        #         Where to record, e.g. to share it with a QoI. A new one
+        #         is created by default.
+        #
+        #     (function) sink
+        #         Receives every record of a new Stats object, see
+        #         fem1d.instrumentation.Stats.
+        #
+        # Outputs:
+        #
+        #     (fem1d.instrumentation.Stats) stats
+        #
+
+        if stats is None:
+            stats = Stats(sink)
+
+        self.stats = stats
+
+        for name in ("p", "q", "r", "f"):
+            setattr(self, name, counted(getattr(self, name), name, stats))
+
+        return stats
+
+    def uninstrument(self):
+        #
+        # Discussion:
+        #
+        #   Disables the instrumentation and restores the coefficients.
+        #
+
+        self.stats = None
+
+        for name in ("p", "q", "r", "f"):
+            setattr(self, name, uncounted(getattr(self, name)))
+
+    def record_solution_stats(self):
+
+        # Size of K, its stored nonzeros, the relative residual of the last
+        # solution and the use of the coefficient field, for the
+        # instrumentation.
+
+        self.stats.set_value("matrix_size", len(self.F))
+
+        field = self.mesh.coefficient_field
+        self.stats.set_value("coefficient_hits", field.hits)
+        self.stats.set_value("coefficient_misses", field.misses)
+
+        # The out-of-core factorization overwrites K.
+        if self.storage == "memmap":
+            return
+
+        if self.storage == "dense":
+            nnz = np.count_nonzero(self.K)
+            residual = self.F - np.dot(self.K, self.u)
+        else:
+            nnz = np.count_nonzero(self.K.data)
+            residual = self.F - self.K.dot(self.u)
+
+        scale = np.linalg.norm(self.F)
+
+        self.stats.set_value("matrix_nnz", int(nnz))
+        self.stats.set_value("residual", float(np.linalg.norm(residual) /
+                                              (scale if scale > 0.0 else 1.0)))
+
+        if self.solver_info is not None and self.solver == "multigrid":
+            self.stats.set_value("iterations", self.solver_info.iterations)
+            self.stats.set_value("convergence_rate", self.solver_info.convergence_rate)
+
+
+    def factorize(self):
+        #
+        # Discussion:
+        #
+        #   Assembles K and F, applies the boundary conditions and
+        #   factorizes K. The factorization is kept in self.factorization
+        #   and reused by solve_rhs() until the next assembly. With the
+        #   multigrid solver the factorization is the multigrid hierarchy.
+        #
+
+        self.assemble_system()
+
+        with phase(self.stats, "factorize"):
+            if self.solver == "multigrid":
+                self.factorization = Multigrid(self, **self.solver_options)
+            elif self.solver != "direct":
+                raise ValueError("Invalid solver: {}".format(self.solver))
+            else:
+                self.factorization = self.factorize_matrix(self.K)
+
+    def factorize_matrix(self, K):
+        #
+        # Discussion:
+        #
+        #   Returns the factorization of a matrix in the storage of K.
+        #
+
+        if self.storage == "dense":
+            # Dense storage is only meant for debugging, so numpy.linalg
+            # solves with K itself every time.
+            return K
+
+        if self.storage == "memmap":
+            return factorize_corners(OutOfCoreBandedLU(
+                K, self.basis_function_order * (self.chunk_size or CHUNK_ROWS)), K)
+
+        return K.factorize()
+
+    def nonlinear(self):
+        #
+        # Discussion:
+        #
+        #   Returns whether any coefficient depends on the solution.
+        #
+
+        return any(is_nonlinear(c) for c in (self.p, self.q, self.r, self.f))
+
+    def assemble_system(self):
+        #
+        # Discussion:
+        #
+        #   Assembles K and F and applies the boundary conditions.
+        #
+
+        with phase(self.stats, "assemble"):
+            self.assemble()
+
+        with phase(self.stats, "boundary_conditions"):
+            self.__applyBC()
+
+    def boundary_conditions(self):
+        #
+        # Discussion:
+        #
+        #   Returns the fem1d.boundary conditions of bc_type.
+        #
+
+        return from_bc_type(self.bc_type)
+
+    def dirichlet_dofs(self):
+        #
+        # Discussion:
+        #
+        #   Returns the list of nodes whose equations are replaced by
+        #   constraints: those where U is prescribed, and the last node
+        #   with periodic conditions.
+        #
+
+        return self.boundary_conditions().constrained_dofs(
+            self.mesh.num_dofs(self.basis_function_order))
+
+    def solve_rhs(self, f=None, bc_left=None, bc_right=None):
+        #
+        # Discussion:
+        #
+        #   Solves for new sources or boundary values with the operator
+        #   factorized by the last solve() or factorize(), which is done
+        #   first if needed. Only the load vector is assembled again.
+        #
+        #   The operator depends on p, q, r, the mesh and the boundary
+        #   condition types, so call factorize() after changing any of
+        #   them.
+        #
+        # Inputs:
+        #
+        #     (function, list) f
+        #         The source function, or a list of M source functions.
+        #         Defaults to self.f.
+        #
+        #     (float, numpy.ndarray) bc_left, bc_right
+        #         The boundary values, or arrays of M boundary values.
+        #         Default to self.bc_left and self.bc_right.
+        #
+        # Outputs:
+        #
+        #     (numpy.ndarray) u
+        #         The solution, of shape (num_dofs,), or (num_dofs, M)
+        #         with one column per case if any input is a block.
+        #
+
+        if self.factorization is None:
+            self.factorize()
+
+        if f is None:
+            f = self.f
+        if bc_left is None:
+            bc_left = self.bc_left
+        if bc_right is None:
+            bc_right = self.bc_right
+
+        block = isinstance(f, (list, tuple)) or np.ndim(bc_left) > 0 or \
+            np.ndim(bc_right) > 0
+
+        sources = list(f) if isinstance(f, (list, tuple)) else [f]
+        bc_left = np.atleast_1d(np.asarray(bc_left, dtype=float))
+        bc_right = np.atleast_1d(np.asarray(bc_right, dtype=float))
+
+        num_cases = max(len(sources), len(bc_left), len(bc_right))
+        if len(sources) == 1:
+            sources = sources * num_cases
+        if len(sources) != num_cases:
+            raise ValueError("Sources and boundary values do not match")
+        bc_left = np.broadcast_to(bc_left, (num_cases,))
+        bc_right = np.broadcast_to(bc_right, (num_cases,))
 
-        self.assemble()
+        F = self.assemble_load(sources)
+        self.__applyBCLoad(F, bc_left, bc_right)
 
-        self.__applyBC()
+        u = self.__solveFactorized(F)
 
-        self.u = np.linalg.solve(self.K, self.F)
+        return u if block else u[:, 0]
+
+    def assemble_load(self, sources):
+        #
+        # Discussion:
+        #
+        #   Assembles the load vectors of several source functions.
+        #
+        #   The load vector is linear in f, so the test functions of
+        #   load_functions() are computed once and kept in
+        #   self.load_data until the next assembly. Every source then only
+        #   costs one evaluation on the quadrature points and one
+        #   product per test function.
+        #
+        # Inputs:
+        #
+        #     (list) sources
+        #         The M source functions or constants.
+        #
+        # Outputs:
+        #
+        #     (numpy.ndarray) F, shape (num_dofs, M)
+        #
+
+        if self.load_data is None:
+            quad = self.quadrature_data()
+            coefficients = self.evaluate_coefficients(quad.x, self.quadrature_points())
+            self.load_data = (quad.x, self.load_functions(quad, coefficients))
+
+        x, test = self.load_data
+        dofs = self.mesh.dofs(self.basis_function_order)
+
+        # Every load vector is a contiguous row while it is scattered.
+        F = np.zeros((len(sources), self.mesh.num_dofs(self.basis_function_order)))
+
+        for case, source in enumerate(sources):
+            F_e = self.load_vectors(Utils.evaluate(source, x), test)
+            for i in range(dofs.shape[1]):
+                F[case, dofs[:, i]] += F_e[:, i]
+
+        return F.T
 
 
     def assemble(self):
+        #
+        # Discussion:
+        #
+        #   Assembles the global stiffness matrix K and load vector F.
+        #
+        #   With assembly="vectorized" (the default) all quadrature
+        #   points of all elements are evaluated as one array and every
+        #   element matrix is built with a single batched operation.
+        #   With assembly="loop" the element matrices are built one
+        #   scalar at a time, which is slow but easy to follow; the
+        #   coefficients are then called on one point at a time and do
+        #   not go through the coefficient field of the mesh.
+        #
+
+        if self.nonlinear():
+            raise ValueError("Nonlinear coefficients are assembled by "
+                             "assemble_nonlinear()")
+
+        self.allocate()
+        self.factorization = None
+        self.load_data = None
+
+        if self.workers is not None:
+            if self.storage == "dense":
+                raise ValueError("Parallel assembly needs banded storage")
+            with phase(self.stats, "parallel_assembly"):
+                assemble_parallel(self, self.workers, self.chunk_size)
+            return
+
+        if self.chunk_size is not None:
+            self.assemble_chunks()
+            return
+
+        with phase(self.stats, "element_arrays"):
+            if self.assembly == "vectorized":
+                K_e, F_e = self.element_arrays()
+            elif self.assembly == "loop":
+                K_e, F_e = self.element_arrays_loop()
+            else:
+                raise ValueError("Invalid assembly mode: {}".format(self.assembly))
+
+        with phase(self.stats, "scatter"):
+            self.scatter(K_e, F_e)
+
+    def allocate(self, matrix=True):
+        #
+        # Discussion:
+        #
+        #   Allocates K, unless MATRIX is false, and F with zeros.
+        #
+
+        if matrix:
+            self.K = self.new_matrix()
+
+        self.F = self.new_vector()
+
+    def new_vector(self):
+        #
+        # Discussion:
+        #
+        #   Returns a zero vector of the size of F, in a memory-mapped
+        #   file for the "memmap" storage.
+        #
+
+        num_nodes = self.mesh.num_dofs(self.basis_function_order)
+
+        if self.storage == "memmap":
+            return scratch_array(num_nodes, self.directory)
+
+        return np.zeros(num_nodes)
+
+    def assemble_chunks(self):
+        #
+        # Discussion:
+        #
+        #   Assembles K and F a chunk of chunk_size elements at a time.
+        #
+        #   Every chunk is assembled by a copy of the model on the mesh of
+        #   its own nodes, and its matrix and load vector are added to the
+        #   rows of those nodes. Only the arrays of one chunk are in memory
+        #   at a time, and the nodes of the mesh are read a chunk at a
+        #   time, so with the "memmap" storage and a mesh on a memory-mapped
+        #   x the working memory does not grow with the number of elements.
+        #
+
+        order = self.basis_function_order
+        num_elements = self.mesh.num_elements
+
+        for start in range(0, num_elements, self.chunk_size):
+            stop = min(start + self.chunk_size, num_elements)
+
+            chunk = self.chunk_model(start, stop)
+            chunk.assemble()
+
+            # The band of the chunk is the band of its rows in K.
+            rows = slice(start * order, stop * order + 1)
+            if self.storage == "dense":
+                self.K[rows, rows] += chunk.K
+            else:
+                self.K.data[rows] += chunk.K.data
+            self.F[rows] += chunk.F
+
+    def chunk_model(self, start, stop):
+        #
+        # Discussion:
+        #
+        #   Returns a copy of the model restricted to the elements START
+        #   to STOP - 1, assembled in memory.
+        #
+
+        chunk = copy.copy(self)
+        chunk.mesh = Mesh(self.mesh.x[start:stop + 1])
+        chunk.storage = "dense" if self.storage == "dense" else "banded"
+        chunk.chunk_size = None
+        chunk.workers = None
+        chunk.u = None
+        chunk.K = None
+        chunk.F = None
+
+        return chunk
+
+    def new_matrix(self):
+        #
+        # Discussion:
+        #
+        #   Returns a zero matrix of the size of K in the storage of K.
+        #
+
+        order = self.basis_function_order
+        num_nodes = self.mesh.num_dofs(order)
+
+        if self.storage == "dense":
+            return np.zeros((num_nodes, num_nodes))
+        elif self.storage == "banded":
+            return BandedMatrix(num_nodes, order, order)
+        elif self.storage == "memmap":
+            return BandedMatrix(num_nodes, order, order,
+                                scratch_array((num_nodes, 2 * order + 1), self.directory))
+
+        raise ValueError("Invalid storage: {}".format(self.storage))
+
+    def mass_matrix(self):
+        #
+        # Discussion:
+        #
+        #   Assembles the matrix M of the time derivative du/dt, without
+        #   boundary conditions, for transient problems.
+        #
+        #   du/dt enters the equation next to f, so it is tested with
+        #   the same functions as f, those of load_functions():
+        #
+        #     M_IJ = sum_pairs int weight * table_I * W_J
+        #
+        #   This is the usual mass matrix for the Galerkin method, and
+        #   includes the tau term of the residual for a VMSModel.
+        #
+        # Outputs:
+        #
+        #     M, in the storage of K.
+        #
+
+        quad = self.quadrature_data()
+        coefficients = self.evaluate_coefficients(quad.x, self.quadrature_points())
+        num_elements, num_nodes = quad.x.shape[0], quad.basis.shape[1]
+
+        M_e = sum(np.dot(weight, np.einsum('qi,qj->qij', table, quad.basis).reshape(
+                      len(table), -1))
+                  for weight, table in self.load_functions(quad, coefficients))
+
+        M = self.new_matrix()
+        self.scatter_matrix(M, M_e.reshape(num_elements, num_nodes, num_nodes))
+
+        return M
+
+    def assemble_nonlinear(self, u, jacobian=None):
+        #
+        # Discussion:
+        #
+        #   Assembles the residual of the nonlinear equations at U, with
+        #   the boundary conditions, and optionally its Jacobian.
+        #
+        #   The weak form is R_I(u) = int dW_I * A + W_I * B, with the
+        #   flux A = p * du/dx and B = q * u + r * du/dx - f, where the
+        #   coefficients may depend on x, u and du/dx. The Jacobian is
+        #
+        #     J_IJ = int dW_I * ( dA/du * W_J + dA/du_x * dW_J )
+        #              + W_I * ( dB/du * W_J + dB/du_x * dW_J ),
+        #
+        #   so R and J come from one evaluation of the coefficients and
+        #   their derivatives at the quadrature points, and the same
+        #   products of basis functions as element_arrays().
+        #
+        #   The Dirichlet rows are U(I) - U_BC, with identity rows in J,
+        #   and the Neumann values enter the boundary rows as in the
+        #   linear problem, so for linear coefficients J is K and -R is
+        #   F - K * U.
+        #
+        # Inputs:
+        #
+        #     (numpy.ndarray) u
+        #         The current solution.
+        #
+        #     (str) jacobian
+        #         None for the residual only, "newton" for the exact
+        #         Jacobian, "picard" for the operator with the
+        #         coefficients frozen at U.
+        #
+        # Outputs:
+        #
+        #     self.F holds -R(u) and, if a Jacobian is requested, self.K
+        #     holds J(u).
+        #
+
+        with phase(self.stats, "element_arrays"):
+            R_e, J_e = self.nonlinear_element_arrays(u, jacobian)
+
+        self.allocate(J_e is not None)
+        self.factorization = None
+        self.load_data = None
+
+        with phase(self.stats, "scatter"):
+            self.scatter(J_e, -R_e)
+
+        conditions = self.boundary_conditions()
+
+        if J_e is not None:
+            conditions.add_operator(self.K)
+            conditions.constrain(self.K)
+
+        conditions.add_load(self.F, self.bc_left, self.bc_right)
+        conditions.subtract_operator(self.F, u)
+        conditions.constrain_load(self.F, self.bc_left, self.bc_right)
+        conditions.subtract_constraints(self.F, u)
+
+    def nonlinear_element_arrays(self, u, jacobian=None):
+        #
+        # Discussion:
+        #
+        #   Computes the element residuals and, if requested, the element
+        #   Jacobians of assemble_nonlinear() for all elements at once.
+        #
+        # Outputs:
+        #
+        #     (numpy.ndarray) R_e, shape (num_elements, num_nodes)
+        #
+        #     (numpy.ndarray) J_e, shape (num_elements, num_nodes, num_nodes)
+        #         or None if JACOBIAN is None.
+        #
+
+        quad = self.quadrature_data()
+        num_elements, num_nodes = quad.x.shape[0], quad.basis.shape[1]
+        w, dxi_dx, products = quad.w, quad.dxi_dx, quad.products
+
+        # The solution and its gradient at the quadrature points.
+        u_e = np.asarray(u, dtype=float)[self.mesh.dofs(self.basis_function_order)]
+        u_q = np.dot(u_e, quad.basis.T)
+        u_x = np.dot(u_e, quad.basis_xi.T) * dxi_dx[:, None]
 
-        self.K = np.zeros((self.mesh.num_elements+1, self.mesh.num_elements+1))
-        self.F = np.zeros_like(self.u)
+        p, q, r, f = self.evaluate_nonlinear(quad.x, u_q, u_x)
+
+        flux = p * u_x
+        source = q * u_q + r * u_x - f
+
+        R_e = np.dot(w * flux, quad.basis_xi) * dxi_dx[:, None] + \
+            np.dot(w * source, quad.basis)
+
+        if jacobian is None:
+            return R_e, None
+
+        if jacobian == "picard":
+            # The linear operator with the coefficients frozen at u.
+            dflux_du, dflux_dux = 0.0, p
+            dsource_du, dsource_dux = q, r
+        elif jacobian == "newton":
+            du, du_x = self.evaluate_nonlinear_derivatives(
+                quad.x, u_q, u_x, Coefficients(p, q, r, f))
+            dflux_du = du.p * u_x
+            dflux_dux = p + du_x.p * u_x
+            dsource_du = q + du.q * u_q + du.r * u_x - du.f
+            dsource_dux = r + du_x.q * u_q + du_x.r * u_x - du_x.f
+        else:
+            raise ValueError("Invalid Jacobian: {}".format(jacobian))
+
+        J_e = np.dot(np.broadcast_to(w * dflux_dux, w.shape), products["BB"]) * \
+            (dxi_dx**2)[:, None]
+        J_e += np.dot(np.broadcast_to(w * dflux_du, w.shape), products["BN"]) * \
+            dxi_dx[:, None]
+        J_e += np.dot(np.broadcast_to(w * dsource_du, w.shape), products["NN"])
+        J_e += np.dot(np.broadcast_to(w * dsource_dux, w.shape), products["NB"]) * \
+            dxi_dx[:, None]
+
+        return R_e, J_e.reshape(num_elements, num_nodes, num_nodes)
+
+    def evaluate_nonlinear(self, x, u, u_x):
+        #
+        # Discussion:
+        #
+        #   Evaluates each coefficient on the points X, where the solution
+        #   and its derivative are U and U_X.
+        #
+
+        return Coefficients(*[
+            c(x, u, u_x) if is_nonlinear(c) else Utils.evaluate(c, x)
+            for c in (self.p, self.q, self.r, self.f)])
+
+    def evaluate_nonlinear_derivatives(self, x, u, u_x, values):
+        #
+        # Discussion:
+        #
+        #   Evaluates the derivatives of each coefficient with respect to
+        #   U and U_X, which are zero for the coefficients of x alone.
+        #   VALUES are the coefficients at the same points, used by the
+        #   finite difference approximations.
+        #
+
+        du, du_x = [], []
+
+        for c, value in zip((self.p, self.q, self.r, self.f), values):
+            if is_nonlinear(c):
+                du.append(c.partial_u(x, u, u_x, value))
+                du_x.append(c.partial_u_x(x, u, u_x, value))
+            else:
+                du.append(0.0)
+                du_x.append(0.0)
+
+        return Coefficients(*du), Coefficients(*du_x)
+
+    def quadrature_data(self, num_quad_points=None):
+        #
+        # Discussion:
+        #
+        #   Evaluates the geometry and the basis functions at every
+        #   quadrature point of every element.
+        #
+        # Outputs:
+        #
+        #     (QuadratureData) with the fields
+        #
+        #     (numpy.ndarray) x, shape (num_elements, num_quad_points)
+        #         The x location of the quadrature points.
+        #
+        #     (numpy.ndarray) w, shape (num_elements, num_quad_points)
+        #         The quadrature weights scaled by the element Jacobian.
+        #
+        #     (numpy.ndarray) h, shape (num_elements,)
+        #         The element sizes.
+        #
+        #     (numpy.ndarray) basis, shape (num_quad_points, num_nodes)
+        #         The basis functions at the quadrature points.
+        #
+        #     (numpy.ndarray) basis_xi, shape (num_quad_points, num_nodes)
+        #         The gradients of the basis functions with respect to
+        #         the reference coordinate xi at the quadrature points.
+        #
+        #     (numpy.ndarray) basis_xixi, shape (num_quad_points, num_nodes)
+        #         The second derivatives of the basis functions with
+        #         respect to xi at the quadrature points.
+        #
+        #     (numpy.ndarray) dxi_dx, shape (num_elements,)
+        #         The inverse Jacobian of every element, so that the
+        #         physical gradients are basis_xi * dxi_dx.
+        #
+        #     (dict) products
+        #         Products of basis functions at the quadrature points,
+        #         flattened over the (I, J) pairs to shape
+        #         (num_quad_points, num_nodes**2), see reference_basis:
+        #         "NN" is W_I * W_J, "NB" is W_I * dW_J/dxi, "BB" is
+        #         dW_I/dxi * dW_J/dxi, and so on.
+        #
+
+        if num_quad_points is None:
+            num_quad_points = self.num_quad_points
+
+        # Basis functions tabulated at the quadrature points of the
+        # reference element -1 <= xi <= 1.
+        table = reference_basis(self.basis_function_order, num_quad_points)
+
+        x_left = self.mesh.x_left
+        h = self.mesh.h
+
+        x = x_left[:, None] + 0.5 * (1 + table.xi)[None, :] * h[:, None]
+        w = table.w[None, :] * 0.5 * h[:, None]
+
+        return QuadratureData(x, w, h, table.basis, table.basis_xi,
+                              table.basis_xixi, 2.0 / h, table.products)
+
+    def quadrature_points(self, num_quad_points=None):
+        #
+        # Discussion:
+        #
+        #   Returns the name of the points quadrature_data(NUM_QUAD_POINTS).x
+        #   in the coefficient field of the mesh.
+        #
+
+        if num_quad_points is None:
+            num_quad_points = self.num_quad_points
+
+        return ("quadrature", num_quad_points)
+
+    def evaluate_coefficients(self, x, points=None):
+        #
+        # Discussion:
+        #
+        #   Evaluates each coefficient function once on all points X.
+        #
+        #   With the name POINTS of the points, e.g. quadrature_points(),
+        #   the values are taken from the coefficient field of the mesh,
+        #   so that Model, VMSModel and QoI evaluate every coefficient
+        #   only once on the same points. The values are then read-only.
+        #
+
+        with phase(self.stats, "coefficients"):
+            return Coefficients(self.evaluate_coefficient("p", x, points),
+                                self.evaluate_coefficient("q", x, points),
+                                self.evaluate_coefficient("r", x, points),
+                                self.evaluate_coefficient("f", x, points))
+
+    def evaluate_coefficient(self, name, x, points=None):
+        #
+        # Discussion:
+        #
+        #   Evaluates the coefficient NAME, "p", "q", "r" or "f", on the
+        #   points X, named POINTS in the coefficient field of the mesh.
+        #
+
+        function = getattr(self, name)
+
+        if points is None:
+            return Utils.evaluate(function, x)
+
+        return self.mesh.coefficient_field.evaluate(name, function, x, points)
+
+    def element_arrays(self):
+        #
+        # Discussion:
+        #
+        #   Computes the matrix and load vector of every element at once.
+        #
+        #   The basis functions are the same on every element up to the
+        #   scaling dxi/dx of the gradients, so every term reduces to a
+        #   product of an (element, quadrature point) array with a small
+        #   table of basis products on the reference element.
+        #
+        #   The geometry, basis data and coefficient values are computed
+        #   once and passed to add_element_terms(), where subclasses add
+        #   their own terms to the element matrices, and to
+        #   load_functions(), which gives the test functions of f(x).
+        #
+        # Outputs:
+        #
+        #     (numpy.ndarray) K_e, shape (num_elements, num_nodes, num_nodes)
+        #         The element stiffness matrices.
+        #
+        #     (numpy.ndarray) F_e, shape (num_elements, num_nodes)
+        #         The element load vectors.
+        #
+
+        constants = self.constant_coefficients()
+        if constants is not None:
+            return self.element_arrays_constant(constants)
+
+        quad = self.quadrature_data()
+        coefficients = self.evaluate_coefficients(quad.x, self.quadrature_points())
+        num_elements, num_nodes = quad.x.shape[0], quad.basis.shape[1]
+
+        w, dxi_dx, products = quad.w, quad.dxi_dx, quad.products
+
+        # dW/dx * p * du/dx
+        K_e = np.dot(w * coefficients.p, products["BB"]) * (dxi_dx**2)[:, None]
+
+        # W * q * u
+        K_e += np.dot(w * coefficients.q, products["NN"])
+
+        # W * r * du/dx
+        K_e += np.dot(w * coefficients.r, products["NB"]) * dxi_dx[:, None]
+
+        self.add_element_terms(K_e, quad, coefficients)
+
+        # W * f(x), with the test functions of the subclass.
+        F_e = self.load_vectors(coefficients.f, self.load_functions(quad, coefficients))
+
+        return K_e.reshape(num_elements, num_nodes, num_nodes), F_e
+
+    def constant_coefficients(self):
+        #
+        # Discussion:
+        #
+        #   Returns the values of the coefficients if the closed-form
+        #   element arrays of element_arrays_constant() apply: linear
+        #   elements, constant p, q and r, and at least two quadrature
+        #   points, with which quadrature is exact for these integrals.
+        #
+        # Outputs:
+        #
+        #     (Coefficients) of floats, where f is None if f(x) is not
+        #     constant, or None if the closed form does not apply.
+        #
+
+        if self.basis_function_order != 1 or self.num_quad_points < 2:
+            return None
+
+        p, q, r, f = [constant_value(c) for c in (self.p, self.q, self.r, self.f)]
+
+        if p is None or q is None or r is None:
+            return None
+
+        return Coefficients(p, q, r, f)
+
+    def element_arrays_constant(self, constants):
+        #
+        # Discussion:
+        #
+        #   Builds the element arrays of linear elements with constant
+        #   coefficients from closed-form templates, one per distinct
+        #   element size, see element_templates(). On a mesh that is
+        #   uniform up to round-off a single template is broadcast to
+        #   every element without copying it.
+        #
+        #   If f(x) is not constant the load vectors are integrated with
+        #   the test functions of load_functions().
+        #
+
+        h = self.mesh.h
+        num_elements = len(h)
+
+        # The sizes of a uniform mesh still differ by the round-off of the
+        # node coordinates, which is relative to x rather than to h.
+        round_off = 16 * np.finfo(float).eps * np.abs(self.mesh.x).max()
+
+        if h.max() - h.min() <= round_off:
+            # Uniform up to round-off: a single template for all elements.
+            K_t, F_t = self.element_templates(np.array([h.mean()]), constants)
+            K_e = np.broadcast_to(K_t[0], (num_elements, 2, 2))
+            F_e = np.broadcast_to(F_t[0], (num_elements, 2))
+        else:
+            h, index = np.unique(h, return_inverse=True)
+            K_t, F_t = self.element_templates(h, constants)
+            K_e, F_e = K_t[index], F_t[index]
+
+        if constants.f is not None:
+            return K_e, F_e
+
+        quad = self.quadrature_data()
+        coefficients = self.evaluate_coefficients(quad.x, self.quadrature_points())
+        F_e = self.load_vectors(coefficients.f, self.load_functions(quad, coefficients))
+
+        return K_e, F_e
+
+    def element_templates(self, h, constants):
+        #
+        # Discussion:
+        #
+        #   Exact element matrices and load vectors of linear elements of
+        #   size H with constant coefficients:
+        #
+        #     int dW_I/dx * p * dW_J/dx = p / h * [ 1 -1; -1 1 ]
+        #     int W_I * q * W_J         = q * h / 6 * [ 2 1; 1 2 ]
+        #     int W_I * r * dW_J/dx     = r / 2 * [ -1 1; -1 1 ]
+        #     int W_I * f               = f * h / 2 * [ 1 1 ]
+        #
+        # Inputs:
+        #
+        #     (numpy.ndarray) h, shape (num_sizes,)
+        #         The distinct element sizes.
+        #
+        #     (Coefficients) constants
+        #         The coefficient values; f may be None.
+        #
+        # Outputs:
+        #
+        #     (numpy.ndarray) K_t, shape (num_sizes, 2, 2)
+        #
+        #     (numpy.ndarray) F_t, shape (num_sizes, 2), zero if f is None
+        #
+
+        p, q, r, f = constants
+        h = h[:, None, None]
+
+        K_t = p / h * STIFFNESS + q * h * MASS + r * ADVECTION
+        F_t = (0.0 if f is None else f) * h[:, :, 0] * LOAD
+
+        return K_t, F_t
+
+    def add_element_terms(self, K_e, quad, coefficients):
+        #
+        # Discussion:
+        #
+        #   Hook for subclasses to add terms to the element matrices while
+        #   they are being built by element_arrays().
+        #
+        # Inputs:
+        #
+        #     (numpy.ndarray) K_e, shape (num_elements, num_nodes**2)
+        #         The element matrices, flattened over the (I, J) pairs.
+        #
+        #     (QuadratureData) quad
+        #         The output of quadrature_data().
+        #
+        #     (Coefficients) coefficients
+        #         The coefficient values at the quadrature points.
+        #
+
+        pass
+
+    def load_functions(self, quad, coefficients):
+        #
+        # Discussion:
+        #
+        #   Returns the functions that multiply f(x) in the load vector
+        #   as a list of (weight, table) pairs, so that the element load
+        #   vectors are
+        #
+        #     F_e[E, I] = sum_pairs sum_K f(x[E, K]) * weight[E, K] * table[K, I]
+        #
+        #   Here there is one pair, the quadrature weights and the basis
+        #   functions. Subclasses add their own pairs, which are then
+        #   shared by element_arrays() and assemble_load().
+        #
+        # Inputs:
+        #
+        #     (QuadratureData) quad
+        #         The output of quadrature_data().
+        #
+        #     (Coefficients) coefficients
+        #         The coefficient values at the quadrature points.
+        #
+        # Outputs:
+        #
+        #     (list) of pairs of numpy.ndarray, shapes
+        #         (num_elements, num_quad_points) and (num_quad_points, num_nodes)
+        #
+
+        return [(quad.w, quad.basis)]
+
+    def load_vectors(self, f, test):
+        #
+        # Discussion:
+        #
+        #   Element load vectors of the values F at the quadrature points,
+        #   for the test functions returned by load_functions().
+        #
+
+        return sum(np.dot(f * weight, table) for weight, table in test)
+
+    def element_arrays_loop(self):
+        #
+        # Discussion:
+        #
+        #   Reference implementation of element_arrays() that loops over
+        #   elements, basis functions and quadrature points.
+        #
+
+        num_nodes = self.basis_function_order + 1
+        K_e = np.zeros((self.mesh.num_elements, num_nodes, num_nodes))
+        F_e = np.zeros((self.mesh.num_elements, num_nodes))
 
         # Set Quadrature rule
         quad_rule = QuadratureRule( self.num_quad_points )
 
+        # The coefficients are called on one point at a time.
+        p, q, r, source = (as_function(c) for c in (self.p, self.q, self.r, self.f))
+
         # Loop over elements.
 
-        for element in self.mesh.elements:
+        for element in self.elements():
 
             e = element.index
 
@@ -134,22 +1188,22 @@ class Model(object):
                         # left of the PDE:
                         #     dW/dx * p * du/dx.
 
-                        f = basis_i_x * self.p(x) * basis_j_x
-                        self.K[e+i, e+j] += w * f
+                        f = basis_i_x * p(x) * basis_j_x
+                        K_e[e, i, j] += w * f
 
                         # Compute the integral of the second term on
                         # the left of the PDE:
                         #     W * p * u.
 
-                        f = basis_i * self.q(x) * basis_j
-                        self.K[e+i, e+j] += w * f
+                        f = basis_i * q(x) * basis_j
+                        K_e[e, i, j] += w * f
 
                         # Compute the integral of the third term on the
                         # left of the PDE:
                         #    W * r * du/dx.
 
-                        f = basis_i * self.r(x) * basis_j_x
-                        self.K[e+i, e+j] += w * f
+                        f = basis_i * r(x) * basis_j_x
+                        K_e[e, i, j] += w * f
 
 
             for i in range(element.num_nodes):
@@ -171,64 +1225,203 @@ class Model(object):
                     # the PDE:
                     #     W * f(x).
 
-                    f = basis_i * self.f(x)
-                    self.F[e+i] += w * f
+                    f = basis_i * source(x)
+                    F_e[e, i] += w * f
+
+        return K_e, F_e
+
+    def scatter(self, K_e, F_e):
+        #
+        # Discussion:
+        #
+        #   Adds the element matrices and load vectors to K and F.
+        #
+        #   The global nodes of every element are given by the mesh
+        #   connectivity. For a fixed pair of local nodes (I, J) every
+        #   element writes to a different entry, so each pair is a
+        #   single vectorized add. Node I of element E is E*ORDER + I,
+        #   so in F and in the band every pair is a strided slice.
+        #
+
+        order = self.basis_function_order
+        dofs = self.mesh.dofs(order)
+        end = order * (dofs.shape[0] - 1) + 1
+
+        # K_e is None when only the load vector is assembled, see
+        # assemble_nonlinear().
+        if K_e is not None:
+            self.scatter_matrix(self.K, K_e)
+
+        for i in range(dofs.shape[1]):
+            self.F[i:i+end:order] += F_e[:, i]
+
+    def scatter_matrix(self, K, K_e):
+
+        # Adds the element matrices K_e to the matrix K, see scatter().
+
+        if self.storage == "dense":
+            dofs = self.mesh.dofs(self.basis_function_order)
+            for i in range(dofs.shape[1]):
+                for j in range(dofs.shape[1]):
+                    K[dofs[:, i], dofs[:, j]] += K_e[:, i, j]
+        else:
+            K.add_element_matrices_strided(K_e, self.basis_function_order)
 
     def __applyBC(self):
 
         # Now that the stiffness matrix K and the vector F are
-        # assembled, let us approach the boundary conditions.
+        # assembled, let us approach the boundary conditions: the
+        # boundary terms of the weak form first, then the constraints
+        # that replace equations.
 
-        # Set left boundary condition
-        if self.bc_type == 1 or self.bc_type == 2:
+        conditions = self.boundary_conditions()
+        conditions.add_operator(self.K)
+        conditions.constrain(self.K)
 
-            # At the left endpoint, U has the value BC_LEFT
+        self.__applyBCLoad(self.F, self.bc_left, self.bc_right)
 
-            self.F[0] = self.bc_left
-            self.K[0, :] = 0
-            self.K[0, 0] = 1
-        else:
 
-            # At the left endpoint, U' has the value BC_LEFT
+    def apply_boundary_load(self, F, bc_left, bc_right):
+        #
+        # Discussion:
+        #
+        #   Sets the boundary values in the load vector F, or in every
+        #   column of a block of load vectors, for solvers built on the
+        #   assembled operator, e.g. fem1d.transient. Dirichlet values
+        #   replace the boundary rows and Neumann values are added to
+        #   them.
+        #
 
-            self.F[0] += -1 * self.bc_left
+        self.__applyBCLoad(F, bc_left, bc_right)
 
-        # Set right boundary condition
-        if self.bc_type == 1 or self.bc_type == 3:
+    def __applyBCLoad(self, F, bc_left, bc_right):
 
-            # At the right endpoint, U has the value BC_RIGHT
+        # Boundary values in the load vector F, or in every column of a
+        # block of load vectors.
 
-            self.F[-1] = self.bc_right
-            self.K[-1, :] = 0
-            self.K[-1, -1] = 1
-        else:
+        conditions = self.boundary_conditions()
+        conditions.add_load(F, bc_left, bc_right)
+        conditions.constrain_load(F, bc_left, bc_right)
+
+
+    def __solveFactorized(self, F):
 
-            # At the right endpoint, U' has the value BC_RIGHT
+        # Solves K * u = F, or K * U = F for a block of columns, with the
+        # factorization of K.
 
-            self.F[-1] += self.bc_right
+        with phase(self.stats, "linear_solve"):
+            if self.solver == "multigrid":
+                # The current solution, if any, is the initial guess. A
+                # solve that does not converge warns and falls back to the
+                # banded LU, or raises, see Multigrid.solve().
+                guess = self.u if F.ndim == 1 and self.u is not None and \
+                    len(self.u) == len(F) else None
+                u = self.factorization.solve(F, guess)
+                self.solver_info = self.factorization.info
+                return u
+
+            if self.storage == "dense":
+                return np.linalg.solve(self.factorization, F)
+
+            if self.storage == "memmap" and F.ndim == 1:
+                return self.factorization.solve(F, self.new_vector())
+
+            return self.factorization.solve(F)
 
 
     def interpolate(self, element, k, num_quad_points):
 
-        e = element.index
+        order = self.basis_function_order
+        e = element.index * order
         u = 0.0
         
-        # Set Quadrature rule
-        quad_rule = QuadratureRule( num_quad_points )
+        # Basis functions at the quadrature points of the reference element
+        table = reference_basis(order, num_quad_points)
 
         # Loop over basis functions.
-        for i in range(element.num_nodes):
-            
-            # Get xi location of quadrature point.
-            xi = quad_rule.xi_q[k]
-
-            # Calculate x location of quadrature point.
-            x = element.x_left + 0.5 * (1 + xi) * element.h
+        for i in range(order + 1):
 
-            # Compute the values of the basis functions.
-            basis_i = element.basis_function(x=x, local_node=i)
-            
             # Interpolate solution
-            u += basis_i * self.u[e+i]
+            u += table.basis[k, i] * self.u[e+i]
 
         return u
+
+    def interpolate_field(self, num_quad_points=None, derivative=0):
+        #
+        # Discussion:
+        #
+        #   Interpolates the solution, or one of its derivatives, at every
+        #   quadrature point of every element at once.
+        #
+        # Inputs:
+        #
+        #     (int) num_quad_points
+        #         Number of quadrature points per element, defaults to the
+        #         one used for assembly.
+        #
+        #     (int) derivative
+        #         0 for the solution, 1 for du/dx and 2 for d2u/dx2.
+        #
+        # Outputs:
+        #
+        #     (numpy.ndarray), shape (num_elements, num_quad_points)
+        #
+
+        if num_quad_points is None:
+            num_quad_points = self.num_quad_points
+
+        order = self.basis_function_order
+        table = reference_basis(order, num_quad_points)
+        basis = (table.basis, table.basis_xi, table.basis_xixi)[derivative]
+
+        # Nodal values of every element, shape (num_elements, num_nodes).
+        u_e = self.u[self.mesh.dofs(order)]
+        values = np.dot(u_e, basis.T)
+
+        if derivative:
+            values *= (2.0 / self.mesh.h[:, None])**derivative
+
+        return values
+
+    def interpolate_at(self, x):
+        #
+        # Discussion:
+        #
+        #   Evaluates the finite element solution at arbitrary points,
+        #   e.g. to transfer it to another mesh.
+        #
+        # Inputs:
+        #
+        #     (numpy.ndarray) x
+        #         The points, inside the mesh.
+        #
+        # Outputs:
+        #
+        #     (numpy.ndarray), with the shape of x
+        #
+
+        x = np.asarray(x, dtype=float)
+        order = self.basis_function_order
+        mesh = self.mesh
+
+        e = mesh.locate(x)
+        xi = 2.0 * (x - mesh.x_left[e]) / mesh.h[e] - 1.0
+
+        # Basis functions at the reference coordinate of every point.
+        basis = shape_functions(order, xi)
+        return np.sum(basis * self.u[mesh.dofs(order)[e]], axis=-1)
+
+    def elements(self):
+        #
+        # Discussion:
+        #
+        #   Iterates over the elements of the mesh with the basis
+        #   functions of the model.
+        #
+
+        if self.basis_function_order == 1:
+            return iter(self.mesh.elements)
+
+        return (Element(element.index, self.basis_function_order,
+                        element.x_left, element.x_right)
+                for element in self.mesh.elements)
@@ -0,0 +1,284 @@
+import copy
+import warnings
+import numpy as np
+from collections import namedtuple
+from fem1d.mesh import Mesh
+from fem1d.utils import Utils
+from fem1d.element import shape_functions
+
+
+SolverInfo = namedtuple(
+    "SolverInfo", ["iterations", "residuals", "convergence_rate", "converged"])
+
+# The iterations diverge once |b - A x| grew by this factor.
+DIVERGENCE = 1e6
+
+
+class Transfer(object):
+    """Prolongation from a coarse to a nested fine discretization and its
+    transpose, the restriction.
+
+    Every fine node lies in one coarse element, so the prolongation
+    interpolates the coarse solution there with the num_nodes basis
+    functions of that element. The operator is stored as the coarse node
+    indices and the weights of every fine node.
+
+    Attributes:
+        indices (numpy.ndarray): Coarse nodes of every fine node, shape
+            (num_fine_dofs, num_nodes).
+        weights (numpy.ndarray): Basis functions of those coarse nodes at
+            the fine node, shape (num_fine_dofs, num_nodes).
+        num_coarse_dofs (int): Number of coarse nodes.
+    """
+
+    def __init__(self, fine, coarse, order):
+        x = fine.dof_coordinates(order)
+        e = coarse.locate(x)
+        xi = 2.0 * (x - coarse.x_left[e]) / coarse.h[e] - 1.0
+
+        self.indices = coarse.dofs(order)[e]
+        self.weights = shape_functions(order, xi)
+        self.num_coarse_dofs = coarse.num_dofs(order)
+
+    def prolong(self, u):
+        """Interpolates coarse values u at the fine nodes."""
+
+        return np.sum(self.weights * u[self.indices], axis=1)
+
+    def restrict(self, r):
+        """Applies the transpose of the prolongation to fine values r."""
+
+        return np.bincount(self.indices.ravel(),
+                           (self.weights * r[:, None]).ravel(),
+                           minlength=self.num_coarse_dofs)
+
+
+def gauss_seidel(matrix, x, b, reverse=False):
+    """One Gauss-Seidel sweep for A * x = b on a BandedMatrix, in place.
+
+    The sweep is inherently sequential, so it runs on Python floats like
+    the banded LU factorization.
+
+    Arguments:
+        matrix: The BandedMatrix A.
+        x: Current solution, updated in place.
+        b: Right-hand side.
+        reverse: Sweep from the last row to the first.
+    """
+
+    lower, upper, size = matrix.lower, matrix.upper, matrix.size
+    rows = matrix.data.tolist()
+    values = x.tolist()
+    rhs = b.tolist()
+
+    for i in (range(size - 1, -1, -1) if reverse else range(size)):
+        row = rows[i]
+        value = rhs[i]
+        for d in range(max(-lower, -i), min(upper, size - 1 - i) + 1):
+            if d != 0:
+                value -= row[lower + d] * values[i + d]
+        values[i] = value / row[lower]
+
+    x[:] = values
+
+
+class Multigrid(object):
+    """Geometric multigrid solver for the system of a Model.
+
+    The levels are the mesh of the model and the meshes obtained by
+    removing every other node, as long as the number of elements is even
+    and larger than coarsest_elements, so they are nested for both
+    uniform and non-uniform meshes. The operator of every coarse level is
+    assembled again on its mesh, so a VMSModel keeps a stabilization
+    suited to the coarse element sizes, and the coarsest level is solved
+    with a banded LU factorization.
+
+    Every iteration is a V-cycle with Gauss-Seidel smoothing in the
+    direction of the flow given by the sign of r(x), which is robust for
+    convection-dominated problems: for pure advection a downstream sweep
+    is an exact solve.
+
+    Attributes:
+        matrices (list): The BandedMatrix of every level, finest first.
+        transfers (list): The Transfer between every level and the next
+            coarser one.
+        coarse_solver (BandedLU): Factorization of the coarsest level.
+        reverse (bool): Whether the sweeps go from right to left.
+        direct_solver (BandedLU): Factorization of the finest level, made
+            on the first solve that does not converge, or None.
+        info (SolverInfo): Iterations, relative residuals, mean
+            convergence rate and convergence flag of the last solve.
+
+    The iterations stop when the relative residual
+
+        |b - A x| / ( |A| |x| + |b| )
+
+    is below the tolerance, which unlike |b - A x| / |b| stays reachable
+    when round-off in A x dominates on fine meshes. They also stop when
+    |b - A x| grows by DIVERGENCE, e.g. for a Galerkin model dominated by
+    convection, whose coarse levels are unstable.
+    """
+
+    def __init__(self, model, tolerance=1e-10, max_iterations=100,
+                 pre_smoothing=1, post_smoothing=1, coarsest_elements=16,
+                 fallback=True):
+        """Builds the hierarchy of a Model whose K is assembled, with the
+        boundary conditions applied, in banded storage.
+
+        Arguments:
+            model: The Model.
+            tolerance: Target for the relative residual.
+            max_iterations: Largest number of V-cycles.
+            pre_smoothing: Number of sweeps before the coarse correction.
+            post_smoothing: Number of sweeps after the coarse correction.
+            coarsest_elements: Size from which no coarser level is built.
+            fallback: Whether a solve that does not converge warns and
+                solves with the banded LU factorization instead of
+                raising.
+        """
+
+        if model.storage != "banded":
+            raise ValueError("Multigrid needs banded storage")
+
+        if model.K.corners:
+            raise ValueError("Multigrid does not support periodic conditions")
+
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.pre_smoothing = pre_smoothing
+        self.post_smoothing = post_smoothing
+        self.fallback = fallback
+        self.direct_solver = None
+        self.info = None
+
+        order = model.basis_function_order
+        self.matrices = [model.K]
+        self.dirichlet = [model.dirichlet_dofs()]
+        self.transfers = []
+
+        mesh = model.mesh
+        level = model
+
+        while mesh.num_elements % 2 == 0 and mesh.num_elements > coarsest_elements:
+            coarse = Mesh(mesh.x[::2])
+            self.transfers.append(Transfer(mesh, coarse, order))
+
+            # The same problem on the coarse mesh.
+            level = copy.copy(level)
+            level.mesh = coarse
+            level.u = None
+            level.assemble_system()
+
+            self.matrices.append(level.K)
+            self.dirichlet.append(level.dirichlet_dofs())
+            mesh = coarse
+
+        self.coarse_solver = self.matrices[-1].factorize()
+
+        # 2-norm of the fine operator, bounded by its largest row sum.
+        self.norm = np.abs(model.K.data).sum(axis=1).max()
+
+        r = Utils.evaluate(model.r, model.mesh.dof_coordinates(order))
+        self.reverse = bool(np.mean(r) < 0.0)
+
+    @property
+    def num_levels(self):
+        return len(self.matrices)
+
+    def solve(self, b, x=None):
+        """Solves A * x = b with V-cycles.
+
+        Arguments:
+            b: Right-hand side, or array of shape (size, m) holding m
+                right-hand sides as columns, solved one after the other.
+            x: Optional initial guess for a single right-hand side.
+
+        Returns:
+            The solution, with the same shape as b. The iteration counts
+            of the last column are kept in self.info.
+
+        Raises:
+            RuntimeError: If the V-cycles do not converge, or diverge,
+                without fallback. With fallback the solution of the
+                banded LU factorization is returned instead, with a
+                RuntimeWarning, and self.info records the failure.
+        """
+
+        b = np.asarray(b, dtype=float)
+
+        if b.ndim == 2:
+            return np.column_stack([self.solve(b[:, column])
+                                    for column in range(b.shape[1])])
+
+        x = np.zeros_like(b) if x is None else np.array(x, dtype=float)
+        matrix = self.matrices[0]
+        norm = self.norm
+
+        def residual_norms():
+            # Overflow of a diverging x gives inf or nan, handled below.
+            with np.errstate(over="ignore", invalid="ignore"):
+                scale = norm * np.linalg.norm(x) + np.linalg.norm(b)
+                residual = np.linalg.norm(b - matrix.dot(x))
+                return residual, residual / scale if scale > 0.0 else residual
+
+        initial, relative = residual_norms()
+        residuals = [relative]
+        residual = initial
+
+        # A diverging iteration stops as soon as its residual grew by
+        # DIVERGENCE, or is no longer finite.
+        while residuals[-1] > self.tolerance and len(residuals) <= self.max_iterations:
+            self.cycle(0, x, b)
+            residual, relative = residual_norms()
+            residuals.append(relative)
+            if not np.isfinite(relative) or residual > DIVERGENCE * initial:
+                break
+
+        iterations = len(residuals) - 1
+        converged = bool(residuals[-1] <= self.tolerance)
+        rate = (residuals[-1] / residuals[0])**(1.0 / iterations) \
+            if iterations and residuals[0] > 0.0 else 0.0
+
+        self.info = SolverInfo(iterations, residuals, rate, converged)
+
+        if not converged:
+            if not self.fallback:
+                raise RuntimeError("Multigrid did not converge in {} iterations, "
+                                   "relative residual {:.3e}".format(iterations, residuals[-1]))
+            warnings.warn("Multigrid did not converge in {} iterations, relative "
+                          "residual {:.3e}; solving with the banded LU "
+                          "factorization".format(iterations, residuals[-1]),
+                          RuntimeWarning)
+            if self.direct_solver is None:
+                self.direct_solver = matrix.factorize()
+            x = self.direct_solver.solve(b)
+
+        return x
+
+    def cycle(self, level, x, b):
+        """One V-cycle from the given level, updating x in place."""
+
+        if level == self.num_levels - 1:
+            x[:] = self.coarse_solver.solve(b)
+            return
+
+        matrix = self.matrices[level]
+
+        for sweep in range(self.pre_smoothing):
+            gauss_seidel(matrix, x, b, self.reverse)
+
+        # The Dirichlet rows are satisfied after a sweep, and the coarse
+        # correction must not change them.
+        residual = b - matrix.dot(x)
+        residual[self.dirichlet[level]] = 0.0
+
+        transfer = self.transfers[level]
+        coarse_residual = transfer.restrict(residual)
+        coarse_residual[self.dirichlet[level + 1]] = 0.0
+
+        correction = np.zeros_like(coarse_residual)
+        self.cycle(level + 1, correction, coarse_residual)
+        x += transfer.prolong(correction)
+
+        for sweep in range(self.post_smoothing):
+            gauss_seidel(matrix, x, b, self.reverse)
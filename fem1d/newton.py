@@ -0,0 +1,183 @@
+import time
+import warnings
+import numpy as np
+from collections import namedtuple
+from fem1d.instrumentation import phase
+
+
+NewtonStep = namedtuple(
+    "NewtonStep", ["residual", "jacobian_updated", "step_length",
+                   "assembly_time", "solve_time"])
+
+NewtonInfo = namedtuple(
+    "NewtonInfo", ["iterations", "residuals", "jacobian_updates",
+                   "converged", "steps"])
+
+
+class NewtonSolver(object):
+    """Newton or Picard iteration for a Model with nonlinear coefficients.
+
+    Every iteration solves J * du = -R(u) and updates u += du, where R is
+    the residual of the discrete equations with the boundary conditions
+    and J is assembled in the same vectorized pass by
+    Model.assemble_nonlinear():
+
+        method="newton" uses the exact Jacobian, with the derivatives of
+            the coefficients with respect to u and du/dx,
+        method="picard" uses the operator with the coefficients frozen at
+            the current u, i.e. the fixed-point iteration.
+
+    Assembling and factorizing J costs more than assembling R alone, so
+    with reuse_jacobian the factorization is kept for the next iterations
+    as long as every step reduces the residual norm at least by
+    reuse_ratio. A step that does not is retried with a fresh Jacobian,
+    and a step with a fresh Jacobian that increases the residual is
+    halved until it decreases it.
+
+    Attributes:
+        info (NewtonInfo): Iterations, residual norms, number of Jacobian
+            factorizations, convergence flag and one NewtonStep per
+            iteration, with its assembly and solve times in seconds, for
+            the last solve.
+    """
+
+    def __init__(self, model, method="newton", tolerance=1e-10,
+                 absolute_tolerance=1e-14, max_iterations=50,
+                 reuse_jacobian=True, reuse_ratio=0.25, max_halvings=10):
+        """Sets up the iteration for a Model.
+
+        Arguments:
+            model: The Model, with at least one Nonlinear coefficient.
+            method: "newton" or "picard".
+            tolerance: Target for the residual norm relative to the
+                residual of the initial guess.
+            absolute_tolerance: Target for the residual norm itself.
+            max_iterations: Largest number of iterations.
+            reuse_jacobian: Keep the factorization of J across iterations.
+            reuse_ratio: Largest ratio of consecutive residual norms for
+                which a stale Jacobian is kept.
+            max_halvings: Largest number of step halvings per iteration.
+        """
+
+        if method not in ("newton", "picard"):
+            raise ValueError("Invalid nonlinear method: {}".format(method))
+
+        if model.solver != "direct":
+            raise ValueError("Nonlinear problems need the direct solver")
+
+        self.model = model
+        self.method = method
+        self.tolerance = tolerance
+        self.absolute_tolerance = absolute_tolerance
+        self.max_iterations = max_iterations
+        self.reuse_jacobian = reuse_jacobian
+        self.reuse_ratio = reuse_ratio
+        self.max_halvings = max_halvings
+        self.info = None
+
+    def residual(self, u):
+        """Returns the residual R(u) of the model equations."""
+
+        self.model.assemble_nonlinear(u)
+        return -self.model.F
+
+    def solve(self, u):
+        """Iterates from the initial guess u.
+
+        A solve that does not reach the tolerance warns with a
+        RuntimeWarning and returns the last iterate; info.converged is
+        then False.
+
+        Returns:
+            The solution, a new array.
+        """
+
+        model = self.model
+        u = np.array(u, dtype=float)
+        factorization = None
+
+        start = time.perf_counter()
+        residual = self.residual(u)
+        norms = [np.linalg.norm(residual)]
+        target = max(self.tolerance * norms[0], self.absolute_tolerance)
+        assembly_time = time.perf_counter() - start
+
+        steps = []
+        updates = 0
+
+        while norms[-1] > target and len(steps) < self.max_iterations:
+            solve_time = 0.0
+            updated = factorization is None
+
+            if updated:
+                # Residual and Jacobian at u in one pass.
+                start = time.perf_counter()
+                model.assemble_nonlinear(u, self.method)
+                assembly_time += time.perf_counter() - start
+
+                start = time.perf_counter()
+                factorization = self.factorize(model.K)
+                solve_time += time.perf_counter() - start
+                updates += 1
+
+            start = time.perf_counter()
+            du = self.solve_linear(factorization, -residual)
+            solve_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            step = 1.0
+            new_u = u + du
+            new_residual = self.residual(new_u)
+            new_norm = np.linalg.norm(new_residual)
+
+            halvings = 0
+            while updated and not new_norm < norms[-1] and \
+                    halvings < self.max_halvings:
+                step *= 0.5
+                halvings += 1
+                new_u = u + step * du
+                new_residual = self.residual(new_u)
+                new_norm = np.linalg.norm(new_residual)
+            assembly_time += time.perf_counter() - start
+
+            if not updated and not new_norm <= self.reuse_ratio * norms[-1]:
+                # The stale Jacobian is not good enough: discard the step
+                # and redo it with a fresh one.
+                steps.append(NewtonStep(norms[-1], False, 0.0,
+                                        assembly_time, solve_time))
+                norms.append(norms[-1])
+                factorization = None
+                assembly_time = 0.0
+                continue
+
+            if not np.isfinite(new_norm):
+                break
+
+            u, residual = new_u, new_residual
+            norms.append(new_norm)
+            steps.append(NewtonStep(new_norm, updated, step, assembly_time,
+                                    solve_time))
+            assembly_time = 0.0
+
+            if not self.reuse_jacobian or new_norm > self.reuse_ratio * norms[-2]:
+                factorization = None
+
+        self.info = NewtonInfo(len(steps), norms, updates,
+                               bool(norms[-1] <= target), steps)
+
+        if not self.info.converged:
+            warnings.warn("Newton did not converge in {} iterations, residual "
+                          "{:.3e} for a target of {:.3e}".format(
+                              len(steps), norms[-1], target), RuntimeWarning)
+
+        return u
+
+    def factorize(self, K):
+        with phase(self.model.stats, "factorize"):
+            return self.model.factorize_matrix(K)
+
+    def solve_linear(self, factorization, F):
+        with phase(self.model.stats, "linear_solve"):
+            if self.model.storage == "dense":
+                return np.linalg.solve(factorization, F)
+            return factorization.solve(F)
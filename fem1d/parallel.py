@@ -0,0 +1,179 @@
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+
+# Default number of elements per partition. The partitions do not depend
+# on the number of workers, which keeps the result bitwise reproducible.
+PARTITION_SIZE = 4096
+
+
+def partitions(num_elements, partition_size=PARTITION_SIZE):
+    """Returns the (start, stop) element ranges of the partitions."""
+
+    return [(start, min(start + partition_size, num_elements))
+            for start in range(0, num_elements, partition_size)]
+
+
+class SharedArray(object):
+    """A numpy array of floats in a multiprocessing.shared_memory block.
+
+    Attributes:
+        name (str): Name of the block, to attach to it from a worker.
+        shape (tuple): Shape of the array.
+        array (numpy.ndarray): The array, zero-filled when created.
+    """
+
+    def __init__(self, shape, name=None):
+        size = max(int(np.prod(shape)) * 8, 1)
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None,
+                                                 size=size)
+        self.name = self.memory.name
+        self.shape = tuple(shape)
+        self.array = np.ndarray(self.shape, dtype=float, buffer=self.memory.buf)
+        if name is None:
+            self.array[...] = 0.0
+
+    def close(self):
+        # The array must be released before the block.
+        self.array = None
+        self.memory.close()
+
+    def unlink(self):
+        self.close()
+        self.memory.unlink()
+
+
+def assemble_parallel(model, workers, partition_size=None):
+    """Assembles K and F of a model in banded or memmap storage over
+    contiguous element partitions in a pool of processes.
+
+    Every partition is assembled by a copy of the model, see
+    Model.chunk_model(), and its band is written straight into a shared
+    memory band, except for its first and last rows: those are shared
+    with the neighbouring partitions, so they go to a separate shared
+    array and are summed afterwards, always left partition first. Only
+    the partition bounds are sent to the workers and nothing but their
+    status comes back.
+
+    Every partition is computed the same way by whichever process runs
+    it, and the interface rows are merged in a fixed order, so the
+    result does not depend on the number of workers, and with
+    workers=1, which runs the partitions in this process, it is the same.
+
+    The model is inherited by the workers with the "fork" start method;
+    with the other start methods it is pickled, so its coefficients must
+    then be module-level functions.
+
+    With the "memmap" storage the workers write straight into the
+    memory-mapped K and F of the model, which they share after a fork,
+    so the band is never held in memory; that needs the "fork" start
+    method, since the files of scratch_array() have no name to open.
+
+    Arguments:
+        model: The Model or VMSModel, with K and F allocated.
+        workers: Number of processes.
+        partition_size: Number of elements per partition, by default
+            PARTITION_SIZE.
+
+    Raises:
+        ValueError: For the "memmap" storage with several workers and
+            another start method than "fork".
+    """
+
+    order = model.basis_function_order
+    width = 2 * order + 1
+    bounds = partitions(model.mesh.num_elements, partition_size or PARTITION_SIZE)
+    num_rows = model.mesh.num_dofs(order)
+    context = multiprocessing.get_context()
+    mapped = model.storage == "memmap"
+
+    if mapped and workers > 1 and context.get_start_method() != "fork":
+        raise ValueError("Parallel assembly into memmap storage needs the "
+                         "fork start method")
+
+    shared = []
+    try:
+        if mapped:
+            band, load = model.K.data, model.F
+        else:
+            shared += [SharedArray((num_rows, width)), SharedArray((num_rows,))]
+            band, load = shared[0].array, shared[1].array
+
+        shared.append(SharedArray((len(bounds), 2, width + 1)))
+        edges = shared[-1].array
+        names = [array.name for array in shared]
+
+        if workers <= 1:
+            _initialize(model, None, band.shape, edges.shape,
+                        arrays=(band, load, edges))
+            for index, (start, stop) in enumerate(bounds):
+                _assemble_partition(index, start, stop)
+        else:
+            executor = ProcessPoolExecutor(
+                max_workers=min(workers, len(bounds)),
+                mp_context=context,
+                initializer=_initialize,
+                initargs=(model, names, band.shape, edges.shape))
+            with executor:
+                indices = range(len(bounds))
+                list(executor.map(_assemble_partition, indices,
+                                  [start for start, stop in bounds],
+                                  [stop for start, stop in bounds]))
+
+        # Merge the interface rows, left partition first.
+        for index, (start, stop) in enumerate(bounds):
+            for side, row in ((0, start * order), (1, stop * order)):
+                band[row] += edges[index, side, :width]
+                load[row] += edges[index, side, width]
+
+        if not mapped:
+            model.K.data[...] = band
+            model.F[...] = load
+    finally:
+        _state.clear()
+        band = load = edges = None
+        for array in shared:
+            array.unlink()
+
+
+# Model and shared arrays of the current process.
+_state = {}
+
+
+def _initialize(model, names, band_shape, edges_shape, arrays=None):
+    # NAMES are those of the shared band and load, unless the model has
+    # memory-mapped ones, and last of the edges.
+    if arrays is None:
+        shapes = (band_shape, band_shape[:1])[:len(names) - 1] + (edges_shape,)
+        # The blocks stay attached as long as the process.
+        _state["shared"] = [SharedArray(shape, name) for shape, name in zip(shapes, names)]
+        arrays = [shared.array for shared in _state["shared"]]
+        if len(names) == 1:
+            arrays = [model.K.data, model.F] + arrays
+        # Records of the workers would be lost, or written concurrently.
+        model.stats = None
+
+    _state["model"] = model
+    _state["band"], _state["load"], _state["edges"] = arrays
+
+
+def _assemble_partition(index, start, stop):
+    model = _state["model"]
+    order = model.basis_function_order
+
+    chunk = model.chunk_model(start, stop)
+    chunk.assemble()
+
+    band, load = chunk.K.data, chunk.F
+    interior = slice(start * order + 1, stop * order)
+
+    _state["band"][interior] = band[1:-1]
+    _state["load"][interior] = load[1:-1]
+
+    edges = _state["edges"]
+    edges[index, 0, :-1] = band[0]
+    edges[index, 0, -1] = load[0]
+    edges[index, 1, :-1] = band[-1]
+    edges[index, 1, -1] = load[-1]
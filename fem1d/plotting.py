@@ -0,0 +1,68 @@
+import numpy as np
+
+
+#
+# Discussion:
+#
+#   Plots of fem1d results. matplotlib is an optional dependency: it is
+#   only imported by the functions of this module, on first use, so that
+#   the numerical modules and this one import with NumPy alone.
+#
+
+
+def pyplot():
+    """Returns matplotlib.pyplot, imported on first use.
+
+    Raises:
+        ImportError: If matplotlib is not installed.
+    """
+
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ImportError("fem1d.plotting needs matplotlib, see requirements.txt")
+
+    return plt
+
+
+def plot_solution(model, u_exact=None, style="k*-", label=None, axes=None,
+                  refinement=100):
+    """Plots the nodal values of the solution of a model.
+
+    Arguments:
+        model: A solved Model or VMSModel.
+        u_exact: Optional exact solution, a function of x, plotted as a
+            line on a mesh refinement times finer.
+        style: Line style of the solution.
+        label: Optional legend label of the solution.
+        axes: Optional matplotlib axes, by default the current ones.
+        refinement: Number of points per element of the exact solution.
+
+    Returns:
+        The axes.
+    """
+
+    if axes is None:
+        axes = pyplot().gca()
+
+    mesh = model.mesh
+
+    if u_exact is not None:
+        x = np.linspace(mesh.x[0], mesh.x[-1], mesh.num_elements * refinement + 1)
+        axes.plot(x, u_exact(x), "k", linewidth=1, label="exact" if label else None)
+
+    x = mesh.dof_coordinates(model.basis_function_order)
+    axes.plot(x, model.u, style, linewidth=1, label=label)
+
+    return axes
+
+
+def show(filename=None):
+    """Shows the current figure, or saves it to filename."""
+
+    plt = pyplot()
+
+    if filename is None:
+        plt.show()
+    else:
+        plt.savefig(filename)
@@ -1,9 +1,14 @@
 import sys
 import numpy as np
 import math
+from collections import namedtuple
 from functools import partial
-from fem1d.utils import Utils
-from fem1d.quadrature_rule import QuadratureRule
+from fem1d.element import reference_basis, shape_functions
+from fem1d.vms_model import VMSModel, stabilization_parameter
+from fem1d.instrumentation import Stats, phase, counted, uncounted
+
+
+ErrorContributions = namedtuple("ErrorContributions", ["residual", "jump"])
 
 
 class QoI(object):
@@ -22,129 +27,164 @@ class QoI(object):
         self.qFunc = qFunc
         self.u_exact = u_exact
         self.num_quad_points = num_quad_points
+        self.stats = None
+
+    def instrument(self, stats=None, sink=None):
+        # Records the time of compute() and error_estimator() and the
+        # calls of qFunc and u_exact, see Model.instrument(). Shares the
+        # Stats of the model if it is instrumented and none is given.
+        if stats is None:
+            stats = self.model.stats if self.model.stats is not None else Stats(sink)
+
+        self.stats = stats
+        self.qFunc = counted(self.qFunc, "qFunc", stats)
+        self.u_exact = counted(self.u_exact, "u_exact", stats)
+
+        return stats
+
+    def uninstrument(self):
+        self.stats = None
+        self.qFunc = uncounted(self.qFunc)
+        self.u_exact = uncounted(self.u_exact)
+
+    def evaluate(self, name, function, x, points=None):
+        # Values of a function of the QoI at the quadrature points, or at
+        # the named POINTS, from the coefficient field of the mesh.
+        if points is None:
+            points = self.model.quadrature_points(self.num_quad_points)
+        return self.model.mesh.coefficient_field.evaluate(name, function, x, points)
+
+    def stabilization(self, h, p, r):
+        # Tau of the model for element sizes H; a VMSModel also limits it
+        # by its time step, see VMSModel.stabilization().
+        if isinstance(self.model, VMSModel):
+            return self.model.stabilization(h, p, r)
+        return stabilization_parameter(h, p, r)
 
     def computeTau(self,element, x):
         # Pe = h * r / (  2 * p )
-        # tau = h / ( sqrt(3.0) * r ) * min(1, Pe / sqrt(10) )
-        Pe = element.h * self.model.r(x) / ( 2.0 * self.model.p(x) )
-        h = element.h
-        r = self.model.r(x)
-        p = self.model.p(x)
-        return element.h / ( 2.0 * r ) * ( 1.0 / math.tanh( Pe ) - 1.0 / Pe )
+        # tau = h / ( 2 * r ) * ( coth(Pe) - 1/Pe )
+        h = element.h / self.model.basis_function_order
+        return self.stabilization(h, self.model.p(x), self.model.r(x))
         #return h / (math.sqrt(3.0) * r) * min( 1.0, Pe / math.sqrt(10.0))
         #return min( h / r, h**2 / (8.0 * p) )
 
+    def tauField(self):
+        # Tau at the QoI quadrature points of every element. A VMSModel
+        # caches it, so assembly and the estimator share the same array.
+        if isinstance(self.model, VMSModel):
+            return self.model.tauField(self.num_quad_points)
+
+        quad = self.model.quadrature_data(self.num_quad_points)
+        points = self.model.quadrature_points(self.num_quad_points)
+        return self.stabilization(quad.h[:, None] / self.model.basis_function_order,
+                                  self.model.evaluate_coefficient("p", quad.x, points),
+                                  self.model.evaluate_coefficient("r", quad.x, points))
+
     def compute(self):
+        with phase(self.stats, "qoi_compute"):
+            self.__compute()
+
+    def __compute(self):
+        # Solution, functional and exact solution at every quadrature point
+        # of every element, each function called once on the full array.
+        # The points are those of the model, so that the values are shared
+        # through the coefficient field of the mesh.
+        table = reference_basis(self.model.basis_function_order, self.num_quad_points)
+        mesh = self.model.mesh
+        x = self.model.quadrature_data(self.num_quad_points).x
+
+        u = self.model.interpolate_field(self.num_quad_points)
+        q = self.evaluate("qoi", self.qFunc, x)
+        u_exact = self.evaluate("u_exact", self.u_exact, x)
 
-        self.value = 0.0
-        self.value_exact = 0.0
-            
-        # Set Quadrature rule
-        quad_rule = QuadratureRule( self.num_quad_points )
-
-        # Loop over elements.
-
-        for element in self.model.mesh.elements:
-
-            e = element.index
-
-            # Loop over quadrature points.
-            
-            for k in range(self.num_quad_points):
-                
-                # Get xi location of quadrature point.
-                xi = quad_rule.xi_q[k]
-                
-                # Calculate x location of quadrature point.
-                x = element.x_left + 0.5 * (1 + xi) * element.h
-                
-                # Calculate quadrature weight.
-                w = quad_rule.w_q[k] * 0.5 * element.h
-
-                # Interpolate solution at quadrature point.
-                u = self.model.interpolate( element, k, self.num_quad_points )
-                
-                # Compute the integral:
-                #    qFunc(x) * u(x)
-                f = self.qFunc(x) * u
-                f_e = self.qFunc(x) * self.u_exact(x)                
-                self.value += w * f
-                self.value_exact += w * f_e
+        # Q(u) = sum_e h_e/2 * sum_k w_k * qFunc(x) * u(x)
+        jacobian = 0.5 * mesh.h
+        self.value = np.dot(jacobian, np.dot(q * u, table.w))
+        self.value_exact = np.dot(jacobian, np.dot(q * u_exact, table.w))
 
 
     def error_estimator(self):
-        
-        self.error_est = 0.0
-        self.error_est_bound = 0.0
-
-        # Set Quadrature rule
-        quad_rule = QuadratureRule( self.num_quad_points )
-        
-        # Loop over elements.
-
-        for element in self.model.mesh.elements:
-
-            e = element.index
-
-            # Loop over quadrature points.
-            
-            for k in range(self.num_quad_points):
-                    
-                # Get xi location of quadrature point
-                xi = quad_rule.xi_q[k]
-
-                # Calculate x location of quadrature point
-                x = element.x_left + 0.5 * (1 + xi) * element.h
-
-                # Calculate quadrature weight
-                w = quad_rule.w_q[k] * 0.5 * element.h
-
-                # Compute time-scale parameter
-                tau = self.computeTau(element,x)
-
-                # Interpolate values
-                u = 0.0
-                du = 0.0
-                
-                # Loop over basis functions.
-                for i in range(element.num_nodes):
-                                
-                    # Compute the values of the basis functions and
-                    # its gradients at node I.
-                    basis_i = element.basis_function(x=x, local_node=i)
-                    basis_i_x = element.basis_gradient(x=x, local_node=i)
-
-                    u += basis_i * self.model.u[e+i]
-                    du += basis_i_x * self.model.u[e+i]
-
-                # Compute the contribution of the integral of the stabilization term:
-                #    tau * Residual(u).
-                # with:
-                #    Residual(u) = f(x) - [ -d/dx ( p(x) du/dx ) + q(x) * u + r(x) * du/dx  ]
-                # Note that for linear elements the second order derivatives are zero
-                Residual = self.model.f(x) - ( self.model.q(x) * u + self.model.r(x) * du )
-                f = self.qFunc(x) * tau * Residual
-                self.error_est += w * f
-
-
-                # Add jump contribution
-                x = element.x_left + i * element.h
-                tau = self.computeTau(element,x)
-
-                # Loop over basis functions.
-                grad_u = 0.0
-                for j in range(element.num_nodes):
-                    basis_j_x = element.basis_gradient(x=x, local_node=j)
-                    grad_u +=  basis_j_x * self.model.u[e+j]
-
-                # Compute jumps contribution
-                #  jump = p(x) * du/dx * n
-                jump = self.model.p(x) * grad_u * (-1)**(i+1)
-                f = self.qFunc(x) * tau / element.h * 0.5 * jump
-                self.error_est_bound += f
-                self.error_est += f
-                
-                
-                
-
-            
+        #
+        # Discussion:
+        #
+        #   Estimates the error in the QoI of a VMS solution as
+        #
+        #     sum_e int_e qFunc(x) * tau * Residual(u) dx  +  jumps
+        #
+        #   with
+        #
+        #     Residual(u) = f(x) - [ -p(x) d2u/dx2 + q(x) * u + r(x) * du/dx ]
+        #
+        #   where the derivative of p is neglected, and where the jump term
+        #   of every element adds 0.5 * qFunc * tau / h * p * du/dx * n
+        #   at both of its ends, n being the outward normal.
+        #
+        #   The element loop this replaces took the jump inside its loop
+        #   over quadrature points, at the end given by the last basis
+        #   index of the previous loop, min(order, 1) = 1. It therefore added
+        #   the flux at the right end only, once per quadrature point, so
+        #   the estimate grew with num_quad_points. The term is now taken
+        #   once per element at both ends. Where the flux p * du/dx of an
+        #   element is constant, e.g. linear elements with constant
+        #   coefficients, its two ends cancel. The residual term then gives
+        #   the whole estimate, which is exact for the nodally exact VMS
+        #   solution.
+        #
+        # Outputs:
+        #
+        #     (ErrorContributions) with the per-element arrays
+        #
+        #     (numpy.ndarray) residual, shape (num_elements,)
+        #         The residual contribution of every element.
+        #
+        #     (numpy.ndarray) jump, shape (num_elements,)
+        #         The jump contribution of every element.
+        #
+        #   The totals are also stored in error_est, the full estimate,
+        #   and error_est_bound, the jump part.
+        #
+
+        with phase(self.stats, "qoi_error_estimator"):
+            return self.__errorEstimator()
+
+    def __errorEstimator(self):
+        model = self.model
+        mesh = model.mesh
+        order = model.basis_function_order
+        n = self.num_quad_points
+
+        # Residual contribution, evaluated at all quadrature points at once.
+        quad = model.quadrature_data(n)
+        coefficients = model.evaluate_coefficients(quad.x, model.quadrature_points(n))
+        tau = self.tauField()
+
+        u = model.interpolate_field(n)
+        du = model.interpolate_field(n, 1)
+        d2u = model.interpolate_field(n, 2)
+
+        residual = coefficients.f - ( - coefficients.p * d2u
+                                      + coefficients.q * u
+                                      + coefficients.r * du )
+        residual = residual * quad.w * tau * self.evaluate("qoi", self.qFunc, quad.x)
+        residual = residual.sum(axis=1)
+
+        # Jump contribution, evaluated at both ends of every element.
+        x_ends = np.column_stack((mesh.x_left, mesh.x_left + mesh.h))
+        p_ends = model.evaluate_coefficient("p", x_ends, "ends")
+        tau_ends = self.stabilization(mesh.h[:, None] / order, p_ends,
+                                      model.evaluate_coefficient("r", x_ends, "ends"))
+
+        basis_xi_ends = shape_functions(order, [-1.0, 1.0], 1)
+        du_ends = np.dot(model.u[mesh.dofs(order)], basis_xi_ends.T)
+        du_ends *= (2.0 / mesh.h)[:, None]
+
+        normals = np.array([-1.0, 1.0])
+        jump = self.evaluate("qoi", self.qFunc, x_ends, "ends") * tau_ends * p_ends * du_ends * normals
+        jump = 0.5 * jump.sum(axis=1) / mesh.h
+
+        self.contributions = ErrorContributions(residual, jump)
+        self.error_est_bound = jump.sum()
+        self.error_est = residual.sum() + self.error_est_bound
+
+        return self.contributions
@@ -2,7 +2,90 @@ import math
 import numpy as np
 
 class QuadratureRule(object):
+    """Quadrature rule on the reference interval -1 <= xi <= 1.
 
-    def __init__(self, num_quad_points):
-        self.num_quad_points = num_quad_points
-        self.xi_q, self.w_q = np.polynomial.legendre.leggauss(num_quad_points)
+    Rules are shared and read-only: QuadratureRule(n, family) computes the
+    points and weights the first time a (n, family) pair is requested and
+    returns the same instance afterwards.
+
+    Attributes:
+        num_quad_points (int): Number of quadrature points.
+        family (str): "legendre" for Gauss-Legendre points, which
+            integrate polynomials of degree 2n-1 exactly, or "lobatto"
+            for Gauss-Lobatto points, which include the end points and
+            integrate polynomials of degree 2n-3 exactly.
+        xi_q (numpy.ndarray): The quadrature points.
+        w_q (numpy.ndarray): The quadrature weights.
+    """
+
+    _registry = {}
+
+    def __new__(cls, num_quad_points, family="legendre"):
+        key = (num_quad_points, family)
+        rule = cls._registry.get(key)
+
+        if rule is None:
+            if family == "legendre":
+                xi_q, w_q = np.polynomial.legendre.leggauss(num_quad_points)
+            elif family == "lobatto":
+                xi_q, w_q = gauss_lobatto(num_quad_points)
+            else:
+                raise ValueError("Invalid quadrature family: {}".format(family))
+
+            xi_q.setflags(write=False)
+            w_q.setflags(write=False)
+
+            rule = object.__new__(cls)
+            object.__setattr__(rule, "num_quad_points", num_quad_points)
+            object.__setattr__(rule, "family", family)
+            object.__setattr__(rule, "xi_q", xi_q)
+            object.__setattr__(rule, "w_q", w_q)
+
+            rule = cls._registry.setdefault(key, rule)
+
+        return rule
+
+    def __init__(self, num_quad_points, family="legendre"):
+        # All the work is done once in __new__.
+        pass
+
+    def __setattr__(self, name, value):
+        raise AttributeError("QuadratureRule is read-only")
+
+    def __reduce__(self):
+        return (QuadratureRule, (self.num_quad_points, self.family))
+
+    def __repr__(self):
+        return "QuadratureRule({}, family={!r})".format(
+            self.num_quad_points, self.family)
+
+
+def gauss_lobatto(num_quad_points):
+    """Computes the Gauss-Lobatto points and weights on [-1, 1].
+
+    The interior points are the roots of P'_{n-1}, the derivative of the
+    Legendre polynomial of degree n-1, and the weights are
+    2 / ( n (n-1) P_{n-1}(xi)^2 ).
+
+    Arguments:
+        num_quad_points: Number of points, at least 2.
+
+    Returns:
+        Tuple (xi_q, w_q) of arrays.
+    """
+
+    n = num_quad_points
+
+    if n < 2:
+        raise ValueError("Gauss-Lobatto rules need at least 2 points")
+
+    legendre = np.polynomial.legendre
+    coefficients = np.zeros(n)
+    coefficients[-1] = 1.0
+
+    interior = legendre.legroots(legendre.legder(coefficients)) if n > 2 \
+        else np.zeros(0)
+    xi_q = np.concatenate(([-1.0], np.sort(np.real(interior)), [1.0]))
+    w_q = 2.0 / ( n * (n - 1) * legendre.legval(xi_q, coefficients)**2 )
+
+    return xi_q, w_q
@@ -0,0 +1,241 @@
+import copy
+import numpy as np
+from fem1d.banded import BandedMatrix
+
+
+class TransientSolver(object):
+    """Time integrator for du/dt - (p u')' + q u + r u' = f(x, t).
+
+    The space discretization is that of a Model or VMSModel, which gives
+    the mass matrix M and the operator K, so that
+
+        M du/dt + K u = F(t).
+
+    Two schemes are available, for a fixed time step dt:
+
+        "theta": (M + theta dt K) u_n+1
+                     = (M - (1 - theta) dt K) u_n
+                       + dt ( theta F_n+1 + (1 - theta) F_n ),
+
+            backward Euler for theta = 1 and Crank-Nicolson for 0.5,
+
+        "bdf2":  (3/2 M + dt K) u_n+1 = M ( 2 u_n - 1/2 u_n-1 ) + dt F_n+1,
+
+            started with one backward Euler step.
+
+    M and K are assembled once, and the system matrix is factorized once
+    per scheme coefficient, so a step only costs the load vector at the
+    new time, two banded products and a banded back-substitution. If the
+    source does not depend on t its load vector is also assembled once.
+
+    For a VMSModel tau is limited by the time step, see
+    VMSModel.stabilization(), and the mass matrix includes the tau term
+    of the residual. The solver works on a copy of the model with that
+    time step, so the model itself keeps its steady stabilization and
+    its K.
+
+    Attributes:
+        model: The copy of the model, with time_step set.
+        time (float): Time of the current solution.
+        u (numpy.ndarray): Current solution.
+        num_steps (int): Number of steps taken.
+        num_factorizations (int): Number of system matrices factorized.
+    """
+
+    def __init__(self, model, time_step, method="theta", theta=0.5,
+                 source=None, bc_left=None, bc_right=None, u0=None, t0=0.0):
+        """Assembles M and K for a fixed time step.
+
+        Arguments:
+            model: The Model with the coefficients, mesh, boundary
+                condition types and storage. Its f is the source unless
+                one is given.
+            time_step: The time step dt.
+            method: "theta" or "bdf2".
+            theta: Parameter of the theta method, between 0 and 1.
+            source: Optional source f(x, t).
+            bc_left, bc_right: Boundary values, as numbers or functions of
+                t. Default to those of the model.
+            u0: Initial condition, as an array of nodal values or a
+                function of x. Defaults to zero.
+            t0: Initial time.
+        """
+
+        if method not in ("theta", "bdf2"):
+            raise ValueError("Invalid time integration method: {}".format(method))
+
+        if model.nonlinear():
+            raise ValueError("Transient problems need linear coefficients")
+
+        # A copy, so that a later steady solve of MODEL does not use a
+        # tau limited by the time step.
+        model = copy.copy(model)
+        model.time_step = time_step
+
+        self.model = model
+        self.time_step = time_step
+        self.method = method
+        self.theta = theta
+        self.source = source
+        self.bc_left = model.bc_left if bc_left is None else bc_left
+        self.bc_right = model.bc_right if bc_right is None else bc_right
+        self.time = t0
+        self.num_steps = 0
+        self.num_factorizations = 0
+
+        x = model.mesh.dof_coordinates(model.basis_function_order)
+        if u0 is None:
+            self.u = np.zeros(len(x))
+        elif callable(u0):
+            self.u = np.asarray(u0(x), dtype=float) * np.ones(len(x))
+        else:
+            self.u = np.array(u0, dtype=float)
+
+        model.assemble()
+
+        # K with the boundary terms of the weak form, e.g. of Robin
+        # conditions; the constraints are applied to the system matrix.
+        self.conditions = model.boundary_conditions()
+        self.conditions.add_operator(model.K)
+
+        self.K = model.K
+        self.M = model.mass_matrix()
+
+        self.previous = None
+        self.load = None
+        self.static_load = None
+        self.factorizations = {}
+
+    def run(self, num_steps, output=None, every=1):
+        """Takes num_steps time steps.
+
+        Arguments:
+            num_steps: Number of steps.
+            output: Optional file name. The initial solution and every
+                every-th step are then written to a .npy file as they are
+                computed, see load_snapshots(), instead of being kept.
+            every: Number of steps between snapshots.
+
+        Returns:
+            The solution at the final time.
+        """
+
+        snapshots = None
+
+        if output is not None:
+            dtype = np.dtype([("t", float), ("u", float, (len(self.u),))])
+            snapshots = np.lib.format.open_memmap(
+                output, mode="w+", dtype=dtype, shape=(num_steps // every + 1,))
+            snapshots[0] = (self.time, self.u)
+
+        for step in range(1, num_steps + 1):
+            self.step()
+
+            if snapshots is not None and step % every == 0:
+                snapshots[step // every] = (self.time, self.u)
+
+        if snapshots is not None:
+            snapshots.flush()
+            del snapshots
+
+        return self.u
+
+    def step(self):
+        """Advances the solution by one time step."""
+
+        dt = self.time_step
+        t = self.time + dt
+
+        if self.load is None:
+            self.load = self.load_vector(self.time)
+        load = self.load_vector(t)
+
+        if self.method == "bdf2" and self.previous is not None:
+            a, b = 1.5, dt
+            F = self.M.dot(2.0 * self.u - 0.5 * self.previous) + dt * load
+        else:
+            # The first step of BDF2 is backward Euler.
+            theta = 1.0 if self.method == "bdf2" else self.theta
+            a, b = 1.0, theta * dt
+            F = self.M.dot(self.u) + dt * ( theta * load + (1 - theta) * self.load )
+            if theta < 1.0:
+                F -= (1 - theta) * dt * self.K.dot(self.u)
+
+        self.conditions.constrain_load(F, evaluate_in_time(self.bc_left, t),
+                                       evaluate_in_time(self.bc_right, t))
+
+        self.previous = self.u
+        self.u = self.solve(a, b, F)
+        self.load = load
+        self.time = t
+        self.num_steps += 1
+
+        return self.u
+
+    def load_vector(self, t):
+        """Returns F(t): the load vector of the source at time t with the
+        Neumann and Robin boundary values."""
+
+        model = self.model
+
+        if self.source is None:
+            if self.static_load is None:
+                self.static_load = model.assemble_load([model.f])[:, 0]
+            F = self.static_load.copy()
+        else:
+            F = model.assemble_load([lambda x: self.source(x, t)])[:, 0]
+
+        # The constrained rows are replaced when the system is solved.
+        self.conditions.add_load(F, evaluate_in_time(self.bc_left, t),
+                                 evaluate_in_time(self.bc_right, t))
+
+        return F
+
+    def solve(self, a, b, F):
+        """Solves (a M + b K) u = F, with the constrained rows replaced,
+        e.g. by the identity for Dirichlet conditions. The factorization
+        is computed on first use and kept for every step with the same a
+        and b."""
+
+        key = (a, b)
+
+        if key not in self.factorizations:
+            if isinstance(self.K, BandedMatrix):
+                A = BandedMatrix(self.K.size, self.K.lower, self.K.upper,
+                                 a * self.M.data + b * self.K.data)
+                self.conditions.constrain(A)
+                self.factorizations[key] = A.factorize()
+            else:
+                A = a * self.M + b * self.K
+                self.conditions.constrain(A)
+                self.factorizations[key] = A
+            self.num_factorizations += 1
+
+        factorization = self.factorizations[key]
+
+        if isinstance(factorization, np.ndarray):
+            # Dense storage is only meant for debugging.
+            return np.linalg.solve(factorization, F)
+
+        return factorization.solve(F)
+
+
+def evaluate_in_time(value, t):
+    """Returns value(t) for a function of time, or value itself."""
+
+    return value(t) if callable(value) else value
+
+
+def load_snapshots(filename):
+    """Opens the snapshots written by TransientSolver.run().
+
+    The file is memory mapped, so the snapshots are read from disk as
+    they are used.
+
+    Returns:
+        Tuple (t, u) of arrays of shapes (num_snapshots,) and
+        (num_snapshots, num_dofs).
+    """
+
+    snapshots = np.load(filename, mmap_mode="r")
+    return snapshots["t"], snapshots["u"]
@@ -1,8 +1,8 @@
 import sys
 import math
 import numpy as np
-import matplotlib.pyplot as plt
 from fem1d.quadrature_rule import QuadratureRule
+from fem1d.coefficients import Constant
 
 class Utils(object):
 
@@ -55,3 +55,46 @@ class Utils(object):
             result += quad_rule.w_q[nn] * 0.5 * (x_r - x_l) * f
 
         return result
+
+    @staticmethod
+    def evaluate(function, x):
+        """Evaluates a coefficient function on an array of points.
+
+        The function is called once on the flattened points. A function
+        that only accepts scalars, e.g. one written with math.sin, raises
+        on the array and is then called point by point through
+        np.vectorize. It is first called on a single point, so that an
+        error of the function itself is raised as it is instead of being
+        retried. Constant or scalar results are broadcast to the shape
+        of x.
+
+        Arguments:
+            function: A callable or a constant.
+            x: Array of evaluation points.
+
+        Returns:
+            An array of floats with the same shape as x.
+        """
+
+        x = np.asarray(x, dtype=float)
+
+        if isinstance(function, Constant):
+            value = function.value
+        elif callable(function):
+            try:
+                value = function(x.ravel())
+            except (TypeError, ValueError):
+                # A function that also fails on a single point raises
+                # here, with its own error.
+                if x.size:
+                    function(x.flat[0])
+                value = np.vectorize(function, otypes=[float])(x.ravel())
+        else:
+            value = function
+
+        value = np.asarray(value, dtype=float)
+
+        if value.size == x.size:
+            return value.reshape(x.shape)
+
+        return np.broadcast_to(value, x.shape)
@@ -3,34 +3,257 @@ import numpy as np
 import math
 from functools import partial
 from fem1d.utils import Utils
-from fem1d.model import Model
+from fem1d.model import Model, STIFFNESS, MASS, ADVECTION, LOAD, GRADIENT
 from fem1d.quadrature_rule import QuadratureRule
+from fem1d.coefficients import as_function
+
+
+# Below this Peclet number tau is evaluated with a series expansion, since
+# coth(Pe) - 1/Pe suffers from cancellation as Pe -> 0.
+SMALL_PECLET = 0.2
+
+
+def stabilization_parameter(h, p, r):
+    """Computes the VMS time-scale parameter tau.
+
+    tau = h / (2 * r) * ( coth(Pe) - 1/Pe ),  with Pe = h * r / (2 * p),
+
+    which is rewritten as tau = h**2 / (4 * p) * g(Pe) with
+    g(Pe) = ( coth(Pe) - 1/Pe ) / Pe. For |Pe| < SMALL_PECLET g is
+    evaluated with its Taylor series, so tau tends to h**2 / (12 * p)
+    when r = 0, and to h / (2 * |r|) when p = 0.
+
+    Arguments:
+        h: Element sizes.
+        p: Diffusion coefficient.
+        r: Advection coefficient.
+
+    Returns:
+        Array of tau values with the broadcast shape of h, p and r.
+    """
+
+    h, p, r = np.broadcast_arrays(np.asarray(h, dtype=float),
+                                  np.asarray(p, dtype=float),
+                                  np.asarray(r, dtype=float))
+    tau = np.empty(h.shape)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        Pe = np.abs(h * r / ( 2.0 * p ))
+
+    small = Pe < SMALL_PECLET
+    large = ~small
+
+    # coth(Pe) - 1/Pe = Pe/3 - Pe^3/45 + 2 Pe^5/945 - Pe^7/4725
+    #                   + 2 Pe^9/93555 - 1382 Pe^11/638512875 + ...
+    Pe2 = Pe[small]**2
+    g = 1.0/3.0 + Pe2 * (-1.0/45.0 + Pe2 * (2.0/945.0 + Pe2 * (-1.0/4725.0
+        + Pe2 * (2.0/93555.0 + Pe2 * (-1382.0/638512875.0)))))
+    tau[small] = h[small]**2 / ( 4.0 * p[small] ) * g
+
+    with np.errstate(divide="ignore"):
+        tau[large] = h[large] / ( 2.0 * np.abs(r[large]) ) * \
+            ( 1.0 / np.tanh( Pe[large] ) - 1.0 / Pe[large] )
+
+    return tau
+
+
+# The stabilization terms of nonlinear coefficients, and tau itself,
+# would depend on u; only the Galerkin Model solves them, see fem1d.newton.
+NONLINEAR_ERROR = "VMSModel does not support Nonlinear coefficients, use Model"
 
 
 class VMSModel(Model):
 
-    def __init__(self, mesh, p, q, r, f, bc_type, bc_left, bc_right, num_quad_points=2, basis_function_order=2):
-        Model.__init__(self,mesh, p, q, r, f, bc_type, bc_left, bc_right, num_quad_points, basis_function_order)
+    def __init__(self, mesh, p, q, r, f, bc_type, bc_left, bc_right, num_quad_points=2, basis_function_order=1, assembly="vectorized", storage="banded", solver="direct", solver_options=None, nonlinear_options=None, chunk_size=None, directory=None, workers=None):
+        Model.__init__(self,mesh, p, q, r, f, bc_type, bc_left, bc_right, num_quad_points, basis_function_order, assembly, storage, solver, solver_options, nonlinear_options, chunk_size, directory, workers)
+
+        if self.nonlinear():
+            raise ValueError(NONLINEAR_ERROR)
+
+        # Cache of tau at the quadrature points, keyed by the number of
+        # quadrature points per element.
+        self.tau = {}
 
     def solve(self):
+        # The coefficients may have been replaced since __init__.
+        if self.nonlinear():
+            raise ValueError(NONLINEAR_ERROR)
+
         Model.solve(self)
 
+    def assemble(self):
+        self.tau = {}
+        Model.assemble(self)
+
+    def nonlinear_element_arrays(self, u, jacobian=None):
+        raise ValueError(NONLINEAR_ERROR)
+
     def computeTau(self,element, x):
         # Pe = h * r / (  2 * p )
         # tau = h / (2 * r) * ( coth(Pe) - 1/Pe )
-        Pe = element.h * self.r(x) / ( 2.0 * self.p(x) )
-        return element.h / ( 2.0 * self.r(x) ) * ( 1.0 / math.tanh( Pe ) - 1.0 / Pe )
-
-
-    def assemble(self):
-        Model.assemble(self)
+        return self.stabilization(element.h / self.basis_function_order, self.p(x), self.r(x))
+
+    def stabilization(self, h, p, r):
+        #
+        # Discussion:
+        #
+        #   Returns tau for element sizes H. In a transient solve with
+        #   time step dt the time scale of the subscales is also limited
+        #   by dt / 2:
+        #
+        #     tau_t = ( tau^-2 + (2 / dt)^2 )^(-1/2)
+        #
+
+        tau = stabilization_parameter(h, p, r)
+
+        if self.time_step is not None:
+            tau = tau / np.sqrt(1.0 + (2.0 * tau / self.time_step)**2)
+
+        return tau
+
+    def tauField(self, num_quad_points=None):
+        #
+        # Discussion:
+        #
+        #   Returns tau at every quadrature point of every element, as an
+        #   array of shape (num_elements, num_quad_points). The array is
+        #   cached until the next assembly.
+        #
+
+        if num_quad_points is None:
+            num_quad_points = self.num_quad_points
+
+        if num_quad_points not in self.tau:
+            quad = self.quadrature_data(num_quad_points)
+            points = self.quadrature_points(num_quad_points)
+            p = self.evaluate_coefficient("p", quad.x, points)
+            r = self.evaluate_coefficient("r", quad.x, points)
+            self.tau[num_quad_points] = self.stabilization(
+                quad.h[:, None] / self.basis_function_order, p, r)
+
+        return self.tau[num_quad_points]
+
+
+    def add_element_terms(self, K_e, quad, coefficients):
+        #
+        # Discussion:
+        #
+        #   Adds the stabilization terms to the element matrices built by
+        #   Model.element_arrays(), reusing its geometry, basis data and
+        #   coefficient values at the quadrature points.
+        #
+        #   The LHS contribution of the integral of the stabilization term:
+        #      tau * Residual(u) * Ladj(W).
+        #   with:
+        #      Ladj(w) = -d/dx ( p(x) dw/dx ) + q(x) * u - r(x) * du/dx
+        #      Residual(u) = f(x) - [ -d/dx ( p(x) du/dx ) + q(x) * u + r(x) * du/dx  ]
+        #   The f(x) part of the residual moves to the RHS with a minus
+        #   sign, see load_functions().
+        #   Note that for linear elements the second order derivatives are
+        #   zero, and that the derivative of p is neglected.
+        #
+        #   With dW/dx = dW/dxi * dxi/dx the product
+        #      Ladj(W_I) * ( p * d2W_J/dx2 - q * W_J - r * dW_J/dx )
+        #   expands into the reference tables of basis products.
+        #
+
+        p, q, r = coefficients.p, coefficients.q, coefficients.r
+        dxi_dx = quad.dxi_dx[:, None]
+        products = quad.products
+
+        # Compute time-scale parameter
+        tau = self.stabilization(quad.h[:, None] / self.basis_function_order,
+                                 coefficients.p, coefficients.r)
+        self.tau[quad.x.shape[1]] = tau
+        w_tau = quad.w * tau
+
+        K_e -= np.dot(w_tau * q * q, products["NN"])
+        K_e -= np.dot(w_tau * q * r, products["NB"] - products["BN"]) * dxi_dx
+        K_e += np.dot(w_tau * r * r, products["BB"]) * dxi_dx**2
+
+        if quad.basis.shape[1] > 2:
+
+            # Second order derivatives of the basis functions.
+            K_e += np.dot(w_tau * q * p, products["NC"] + products["CN"]) * dxi_dx**2
+            K_e -= np.dot(w_tau * r * p, products["BC"] - products["CB"]) * dxi_dx**3
+            K_e -= np.dot(w_tau * p * p, products["CC"]) * dxi_dx**4
+
+    def element_templates(self, h, constants):
+        #
+        # Discussion:
+        #
+        #   Adds to the Galerkin templates the exact stabilization terms
+        #   of linear elements with constant coefficients, where tau is
+        #   constant on every element and the second derivatives vanish:
+        #
+        #     - tau q^2 int W_I W_J - tau q r int ( W_I dW_J/dx - dW_I/dx W_J )
+        #     + tau r^2 int dW_I/dx dW_J/dx
+        #
+        #   and on the RHS - tau f int ( q W_I - r dW_I/dx ).
+        #
+
+        K_t, F_t = Model.element_templates(self, h, constants)
+
+        p, q, r, f = constants
+        tau = self.stabilization(h, p, r)[:, None, None]
+        h = h[:, None, None]
+
+        K_t -= tau * q * q * h * MASS
+        K_t -= tau * q * r * (ADVECTION - ADVECTION.T)
+        K_t += tau * r * r / h * STIFFNESS
+
+        if f is not None:
+            F_t -= tau[:, :, 0] * f * (q * h[:, :, 0] * LOAD - r * GRADIENT)
+
+        return K_t, F_t
+
+    def load_functions(self, quad, coefficients):
+        #
+        # Discussion:
+        #
+        #   Adds to the Galerkin test functions the f(x) part of the
+        #   stabilization term, which moves to the RHS with a minus sign:
+        #      - tau * Ladj(W)
+        #   with Ladj(W) = q * W - r * dW/dx - p * d2W/dx2.
+        #
+
+        dxi_dx = quad.dxi_dx[:, None]
+        w_tau = quad.w * self.tauField(quad.x.shape[1])
+
+        test = Model.load_functions(self, quad, coefficients)
+        test.append((- w_tau * coefficients.q, quad.basis))
+        test.append((w_tau * coefficients.r * dxi_dx, quad.basis_xi))
+
+        if quad.basis.shape[1] > 2:
+
+            # Second order derivatives of the basis functions.
+            test.append((w_tau * coefficients.p * dxi_dx**2, quad.basis_xixi))
+
+        return test
+
+    def element_arrays_loop(self):
+        #
+        # Discussion:
+        #
+        #   Reference implementation of the stabilized element arrays.
+        #   The Galerkin terms are built first and the stabilization
+        #   terms are added in a second loop.
+        #
+
+        K_e, F_e = Model.element_arrays_loop(self)
+
+        # Compute time-scale parameter at every quadrature point
+        self.tauField()
 
         # Set Quadrature rule
         quad_rule = QuadratureRule( self.num_quad_points )
 
+        # The coefficients are called on one point at a time.
+        p, q, r, source = (as_function(c) for c in (self.p, self.q, self.r, self.f))
+
         # Loop over elements.
 
-        for element in self.mesh.elements:
+        for element in self.elements():
 
             e = element.index
 
@@ -61,20 +284,23 @@ class VMSModel(Model):
                         basis_j = element.basis_function(x=x, local_node=j)
                         basis_i_x = element.basis_gradient(x=x, local_node=i)
                         basis_j_x = element.basis_gradient(x=x, local_node=j)
+                        basis_i_xx = element.basis_hessian(x=x, local_node=i)
+                        basis_j_xx = element.basis_hessian(x=x, local_node=j)
 
                         # Compute time-scale parameter
-                        tau = self.computeTau(element,x)
+                        tau = self.tau[self.num_quad_points][e, k]
 
                         # Compute the LHS contribution of the integral of the stabilization term:
                         #    tau * Residual(u) * Ladj(W).
                         # with:
                         #    Ladj(w) = -d/dx ( p(x) dw/dx ) + q(x) * u - r(x) * du/dx   
                         #    Residual(u) = f(x) - [ -d/dx ( p(x) du/dx ) + q(x) * u + r(x) * du/dx  ]
-                        # Note that for linear elements the second order derivatives are zero
-                        Ladj = self.q(x) * basis_i - self.r(x) * basis_i_x
-                        Residual = - ( self.q(x) * basis_j + self.r(x) * basis_j_x )
+                        # Note that for linear elements the second order derivatives are zero,
+                        # and that the derivative of p is neglected.
+                        Ladj = q(x) * basis_i - r(x) * basis_i_x - p(x) * basis_i_xx
+                        Residual = - ( q(x) * basis_j + r(x) * basis_j_x - p(x) * basis_j_xx )
                         f = Ladj * tau * Residual
-                        self.K[e+i, e+j] += w * f
+                        K_e[e, i, j] += w * f
 
 
             for i in range(element.num_nodes):
@@ -92,17 +318,22 @@ class VMSModel(Model):
 
                     basis_i = element.basis_function(x=x, local_node=i)
                     basis_i_x = element.basis_gradient(x=x, local_node=i)
+                    basis_i_xx = element.basis_hessian(x=x, local_node=i)
 
                     # Compute time-scale parameter
-                    tau = self.computeTau(element,x)
+                    tau = self.tau[self.num_quad_points][e, k]
 
-                    # Compute the LHS contribution of the integral of the stabilization term:
+                    # Compute the RHS contribution of the integral of the stabilization term:
                     #    tau * Residual(u) * Ladj(W).
                     # with:
                     #    Ladj(w) = -d/dx ( p(x) dw/dx ) + q(x) * u - r(x) * du/dx   
                     #    Residual(u) = f(x) - [ -d/dx ( p(x) du/dx ) + q(x) * u + r(x) * du/dx  ]
-                    # Note that for linear elements the second order derivatives are zero
-                    Ladj = self.q(x) * basis_i - self.r(x) * basis_i_x
-                    Residual = self.f(x)
+                    # The f(x) part of the residual moves to the RHS with a minus sign.
+                    # Note that for linear elements the second order derivatives are zero,
+                    # and that the derivative of p is neglected.
+                    Ladj = q(x) * basis_i - r(x) * basis_i_x - p(x) * basis_i_xx
+                    Residual = source(x)
                     f = Ladj * tau * Residual
-                    self.F[e+i] += w * f
+                    F_e[e, i] -= w * f
+
+        return K_e, F_e
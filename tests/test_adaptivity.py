@@ -0,0 +1,74 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.adaptivity import AdaptiveSolver
+
+
+def test_interpolate_at():
+    mesh = Mesh.non_uniform_grid(0, 1, 5, 1.3)
+    x = np.linspace(0, 1, 17)
+
+    for order in (1, 3):
+        model = Model(mesh, 1.0, 0.0, 0.0, 1.0, 1, 0.0, 0.0, 4, order)
+        model.u = mesh.dof_coordinates(order)**order
+        assert np.allclose(model.interpolate_at(x), x**order)
+
+
+def test_adaptive_refinement():
+    nu = 1e-5
+    exact = 0.5 - nu * (1.0 - np.exp(-1.0 / nu)) / (1.0 - np.exp(-1.0 / nu))
+
+    solver = AdaptiveSolver(Mesh.uniform_grid(0, 1, 10), nu, 0.0, 1.0, 1.0,
+                            1, 0.0, 0.0, 1.0, tolerance=1e-7)
+    history = solver.solve()
+
+    assert history[-1].indicator_sum <= 1e-7
+    assert abs(exact - solver.qoi.value) < 1e-7
+    # A uniform mesh needs more than 10^5 elements for this accuracy.
+    assert solver.mesh.num_elements < 100
+    # The refined elements are in the boundary layer.
+    assert solver.mesh.h.min() < 1e-5
+    assert np.isclose(solver.mesh.h.max(), 0.1)
+
+
+def test_dof_budget():
+    solver = AdaptiveSolver(Mesh.uniform_grid(0, 1, 10), 1e-5, 0.0, 1.0, 1.0,
+                            1, 0.0, 0.0, 1.0, tolerance=0.0, max_dofs=30)
+    history = solver.solve()
+
+    assert history[-1].num_dofs <= 30
+    assert history[-1].refined == 0
+
+
+def test_multigrid_warm_start():
+    nu = 0.1
+    solver = AdaptiveSolver(Mesh.uniform_grid(0, 1, 8), nu, 0.0, 1.0, 1.0,
+                            1, 0.0, 0.0, 1.0, tolerance=0.0, max_iterations=6,
+                            solver="multigrid")
+    solver.solve()
+    mesh = solver.model.mesh
+
+    # From the solution on the previous mesh multigrid needs fewer
+    # V-cycles than from zero, for the same solution.
+    cold = VMSModel(mesh, nu, 0.0, 1.0, 1.0, 1, 0.0, 0.0, solver="multigrid")
+    cold.solve()
+    direct = VMSModel(mesh, nu, 0.0, 1.0, 1.0, 1, 0.0, 0.0)
+    direct.solve()
+
+    assert solver.model.solver_info.iterations < cold.solver_info.iterations
+    assert np.allclose(solver.model.u, direct.u, atol=1e-8)
+
+
+def main():
+    test_interpolate_at()
+    test_adaptive_refinement()
+    test_dof_budget()
+    test_multigrid_warm_start()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import sys
+import math
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+
+
+def p(x):
+    return 1 + x * x
+
+
+def q(x):
+    return np.sin(x)
+
+
+def r(x):
+    x = np.asarray(x)
+    return 3 * np.ones_like(x)
+
+
+def f(x):
+    return x
+
+
+def test_vectorized_matches_loop():
+    mesh = Mesh.non_uniform_grid(0, 1, 15, 1.1)
+
+    vectorized = Model(mesh, p, q, r, f, 1, 0.0, 1.0, 3)
+    loop = Model(mesh, p, q, r, f, 1, 0.0, 1.0, 3, assembly="loop",
+        storage="dense")
+
+    vectorized.solve()
+    loop.solve()
+
+    assert np.allclose(vectorized.K.to_dense(), loop.K, rtol=1e-12, atol=1e-12)
+    assert np.allclose(vectorized.F, loop.F, rtol=1e-12, atol=1e-14)
+    assert np.allclose(vectorized.u, loop.u, rtol=1e-12, atol=1e-14)
+
+
+def test_fused_vms_matches_loop():
+    mesh = Mesh.non_uniform_grid(0, 1, 15, 1.1)
+
+    fused = VMSModel(mesh, p, q, r, f, 1, 0.0, 1.0, 3)
+    loop = VMSModel(mesh, p, q, r, f, 1, 0.0, 1.0, 3, assembly="loop",
+        storage="dense")
+
+    fused.solve()
+    loop.solve()
+
+    assert np.allclose(fused.K.to_dense(), loop.K, rtol=1e-12, atol=1e-12)
+    assert np.allclose(fused.F, loop.F, rtol=1e-12, atol=1e-14)
+
+
+def test_vms_load_sign():
+    # The f(x) part of the stabilization term moves to the right-hand side
+    # with a minus sign. With the wrong sign VMS loses its nodal
+    # exactness on graded meshes, by about 0.15 here; on uniform meshes
+    # the error cancels between neighbouring elements.
+    nu = 1e-2
+    mesh = Mesh.non_uniform_grid(0, 1, 20, 1.2)
+    x = mesh.x
+    u_exact = x - np.expm1(x / nu) / np.expm1(1.0 / nu)
+
+    def constant(value):
+        return lambda x: value + 0 * x
+
+    coefficients = (constant(nu), constant(0.0), constant(1.0), constant(1.0))
+    models = [
+        VMSModel(mesh, nu, 0.0, 1.0, 1.0, 1, 0.0, 0.0),
+        VMSModel(mesh, *coefficients, bc_type=1, bc_left=0.0, bc_right=0.0),
+        VMSModel(mesh, *coefficients, bc_type=1, bc_left=0.0, bc_right=0.0,
+                 assembly="loop", storage="dense"),
+    ]
+
+    for model in models:
+        model.solve()
+        assert np.allclose(model.u, u_exact, rtol=0, atol=1e-13)
+
+
+def test_scalar_coefficients():
+    # Coefficients written for scalars only, e.g. with math.sin.
+    mesh = Mesh.non_uniform_grid(0, 1, 15, 1.1)
+
+    def p_scalar(x):
+        return 1 + math.sin(x)
+
+    for model_class in (Model, VMSModel):
+        loop = model_class(mesh, p_scalar, q, r, math.cos, 1, 0.0, 1.0, 3,
+                           assembly="loop", storage="dense")
+        vectorized = model_class(mesh, p_scalar, q, r, math.cos, 1, 0.0, 1.0, 3)
+        reference = model_class(mesh, lambda x: 1 + np.sin(x), q, r, np.cos,
+                                1, 0.0, 1.0, 3)
+
+        loop.solve()
+        vectorized.solve()
+        reference.solve()
+
+        assert np.allclose(loop.u, reference.u, rtol=1e-12, atol=1e-14)
+        assert np.allclose(vectorized.u, reference.u, rtol=1e-12, atol=1e-14)
+
+
+def test_coefficient_errors_propagate():
+    # Only scalar-only coefficients are retried point by point; an error
+    # that also occurs on a single point is raised as it is.
+    mesh = Mesh.uniform_grid(0, 1, 10)
+
+    def p_broken(x):
+        raise ValueError("broken coefficient")
+
+    def p_domain(x):
+        return math.log(x - 0.5)
+
+    for p_bad, message in ((p_broken, "broken coefficient"), (p_domain, "domain")):
+        model = Model(mesh, p_bad, q, r, f, 1, 0.0, 1.0)
+        try:
+            model.solve()
+        except ValueError as error:
+            assert message in str(error)
+        else:
+            assert False
+
+
+def test_banded_matches_dense():
+    mesh = Mesh.uniform_grid(0, 1, 20)
+
+    for bc_type in (1, 2, 3):
+        banded = VMSModel(mesh, p, q, r, f, bc_type, 0.5, 1.0)
+        dense = VMSModel(mesh, p, q, r, f, bc_type, 0.5, 1.0, storage="dense")
+
+        banded.solve()
+        dense.solve()
+
+        assert np.allclose(banded.K.to_dense(), dense.K)
+        assert np.allclose(banded.u, dense.u, rtol=1e-12, atol=1e-14)
+
+
+def main():
+    test_vectorized_matches_loop()
+    test_fused_vms_matches_loop()
+    test_vms_load_sign()
+    test_scalar_coefficients()
+    test_coefficient_errors_propagate()
+    test_banded_matches_dense()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
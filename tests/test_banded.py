@@ -0,0 +1,84 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.banded import BandedMatrix
+
+
+def random_banded(size, lower, upper, seed=0):
+    rng = np.random.RandomState(seed)
+    matrix = BandedMatrix(size, lower, upper)
+
+    for i in range(size):
+        for j in range(max(0, i - lower), min(size, i + upper + 1)):
+            matrix.data[i, lower + j - i] = rng.rand() + (4.0 if i == j else 0.0)
+
+    return matrix
+
+
+def test_dot_and_solve():
+    for size, lower, upper in ((1, 0, 0), (12, 1, 1), (30, 2, 3), (25, 3, 1)):
+        matrix = random_banded(size, lower, upper)
+        dense = matrix.to_dense()
+        b = np.arange(size * 2, dtype=float).reshape(size, 2)
+
+        assert np.allclose(matrix.dot(b[:, 0]), dense.dot(b[:, 0]))
+        assert np.allclose(matrix.dot(b), dense.dot(b))
+        assert np.allclose(matrix.solve(b[:, 0]), np.linalg.solve(dense, b[:, 0]))
+        assert np.allclose(matrix.factorize().solve(b), np.linalg.solve(dense, b))
+
+
+def test_block_solve():
+    # Wide blocks are swept row by row instead of column by column.
+    for size, lower, upper in ((12, 1, 1), (30, 2, 3), (25, 3, 1)):
+        matrix = random_banded(size, lower, upper)
+        dense = matrix.to_dense()
+        b = np.random.RandomState(1).rand(size, 40)
+
+        assert np.allclose(matrix.factorize().solve(b), np.linalg.solve(dense, b))
+
+
+def test_strided_element_matrices():
+    # Elements with 3 nodes numbered 2*e, 2*e + 1, 2*e + 2.
+    K_e = np.random.RandomState(2).rand(5, 3, 3)
+    dofs = 2 * np.arange(5)[:, None] + np.arange(3)[None, :]
+
+    strided = BandedMatrix(11, 2, 2)
+    strided.add_element_matrices_strided(K_e, 2)
+    indexed = BandedMatrix(11, 2, 2)
+    indexed.add_element_matrices(K_e, dofs)
+
+    assert np.array_equal(strided.data, indexed.data)
+
+
+def test_corners():
+    # A cyclic matrix: entries in the corners, outside the band.
+    for size, lower, upper in ((12, 1, 1), (30, 2, 2)):
+        matrix = random_banded(size, lower, upper)
+        matrix.add_entry(0, size - 1, 0.5)
+        matrix.add_entry(0, size - 2, 0.25)
+        matrix.add_entry(size - 1, 0, -1.0)
+        matrix.add_entry(1, 1, 1.0)
+
+        dense = matrix.to_dense()
+        assert dense[0, size - 1] == 0.5 and dense[size - 1, 0] == -1.0
+        assert len(matrix.corners) == 3
+
+        b = np.random.RandomState(3).rand(size, 2)
+        assert np.allclose(matrix.dot(b), dense.dot(b))
+        assert np.allclose(matrix.solve(b[:, 0]), np.linalg.solve(dense, b[:, 0]))
+        assert np.allclose(matrix.factorize().solve(b), np.linalg.solve(dense, b))
+
+        matrix.set_identity_row(size - 1)
+        assert len(matrix.corners) == 2
+
+
+def main():
+    test_dot_and_solve()
+    test_block_solve()
+    test_strided_element_matrices()
+    test_corners()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
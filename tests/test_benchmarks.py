@@ -0,0 +1,59 @@
+import os
+import sys
+sys.path.insert(0, "..")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+from benchmark import run, compare, new_model, uncached, CASES
+from fem1d.model import Model
+
+
+def test_run():
+    results = run(sizes=[10, 20], orders=[1, 2], repeat=1, output=None)
+
+    # The meshes only run for the first order.
+    assert len(results) == 2 * 2 + (len(CASES) - 2) * 2 * 2
+    for result in results:
+        assert result["time"] > 0.0
+        assert result["peak_memory"] > 0
+        assert result["num_dofs"] == result["num_elements"] * result["order"] + 1
+
+
+def test_uncached():
+    # Every timed call evaluates the coefficients again.
+    model = new_model(Model, 10, 1)
+    field = model.mesh.coefficient_field
+    assemble = uncached(model.assemble, model.mesh)
+
+    assemble()
+    misses = field.misses
+    assemble()
+    assert field.misses == 2 * misses
+    assert field.hits == 0
+
+
+def test_compare():
+    def result(case, time, memory):
+        return {"case": case, "num_elements": 100, "order": 1,
+                "time": time, "peak_memory": memory}
+
+    base = {"results": [result("a", 1.0, 100), result("b", 1.0, 100),
+                        result("c", 1.0, 100), result("d", 1e-4, 100),
+                        result("e", 1.0, 100)]}
+    new = {"results": [result("a", 1.05, 100), result("b", 1.5, 100),
+                       result("c", 0.5, 100), result("d", 2e-4, 100),
+                       result("e", 1.0, 200), result("f", 1.0, 100)]}
+
+    status = dict((row["case"], row["status"]) for row in compare(base, new, 0.1))
+
+    assert status == {"a": "ok", "b": "regression", "c": "improvement",
+                      "d": "ok", "e": "regression"}
+
+
+def main():
+    test_run()
+    test_uncached()
+    test_compare()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
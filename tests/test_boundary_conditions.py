@@ -0,0 +1,112 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.boundary import Dirichlet, Neumann, Robin, Periodic, from_bc_type
+from fem1d.coefficients import Nonlinear
+from fem1d.transient import TransientSolver
+
+K = 2 * np.pi
+
+
+def test_legacy_codes():
+    mesh = Mesh.non_uniform_grid(0, 1, 20, 1.1)
+
+    for code, pair in ((1, (Dirichlet(), Dirichlet())), (2, (Dirichlet(), Neumann())),
+                       (3, (Neumann(), Dirichlet())), (4, (Neumann(), Robin(0.0)))):
+        legacy = Model(mesh, 1.0, 1.0, 0.5, np.cos, code, 0.3, 0.7, 3, 2)
+        legacy.solve()
+        model = Model(mesh, 1.0, 1.0, 0.5, np.cos, pair, 0.3, 0.7, 3, 2)
+        model.solve()
+        assert np.allclose(model.u, legacy.u, rtol=0, atol=1e-13)
+
+    try:
+        from_bc_type(5)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_robin():
+    # -u'' = 0 with u' + alpha * u = g, solved by u = x.
+    mesh = Mesh.uniform_grid(0, 1, 10)
+
+    for storage in ("banded", "dense", "memmap"):
+        right = Model(mesh, 1.0, 0.0, 0.0, 0.0, (Dirichlet(), Robin(2.0)),
+                      0.0, 3.0, storage=storage)
+        right.solve()
+        assert np.allclose(right.u, mesh.x)
+
+        left = Model(mesh, 1.0, 0.0, 0.0, 0.0, (Robin(-2.0), Dirichlet()),
+                     1.0, 1.0, storage=storage)
+        left.solve()
+        assert np.allclose(left.u, mesh.x)
+
+
+def test_periodic():
+    # -p u'' + r u' + q u = f, solved by u = sin(2 pi x).
+    p, q, r = 1e-2, 1.0, 1.0
+
+    def f(x):
+        return (p * K**2 + q) * np.sin(K * x) + r * K * np.cos(K * x)
+
+    mesh = Mesh.non_uniform_grid(0, 1, 40, 1.02)
+
+    for model_class in (Model, VMSModel):
+        for order in (1, 3):
+            x = mesh.dof_coordinates(order)
+            dense = model_class(mesh, p, q, r, f, Periodic(), 0.0, 0.0,
+                                order + 2, order, storage="dense")
+            dense.solve()
+
+            for storage in ("banded", "memmap"):
+                model = model_class(mesh, p, q, r, f, Periodic(), 0.0, 0.0,
+                                    order + 2, order, storage=storage)
+                model.solve()
+
+                assert abs(model.u[0] - model.u[-1]) < 1e-14
+                assert np.allclose(model.u, dense.u, rtol=0, atol=1e-12)
+                assert np.max(np.abs(model.u - np.sin(K * x))) < 1e-2
+
+            # The cyclic factorization is reused for new sources.
+            u = model.solve_rhs([f, lambda x: 2 * f(x)])
+            assert np.allclose(u[:, 1], 2 * model.u)
+
+
+def test_periodic_nonlinear():
+    mesh = Mesh.uniform_grid(0, 1, 40)
+    model = Model(mesh, Nonlinear(lambda x, u, u_x: 1 + u * u), 1.0, 0.0,
+                  lambda x: 1 + np.sin(K * x), Periodic(), 0.0, 0.0, 3)
+    model.solve()
+
+    assert model.solver_info.converged
+    assert abs(model.u[0] - model.u[-1]) < 1e-12
+
+
+def test_periodic_transient():
+    # Advection of a sine wave once around the domain.
+    nu = 1e-3
+    mesh = Mesh.uniform_grid(0, 1, 200)
+    model = VMSModel(mesh, nu, 0.0, 1.0, 0.0, Periodic(), 0.0, 0.0, 3)
+    solver = TransientSolver(model, 0.0025, u0=lambda x: np.sin(K * x))
+    u = solver.run(400)
+
+    exact = np.exp(-nu * K**2) * np.sin(K * (mesh.x - 1.0))
+    assert np.max(np.abs(u - exact)) < 1e-3
+    assert solver.num_factorizations == 1
+
+
+def main():
+    test_legacy_codes()
+    test_robin()
+    test_periodic()
+    test_periodic_nonlinear()
+    test_periodic_transient()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.banded import BandedMatrix, OutOfCoreBandedLU, scratch_array
+
+
+def p(x):
+    return 1e-2 * (1 + x * x)
+
+
+def r(x):
+    return 1.0 + 0 * x
+
+
+def test_out_of_core_factorization():
+    for lower in (1, 2, 3):
+        size = 50
+        data = np.random.rand(size, 2 * lower + 1)
+        data[:, lower] += 2 * lower + 1
+        b = np.random.rand(size)
+
+        expected = BandedMatrix(size, lower, lower, data.copy()).factorize().solve(b)
+
+        band = scratch_array(data.shape)
+        band[:] = data
+        factorization = OutOfCoreBandedLU(BandedMatrix(size, lower, lower, band), 7)
+
+        # Same operations in the same order as BandedLU.
+        assert np.array_equal(factorization.solve(b), expected)
+        assert np.array_equal(factorization.solve(b, scratch_array(size)), expected)
+
+        columns = np.column_stack((b, 2 * b))
+        assert np.allclose(factorization.solve(columns)[:, 1], 2 * expected)
+
+
+def test_chunked_assembly_matches():
+    for mesh in (Mesh.uniform_grid(0, 1, 53),
+                 Mesh.non_uniform_grid(0, 1, 53, 1.02)):
+        for model_class in (Model, VMSModel):
+            for order in (1, 3):
+                for storage in ("banded", "dense"):
+                    whole = model_class(mesh, p, 0.5, r, np.sin, 1, 0.3, 0.7,
+                                        order + 1, order, storage=storage)
+                    whole.solve()
+
+                    # A chunk size that does not divide the elements.
+                    chunked = model_class(mesh, p, 0.5, r, np.sin, 1, 0.3, 0.7,
+                                          order + 1, order, storage=storage,
+                                          chunk_size=10)
+                    chunked.solve()
+
+                    assert np.allclose(chunked.u, whole.u, rtol=0, atol=1e-12)
+
+
+def test_memmap_storage():
+    mesh = Mesh.non_uniform_grid(0, 1, 200, 1.01)
+
+    for model_class in (Model, VMSModel):
+        for bc_type in (1, 2, 3):
+            banded = model_class(mesh, p, 0.5, r, np.sin, bc_type, 0.3, 0.7, 3, 2)
+            banded.solve()
+
+            model = model_class(mesh, p, 0.5, r, np.sin, bc_type, 0.3, 0.7, 3, 2,
+                                storage="memmap", chunk_size=16)
+            model.solve()
+
+            assert isinstance(model.K.data, np.memmap)
+            assert isinstance(model.u, np.memmap)
+            assert np.allclose(model.u, banded.u, rtol=0, atol=1e-12)
+
+
+def test_lazy_mesh():
+    mesh = Mesh.uniform_grid(0, 1, 10)
+    assert mesh._h is None and mesh._connectivity is None
+
+    assert np.allclose(mesh.h, 0.1)
+    assert mesh.connectivity.shape[0] == 10
+
+
+def main():
+    test_out_of_core_factorization()
+    test_chunked_assembly_matches()
+    test_memmap_storage()
+    test_lazy_mesh()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.qoi import QoI
+
+
+def p(x):
+    return 1e-2 * (1 + x)
+
+
+def test_field_hits_and_misses():
+    mesh = Mesh.uniform_grid(0, 1, 10)
+    field = mesh.coefficient_field
+    x = mesh.dof_coordinates()
+
+    value = field.evaluate("p", p, x, "nodes")
+    assert np.allclose(value, p(x))
+    assert field.evaluate("p", p, x, "nodes") is value
+    assert (field.hits, field.misses) == (1, 1)
+
+    # Another function under the same name replaces the value.
+    assert np.allclose(field.evaluate("p", np.cos, x, "nodes"), np.cos(x))
+    assert field.misses == 2
+
+    try:
+        value[0] = 0.0
+    except ValueError:
+        pass
+    else:
+        assert False
+
+    # New nodes clear the field.
+    mesh.x = np.linspace(0, 2, 11)
+    assert np.allclose(mesh.h, 0.2)
+    assert field.evaluate("p", np.cos, mesh.x, "nodes")[-1] == np.cos(2.0)
+    assert field.misses == 3
+
+
+def test_coefficients_evaluated_once():
+    mesh = Mesh.non_uniform_grid(0, 1, 20, 1.05)
+    model = VMSModel(mesh, p, 0.5, np.cos, np.sin, 1, 0.0, 0.0, 3, 2)
+    stats = model.instrument()
+    model.solve()
+
+    qoi = QoI(model, np.exp, np.sin, 3)
+    qoi.instrument()
+    qoi.compute()
+    qoi.error_estimator()
+
+    # Once at the quadrature points and once at the element ends.
+    assert stats.calls["p"] == 2
+    assert stats.calls["r"] == 2
+    assert "q" not in stats.calls
+    assert stats.calls["f"] == 1
+    assert stats.values["coefficient_misses"] == 4
+    assert mesh.coefficient_field.hits > 0
+
+    # The same results as with the coefficients evaluated every time.
+    reference = VMSModel(mesh, p, 0.5, np.cos, np.sin, 1, 0.0, 0.0, 3, 2,
+                         assembly="loop")
+    reference.solve()
+    assert np.allclose(model.u, reference.u)
+
+
+def test_models_share_field():
+    mesh = Mesh.uniform_grid(0, 1, 16)
+    galerkin = Model(mesh, p, 0.0, np.cos, np.sin, 1, 0.0, 0.0, 3)
+    vms = VMSModel(mesh, p, 0.0, np.cos, np.sin, 1, 0.0, 0.0, 3)
+
+    galerkin.assemble()
+    misses = mesh.coefficient_field.misses
+    vms.assemble()
+    assert mesh.coefficient_field.misses == misses
+
+
+def main():
+    test_field_hits_and_misses()
+    test_coefficients_evaluated_once()
+    test_models_share_field()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.coefficients import Constant, constant_value
+
+
+def as_function(value):
+    return lambda x: value + 0 * x
+
+
+def test_constant():
+    c = Constant(2)
+
+    assert c(0.5) == 2.0
+    assert np.array_equal(c(np.zeros(3)), [2.0, 2.0, 2.0])
+    assert constant_value(c) == 2.0
+    assert constant_value(3) == 3.0
+    assert constant_value(np.sin) is None
+
+
+def test_templates_match_quadrature():
+    for mesh in (Mesh.uniform_grid(0, 1, 8), Mesh.non_uniform_grid(0, 1, 8, 1.3)):
+        for model_class in (Model, VMSModel):
+            for f in (Constant(2.0), np.cos):
+                constant = model_class(mesh, 0.05, Constant(1.5), 2.0, f, 1, 0.0, 1.0)
+                reference = model_class(mesh, as_function(0.05), as_function(1.5),
+                                        as_function(2.0), f if f is np.cos else as_function(2.0),
+                                        1, 0.0, 1.0)
+
+                assert constant.constant_coefficients() is not None
+                assert reference.constant_coefficients() is None
+
+                K_c, F_c = constant.element_arrays()
+                K_r, F_r = reference.element_arrays()
+
+                assert np.allclose(K_c, K_r, rtol=1e-13, atol=1e-13)
+                assert np.allclose(F_c, F_r, rtol=1e-13, atol=1e-13)
+
+
+def test_closed_form_only_when_exact():
+    mesh = Mesh.uniform_grid(0, 1, 4)
+
+    # Quadrature with one point is not exact for the mass matrix, and the
+    # templates only cover linear elements.
+    assert Model(mesh, 1.0, 1.0, 1.0, 1.0, 1, 0.0, 0.0, 1).constant_coefficients() is None
+    assert Model(mesh, 1.0, 1.0, 1.0, 1.0, 1, 0.0, 0.0, 3, 2).constant_coefficients() is None
+
+
+def main():
+    test_constant()
+    test_templates_match_quadrature()
+    test_closed_form_only_when_exact()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.convergence import ConvergenceStudy, observed_rates, fit_rate, richardson
+
+
+# -u'' = pi^2 sin(pi x) on [0, 1], u(0) = u(1) = 0.
+def f(x):
+    return np.pi**2 * np.sin(np.pi * x)
+
+
+def u_exact(x):
+    return np.sin(np.pi * x)
+
+
+def du_exact(x):
+    return np.pi * np.cos(np.pi * x)
+
+
+def qFunc(x):
+    return x
+
+
+def study(order, workers=None):
+    model = Model(Mesh.uniform_grid(0, 1, 4), 1.0, 0.0, 0.0, f, 1, 0.0, 0.0,
+                  order + 1, order)
+    return ConvergenceStudy(model, u_exact, du_exact, qFunc, num_refinements=4,
+                            workers=workers)
+
+
+def test_rates():
+    assert observed_rates([1.0, 0.5, 0.25], [1.0, 0.25, 0.0625])[1:] == [2.0, 2.0]
+    assert observed_rates([1.0, 0.5], [1.0, 0.0]) == [None, None]
+    assert abs(fit_rate([1.0, 0.5, 0.25], [3.0, 0.375, 0.046875]) - 3.0) < 1e-12
+
+    h = [0.1 / 2**k for k in range(4)]
+    values = [1.0 + 2.0 * size**2 for size in h]
+    extrapolated, orders = richardson(values, h)
+    assert extrapolated[:2] == [None, None]
+    assert abs(orders[-1] - 2.0) < 1e-8
+    assert abs(extrapolated[-1] - 1.0) < 1e-12
+    assert abs(richardson(values, h, 2)[0][1] - 1.0) < 1e-12
+
+
+def test_convergence_study():
+    for order in (1, 2):
+        convergence = study(order)
+        levels = convergence.run()
+
+        assert [level.num_elements for level in levels] == [4, 8, 16, 32, 64]
+        assert abs(convergence.fitted_rate("l2") - (order + 1)) < 0.1
+        assert abs(convergence.rates("h1")[-1] - order) < 0.05
+
+        # Nodal values from the finest level.
+        model = Model(Mesh.uniform_grid(0, 1, 8), 1.0, 0.0, 0.0, f, 1,
+                      0.0, 0.0, order + 1, order)
+        model.solve()
+        x = model.mesh.dof_coordinates(order)
+        assert np.isclose(levels[1].nodal, np.max(np.abs(model.u - u_exact(x))))
+
+        # The extrapolated QoI is closer than the QoI of its level.
+        extrapolated = convergence.extrapolated_qoi()[0][2]
+        assert abs(extrapolated - 1.0 / np.pi) < 0.1 * levels[2].qoi_error
+
+        table = convergence.table().splitlines()
+        assert len(table) == len(levels) + 2
+        assert table[-1].startswith("Fitted rates: l2")
+
+
+def test_parallel_study():
+    serial = study(2).run()
+    parallel = study(2, workers=2).run()
+
+    for a, b in zip(serial, parallel):
+        assert a._replace(time=0) == b._replace(time=0)
+
+
+def main():
+    test_rates()
+    test_convergence_study()
+    test_parallel_study()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import sys
+import math
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.element_2 import Element
+
+
+def p(x):
+    return 1 + x * x
+
+
+def q(x):
+    return 1 + np.sin(x)
+
+
+def r(x):
+    return 2 + x
+
+
+def f(x):
+    return np.cos(3 * x)
+
+
+def test_element_basis():
+    element = Element(0, 3, 0.2, 0.8)
+    x = np.linspace(0.2, 0.8, 11)
+
+    assert np.allclose(sum(element.basis_function(x, i) for i in range(4)), 1.0)
+    assert np.allclose(sum(element.basis_gradient(x, i) for i in range(4)), 0.0)
+    assert np.allclose([element.basis_function(element.x_at_node, i)
+                        for i in range(4)], np.eye(4))
+
+
+def test_vectorized_matches_loop():
+    mesh = Mesh.non_uniform_grid(0, 1, 6, 1.1)
+
+    for model_class in (Model, VMSModel):
+        for order in (2, 3):
+            vectorized = model_class(mesh, p, q, r, f, 1, 0.0, 1.0, order + 2, order)
+            loop = model_class(mesh, p, q, r, f, 1, 0.0, 1.0, order + 2, order,
+                               assembly="loop", storage="dense")
+
+            vectorized.solve()
+            loop.solve()
+
+            assert vectorized.K.lower == vectorized.K.upper == order
+            assert np.allclose(vectorized.K.to_dense(), loop.K, rtol=1e-11, atol=1e-11)
+            assert np.allclose(vectorized.F, loop.F, rtol=1e-12, atol=1e-14)
+            assert np.allclose(vectorized.u, loop.u, rtol=1e-10, atol=1e-12)
+
+
+def test_convergence_rate():
+
+    def source(x):
+        return math.pi * np.cos(math.pi * x) + math.pi**2 * np.sin(math.pi * x)
+
+    for order in (1, 2, 4):
+        errors = []
+
+        for num_elements in (4, 8):
+            mesh = Mesh.uniform_grid(0, 1, num_elements)
+            model = Model(mesh, 1.0, 0.0, 1.0, source, 1, 0.0, 0.0,
+                          order + 1, order)
+            model.solve()
+
+            x = mesh.dof_coordinates(order)
+            assert model.u.shape == x.shape
+            errors.append(np.abs(model.u - np.sin(math.pi * x)).max())
+
+        assert math.log(errors[0] / errors[1], 2) > order + 0.8
+
+
+def main():
+    test_element_basis()
+    test_vectorized_matches_loop()
+    test_convergence_rate()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import subprocess
+
+# Largest time, in seconds, to import the numerical modules of fem1d
+# after NumPy, in a fresh interpreter.
+IMPORT_BUDGET = 0.5
+
+MODULES = ("fem1d.mesh", "fem1d.model", "fem1d.vms_model", "fem1d.qoi",
+           "fem1d.utils", "fem1d.quadrature_rule", "fem1d.plotting")
+
+SCRIPT = """
+import sys
+import time
+import numpy
+start = time.perf_counter()
+import {}
+print(time.perf_counter() - start)
+print(sorted(name for name in sys.modules if name.split(".")[0] == "matplotlib"))
+""".format(", ".join(MODULES))
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def import_modules():
+    output = subprocess.check_output([sys.executable, "-c", SCRIPT], cwd=ROOT)
+    seconds, modules = output.decode().strip().splitlines()
+    return float(seconds), modules
+
+
+def test_no_matplotlib():
+    seconds, modules = import_modules()
+    assert modules == "[]"
+
+
+def test_import_time():
+    # Best of three runs, the first may read the files from disk.
+    seconds = min(import_modules()[0] for run in range(3))
+    assert seconds < IMPORT_BUDGET, \
+        "fem1d imports in {:.3f} s, the budget is {} s".format(seconds, IMPORT_BUDGET)
+
+
+def main():
+    test_no_matplotlib()
+    test_import_time()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.qoi import QoI
+from fem1d.coefficients import Constant, Nonlinear
+from fem1d.instrumentation import Stats, CountedFunction
+
+
+def p(x):
+    return 0.1 + x
+
+
+def test_model_stats():
+    mesh = Mesh.uniform_grid(0, 1, 50)
+
+    for model_class in (Model, VMSModel):
+        reference = model_class(mesh, p, 1.0, Constant(2.0), np.sin, 1, 0.0, 1.0)
+        reference.solve()
+
+        records = []
+        model = model_class(mesh, p, 1.0, Constant(2.0), np.sin, 1, 0.0, 1.0)
+        stats = model.instrument(sink=records.append)
+        model.solve()
+
+        assert np.array_equal(model.u, reference.u)
+        assert model.stats is stats
+
+        for name in ("assemble", "boundary_conditions", "factorize",
+                     "linear_solve", "coefficients"):
+            assert stats.phases[name] >= 0.0
+        assert stats.phases["assemble"] >= stats.phases["element_arrays"]
+
+        # Constants are never called, so they are not wrapped.
+        assert stats.calls["p"] >= 1 and stats.calls["f"] >= 1
+        assert "q" not in stats.calls and "r" not in stats.calls
+        assert isinstance(model.r, Constant)
+
+        assert stats.values["matrix_size"] == 51
+        assert stats.values["matrix_nnz"] == 3 * 51 - 2 - 2
+        assert stats.values["residual"] < 1e-12
+
+        assert len(records) == sum(stats.phase_counts.values()) + \
+            sum(stats.calls.values()) + len(stats.values)
+
+        model.uninstrument()
+        assert model.p is p and model.stats is None
+
+
+def test_qoi_shares_model_stats():
+    model = VMSModel(Mesh.uniform_grid(0, 1, 20), p, 0.0, 1.0, 1.0, 1, 0.0, 0.0)
+    stats = model.instrument()
+    model.solve()
+
+    qoi = QoI(model, lambda x: np.ones_like(x), lambda x: 0 * x, 4)
+    assert qoi.instrument() is stats
+
+    qoi.compute()
+    qoi.error_estimator()
+
+    assert stats.phase_counts["qoi_compute"] == 1
+    assert stats.phase_counts["qoi_error_estimator"] == 1
+    # The values at the quadrature points are shared by compute() and
+    # error_estimator(), the element ends need one more call.
+    assert stats.calls["qFunc"] == 2
+    assert stats.calls["u_exact"] == 1
+    assert "qFunc" in str(stats)
+
+
+def test_nonlinear_stats():
+    r = Nonlinear(lambda x, u, u_x: u, du=lambda x, u, u_x: 1.0)
+    model = Model(Mesh.uniform_grid(0, 1, 20), 0.1, 0.0, r, 1.0, 1, 0.0, 0.0)
+    stats = model.instrument()
+    model.solve()
+
+    assert isinstance(model.r, Nonlinear)
+    assert isinstance(model.r.function, CountedFunction)
+    assert stats.calls["r_du"] == stats.values["jacobian_updates"]
+    assert stats.values["iterations"] == model.solver_info.iterations
+
+    model.uninstrument()
+    assert not isinstance(model.r.function, CountedFunction)
+
+
+def test_disabled_by_default():
+    model = Model(Mesh.uniform_grid(0, 1, 5), p, 0.0, 0.0, 1.0, 1, 0.0, 0.0)
+    model.solve()
+
+    assert model.stats is None
+    assert model.p is p
+
+    stats = Stats()
+    with stats.phase("a"):
+        pass
+    stats.reset()
+    assert stats.as_dict()["phases"] == {}
+
+
+def main():
+    test_model_stats()
+    test_qoi_shares_model_stats()
+    test_nonlinear_stats()
+    test_disabled_by_default()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
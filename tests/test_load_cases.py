@@ -0,0 +1,61 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+
+
+def p(x):
+    return 1 + x * x
+
+
+def r(x):
+    return 20 + x
+
+
+def test_solve_rhs_matches_solve():
+    mesh = Mesh.non_uniform_grid(0, 1, 9, 1.1)
+    sources = [np.cos, lambda x: x**2, 3.0]
+    bc_left = np.array([0.0, 1.0, -2.0])
+
+    for model_class in (Model, VMSModel):
+        for order in (1, 3):
+            for storage in ("banded", "dense"):
+                model = model_class(mesh, p, 1.0, r, np.sin, 2, 0.5, 0.2,
+                                    order + 1, order, storage=storage)
+                model.solve()
+                factorization = model.factorization
+
+                assert np.allclose(model.solve_rhs(), model.u)
+
+                block = model.solve_rhs(sources, bc_left=bc_left)
+                assert block.shape == (len(model.u), 3)
+                assert model.factorization is factorization
+
+                for case in range(3):
+                    reference = model_class(mesh, p, 1.0, r, sources[case], 2,
+                                            bc_left[case], 0.2, order + 1,
+                                            order, storage=storage)
+                    reference.solve()
+                    assert np.allclose(block[:, case], reference.u)
+
+
+def test_factorize_on_demand():
+    mesh = Mesh.uniform_grid(0, 1, 10)
+    model = Model(mesh, 1.0, 0.0, 0.0, 2.0, 1, 0.0, 0.0)
+
+    u = model.solve_rhs(bc_right=[0.0, 1.0])
+
+    assert np.allclose(u[:, 0], mesh.x * (1 - mesh.x))
+    assert np.allclose(u[:, 1], mesh.x * (1 - mesh.x) + mesh.x)
+
+
+def main():
+    test_solve_rhs_matches_solve()
+    test_factorize_on_demand()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
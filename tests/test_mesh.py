@@ -0,0 +1,49 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+
+
+def test_arrays():
+    mesh = Mesh.non_uniform_grid(0, 2, 6, 1.2)
+
+    assert mesh.num_elements == 6
+    assert np.isclose(mesh.x[-1], 2.0)
+    assert np.allclose(mesh.h, np.diff(mesh.x))
+    assert np.array_equal(mesh.connectivity[:, 1], mesh.connectivity[:, 0] + 1)
+
+
+def test_lazy_elements():
+    mesh = Mesh.uniform_grid(0, 1, 4)
+
+    assert len(mesh.elements) == 4
+    assert [element.index for element in mesh.elements] == [0, 1, 2, 3]
+    assert mesh.elements[-1].x_right == 1.0
+    assert [element.index for element in mesh.elements[1:3]] == [1, 2]
+    assert np.isclose(mesh.elements[2].h, 0.25)
+
+
+def test_refine_and_coarsen():
+    mesh = Mesh.uniform_grid(0, 1, 4)
+
+    assert np.allclose(mesh.refine([1, 3]).x, [0, 0.25, 0.375, 0.5, 0.75, 0.875, 1])
+    assert np.allclose(mesh.refine(np.array([True, False, False, False])).x,
+                       [0, 0.125, 0.25, 0.5, 0.75, 1])
+
+    # At most two elements are merged into one.
+    assert np.allclose(mesh.coarsen(np.ones(4, dtype=bool)).x, [0, 0.5, 1])
+    assert np.allclose(mesh.coarsen([1, 2]).x, [0, 0.25, 0.75, 1])
+    assert np.allclose(mesh.coarsen([0, 3]).x, mesh.x)
+
+    assert np.array_equal(mesh.locate([0.0, 0.25, 0.3, 1.0, 1.2]), [0, 1, 1, 3, 3])
+
+
+def main():
+    test_arrays()
+    test_lazy_elements()
+    test_refine_and_coarsen()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import sys
+import warnings
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.multigrid import Transfer
+
+
+def p(x):
+    return 1e-2 * (1 + x * x)
+
+
+def test_transfer():
+    fine = Mesh.non_uniform_grid(0, 1, 16, 1.2)
+    coarse = Mesh(fine.x[::2])
+
+    for order in (1, 3):
+        transfer = Transfer(fine, coarse, order)
+
+        # Polynomials of the basis order are interpolated exactly.
+        u = transfer.prolong(coarse.dof_coordinates(order)**order)
+        assert np.allclose(u, fine.dof_coordinates(order)**order)
+
+        # The restriction is the transpose of the prolongation.
+        v = np.random.rand(coarse.num_dofs(order))
+        r = np.random.rand(fine.num_dofs(order))
+        assert np.isclose(np.dot(transfer.prolong(v), r),
+                          np.dot(v, transfer.restrict(r)))
+
+
+def test_multigrid_matches_direct_solve():
+    for mesh in (Mesh.uniform_grid(0, 1, 128),
+                 Mesh.non_uniform_grid(0, 1, 128, 1.02)):
+        for model_class in (Model, VMSModel):
+            for order in (1, 2):
+                direct = model_class(mesh, p, 1.0, 1.0, np.sin, 1, 0.5, 0.0,
+                                     order + 1, order)
+                direct.solve()
+
+                model = model_class(mesh, p, 1.0, 1.0, np.sin, 1, 0.5, 0.0,
+                                    order + 1, order, solver="multigrid")
+                model.solve()
+
+                assert model.solver_info.converged
+                assert model.factorization.num_levels == 4
+                assert np.allclose(model.u, direct.u, atol=1e-8)
+
+
+def test_multigrid_iterations_independent_of_mesh():
+    iterations = []
+
+    for num_elements in (64, 256, 1024):
+        model = VMSModel(Mesh.uniform_grid(0, 1, num_elements), 1.0, 0.0,
+                         1.0, 1.0, 1, 0.0, 0.0, solver="multigrid")
+        model.solve()
+
+        assert model.solver_info.converged
+        assert model.solver_info.convergence_rate < 0.2
+        iterations.append(model.solver_info.iterations)
+
+    assert max(iterations) - min(iterations) <= 2
+
+
+def test_multigrid_convection_dominated():
+    # A downstream sweep is exact for pure advection, so the nearly
+    # hyperbolic VMS problem needs very few cycles, in both directions.
+    for velocity in (1.0, -1.0):
+        model = VMSModel(Mesh.uniform_grid(0, 1, 256), 1e-6, 0.0, velocity,
+                         1.0, 1, 0.0, 0.0, solver="multigrid")
+        model.solve()
+
+        direct = VMSModel(Mesh.uniform_grid(0, 1, 256), 1e-6, 0.0, velocity,
+                          1.0, 1, 0.0, 0.0)
+        direct.solve()
+
+        assert model.solver_info.iterations <= 3
+        assert np.allclose(model.u, direct.u)
+
+
+def test_multigrid_divergence():
+    # Galerkin is unstable on the coarse levels of a convection-dominated
+    # problem, so the V-cycles diverge.
+    mesh = Mesh.uniform_grid(0, 1, 1024)
+    direct = Model(mesh, 1e-3, 0.0, 1.0, 1.0, 1, 0.0, 0.0)
+    direct.solve()
+
+    model = Model(mesh, 1e-3, 0.0, 1.0, 1.0, 1, 0.0, 0.0, solver="multigrid")
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        model.solve()
+
+    assert [w.category for w in caught] == [RuntimeWarning]
+    assert not model.solver_info.converged
+    assert np.allclose(model.u, direct.u)
+
+    model = Model(mesh, 1e-3, 0.0, 1.0, 1.0, 1, 0.0, 0.0, solver="multigrid",
+                  solver_options={"fallback": False})
+    try:
+        model.solve()
+    except RuntimeError:
+        pass
+    else:
+        assert False
+
+
+def main():
+    test_transfer()
+    test_multigrid_matches_direct_solve()
+    test_multigrid_iterations_independent_of_mesh()
+    test_multigrid_convection_dominated()
+    test_multigrid_divergence()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
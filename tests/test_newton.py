@@ -0,0 +1,131 @@
+import sys
+import warnings
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.coefficients import Nonlinear
+
+
+NU = 0.05
+
+
+def burgers_source(x):
+    # -nu u'' + u u' for u = sin(pi x).
+    return NU * np.pi**2 * np.sin(np.pi * x) + \
+        np.pi * np.sin(np.pi * x) * np.cos(np.pi * x)
+
+
+def test_linear_jacobian():
+    mesh = Mesh.non_uniform_grid(0, 1, 7, 1.2)
+
+    for order in (1, 3):
+        for bc_type in (1, 2, 3, 4):
+            model = Model(mesh, lambda x: 1 + x, 2.0, 3.0, np.cos, bc_type,
+                          0.5, -0.2, order + 1, order, storage="dense")
+            model.factorize()
+            K, F = model.K.copy(), model.F.copy()
+
+            u = np.random.RandomState(0).rand(len(F))
+            model.assemble_nonlinear(u, "newton")
+
+            assert np.allclose(model.K, K)
+            assert np.allclose(model.F, F - np.dot(K, u))
+
+
+def test_jacobian_matches_finite_differences():
+    mesh = Mesh.non_uniform_grid(0, 1, 6, 1.1)
+    p = Nonlinear(lambda x, u, u_x: 1 + u**2 + 0.1 * u_x**2)
+    r = Nonlinear(lambda x, u, u_x: u, du=lambda x, u, u_x: 1.0)
+    f = Nonlinear(lambda x, u, u_x: np.sin(x) * np.exp(-u))
+
+    model = Model(mesh, p, 1.0, r, f, 2, 0.3, 0.1, 4, 2, storage="dense")
+    u = np.random.RandomState(0).rand(mesh.num_dofs(2))
+
+    model.assemble_nonlinear(u, "newton")
+    J, R = model.K.copy(), -model.F.copy()
+
+    step = 1e-7
+    for j in range(len(u)):
+        v = u.copy()
+        v[j] += step
+        model.assemble_nonlinear(v)
+        assert np.allclose((-model.F - R) / step, J[:, j], atol=1e-5)
+
+
+def test_newton_burgers():
+    mesh = Mesh.uniform_grid(0, 1, 200)
+
+    for options in ({}, {"reuse_jacobian": False}, {"method": "picard"}):
+        model = Model(mesh, NU, 0.0, Nonlinear(lambda x, u, u_x: u),
+                      burgers_source, 1, 0.0, 0.0, 3, 2,
+                      nonlinear_options=options)
+        model.solve()
+        info = model.solver_info
+
+        assert info.converged
+        assert len(info.steps) == info.iterations
+        assert all(step.assembly_time >= 0.0 for step in info.steps)
+        assert np.allclose(model.u, np.sin(np.pi * mesh.dof_coordinates(2)),
+                           atol=1e-6)
+
+    # Newton reuses the Jacobian for some steps and converges faster than
+    # Picard, which needs a new operator every time.
+    newton = Model(mesh, NU, 0.0, Nonlinear(lambda x, u, u_x: u),
+                   burgers_source, 1, 0.0, 0.0, 3, 2)
+    newton.solve()
+
+    assert newton.solver_info.jacobian_updates < newton.solver_info.iterations
+    assert newton.solver_info.jacobian_updates < info.jacobian_updates
+
+
+def test_newton_not_converged():
+    mesh = Mesh.uniform_grid(0, 1, 50)
+    model = Model(mesh, NU, 0.0, Nonlinear(lambda x, u, u_x: u),
+                  burgers_source, 1, 0.0, 0.0, 3, 2,
+                  nonlinear_options={"max_iterations": 1})
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        model.solve()
+
+    assert not model.solver_info.converged
+    assert model.solver_info.iterations == 1
+    assert len(caught) == 1 and issubclass(caught[0].category, RuntimeWarning)
+    assert "Newton did not converge" in str(caught[0].message)
+
+
+def test_vms_nonlinear_not_supported():
+    advection = Nonlinear(lambda x, u, u_x: u)
+
+    try:
+        VMSModel(Mesh.uniform_grid(0, 1, 4), NU, 0.0, advection, 1.0, 1, 0.0, 0.0)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+    # Also when the coefficient is set after construction.
+    model = VMSModel(Mesh.uniform_grid(0, 1, 4), NU, 0.0, 1.0, 1.0, 1, 0.0, 0.0)
+    model.r = advection
+
+    try:
+        model.solve()
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def main():
+    test_linear_jacobian()
+    test_jacobian_matches_finite_differences()
+    test_newton_burgers()
+    test_newton_not_converged()
+    test_vms_nonlinear_not_supported()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import sys
+import multiprocessing
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d import parallel
+from fem1d.parallel import partitions
+
+
+def p(x):
+    return 1e-2 * (1 + np.sin(10 * x)**2)
+
+
+def r(x):
+    return 1.0 + 0 * x
+
+
+def test_partitions():
+    assert partitions(10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert partitions(8, 4) == [(0, 4), (4, 8)]
+
+
+def test_parallel_assembly_reproducible():
+    mesh = Mesh.non_uniform_grid(0, 1, 301, 1.005)
+
+    for model_class in (Model, VMSModel):
+        for order in (1, 2):
+            serial = model_class(mesh, p, 0.5, r, np.sin, 1, 0.3, 0.7,
+                                 order + 1, order)
+            serial.assemble()
+
+            results = []
+            for workers in (1, 2, 3):
+                model = model_class(mesh, p, 0.5, r, np.sin, 1, 0.3, 0.7,
+                                    order + 1, order, chunk_size=40,
+                                    workers=workers)
+                model.assemble()
+                results.append((model.K.data, model.F))
+
+                assert np.allclose(model.K.data, serial.K.data, rtol=1e-14, atol=0)
+                assert np.allclose(model.F, serial.F, rtol=1e-14, atol=0)
+
+            for K, F in results[1:]:
+                assert np.array_equal(K, results[0][0])
+                assert np.array_equal(F, results[0][1])
+
+
+def test_parallel_solve():
+    mesh = Mesh.uniform_grid(0, 1, 100)
+
+    serial = VMSModel(mesh, p, 0.0, r, np.sin, 2, 0.0, 1.0, 3, 2)
+    serial.solve()
+
+    for storage in ("banded", "memmap"):
+        model = VMSModel(mesh, p, 0.0, r, np.sin, 2, 0.0, 1.0, 3, 2,
+                         storage=storage, chunk_size=30, workers=2)
+        model.solve()
+        assert np.allclose(model.u, serial.u)
+
+
+def test_parallel_assembly_memmap():
+    mesh = Mesh.non_uniform_grid(0, 1, 301, 1.005)
+    banded = VMSModel(mesh, p, 0.5, r, np.sin, 1, 0.3, 0.7, 3, 2,
+                      chunk_size=40, workers=2)
+    banded.assemble()
+
+    # The workers write into the memory-mapped band, which is never
+    # allocated in shared memory.
+    shapes = []
+    original = parallel.SharedArray
+
+    class RecordingArray(original):
+        def __init__(self, shape, name=None):
+            shapes.append(tuple(shape))
+            original.__init__(self, shape, name)
+
+    parallel.SharedArray = RecordingArray
+    try:
+        model = VMSModel(mesh, p, 0.5, r, np.sin, 1, 0.3, 0.7, 3, 2,
+                         storage="memmap", chunk_size=40, workers=2)
+        model.assemble()
+    finally:
+        parallel.SharedArray = original
+
+    assert isinstance(model.K.data, np.memmap)
+    assert np.array_equal(model.K.data, banded.K.data)
+    assert np.array_equal(model.F, banded.F)
+    assert shapes and all(len(shape) == 3 for shape in shapes)
+
+    # The files of the memmap storage can only be shared by a fork.
+    if multiprocessing.get_start_method() == "fork":
+        multiprocessing.set_start_method("spawn", force=True)
+        try:
+            model.assemble()
+        except ValueError:
+            pass
+        else:
+            assert False
+        finally:
+            multiprocessing.set_start_method("fork", force=True)
+
+
+def test_parallel_assembly_dense():
+    model = Model(Mesh.uniform_grid(0, 1, 10), p, 0.0, r, np.sin, 1, 0.0, 0.0,
+                  2, 1, storage="dense", workers=2)
+    try:
+        model.assemble()
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def main():
+    test_partitions()
+    test_parallel_assembly_reproducible()
+    test_parallel_solve()
+    test_parallel_assembly_memmap()
+    test_parallel_assembly_dense()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel, stabilization_parameter
+from fem1d.qoi import QoI
+from fem1d.quadrature_rule import QuadratureRule
+
+
+def test_compute_matches_loop():
+    mesh = Mesh.non_uniform_grid(0, 1, 7, 1.2)
+    model = Model(mesh, 1.0, 0.0, 1.0, 1.0, 1, 0.0, 0.0, 3, 2)
+    model.u = np.cos(mesh.dof_coordinates(2))
+
+    qoi = QoI(model, np.exp, np.sin, 4)
+    qoi.compute()
+
+    value = 0.0
+    value_exact = 0.0
+    quad_rule = QuadratureRule(4)
+    for element in mesh.elements:
+        for k in range(4):
+            x = element.x_left + 0.5 * (1 + quad_rule.xi_q[k]) * element.h
+            w = quad_rule.w_q[k] * 0.5 * element.h
+            value += w * np.exp(x) * model.interpolate(element, k, 4)
+            value_exact += w * np.exp(x) * np.sin(x)
+
+    assert np.isclose(qoi.value, value, rtol=1e-13)
+    assert np.isclose(qoi.value_exact, value_exact, rtol=1e-13)
+
+
+def test_compute_polynomial():
+    # A quadratic solution is represented exactly by quadratic elements,
+    # so the QoI is exact up to quadrature.
+    mesh = Mesh.uniform_grid(0, 2, 5)
+    model = Model(mesh, 1.0, 0.0, 1.0, 1.0, 1, 0.0, 0.0, 3, 2)
+    model.u = mesh.dof_coordinates(2)**2
+
+    qoi = QoI(model, lambda x: x, 1.0, 3)
+    qoi.compute()
+
+    assert np.isclose(qoi.value, 4.0, rtol=1e-13)
+    assert np.isclose(qoi.value_exact, 2.0, rtol=1e-13)
+
+
+def test_error_estimator_contributions():
+    mesh = Mesh.non_uniform_grid(0, 1, 6, 1.1)
+    p = lambda x: 1 + x * x
+    r = lambda x: 2 + x
+    model = VMSModel(mesh, p, 1.0, r, np.cos, 1, 0.0, 0.0, 3, 2)
+    model.solve()
+
+    qoi = QoI(model, np.exp, np.sin, 4)
+    contributions = qoi.error_estimator()
+
+    assert contributions.residual.shape == contributions.jump.shape == (6,)
+    assert np.isclose(qoi.error_est_bound, contributions.jump.sum())
+    assert np.isclose(qoi.error_est,
+                      contributions.residual.sum() + contributions.jump.sum())
+
+    # Residual part of the first element, point by point.
+    quad_rule = QuadratureRule(4)
+    element = mesh.elements[0]
+    tau = qoi.tauField()
+    expected = 0.0
+    for k in range(4):
+        x = element.x_left + 0.5 * (1 + quad_rule.xi_q[k]) * element.h
+        w = quad_rule.w_q[k] * 0.5 * element.h
+        u = model.interpolate_field(4)[0, k]
+        du = model.interpolate_field(4, 1)[0, k]
+        d2u = model.interpolate_field(4, 2)[0, k]
+        residual = np.cos(x) - ( - p(x) * d2u + u + r(x) * du )
+        expected += w * np.exp(x) * tau[0, k] * residual
+
+    assert np.isclose(contributions.residual[0], expected, rtol=1e-12)
+
+
+def test_error_estimator_advection_diffusion():
+    # For linear elements and constant coefficients the VMS solution is
+    # nodally exact, the jumps cancel and the estimate is exact.
+    lam, nu = 1.0, 0.01
+    a = lam / nu
+    u_exact = lambda x: ( np.exp(a*(x-1.0)) - np.exp(-a) ) / (( np.exp(-a) - 1.0 ) * lam) + x/lam
+
+    mesh = Mesh.uniform_grid(0, 1, 20)
+    model = VMSModel(mesh, nu, 0.0, lam, 1.0, 1, 0.0, 0.0, 2)
+    model.solve()
+
+    qoi = QoI(model, 1.0, u_exact, 20)
+    qoi.compute()
+    contributions = qoi.error_estimator()
+
+    assert np.allclose(contributions.jump, 0.0, atol=1e-14)
+    assert np.isclose(qoi.error_est, qoi.value_exact - qoi.value, rtol=1e-8)
+
+
+def test_error_estimator_jump():
+    mesh = Mesh.non_uniform_grid(0, 1, 5, 1.3)
+    p = lambda x: 1 + x * x
+    r = lambda x: 2 + x
+    model = VMSModel(mesh, p, 0.0, r, np.cos, 1, 0.0, 0.0, 3, 2)
+    model.solve()
+
+    jumps = []
+    for num_quad_points in (3, 6):
+        qoi = QoI(model, np.exp, np.sin, num_quad_points)
+        jumps.append(qoi.error_estimator().jump)
+
+    # Taken once per element, not once per quadrature point.
+    assert np.allclose(jumps[0], jumps[1], rtol=1e-14, atol=0)
+
+    # Both ends of the last element, with their outward normals.
+    element = list(model.elements())[-1]
+    expected = 0.0
+    for x, normal in ((element.x_left, -1.0), (element.x_left + element.h, 1.0)):
+        grad_u = sum(element.basis_gradient(x=x, local_node=j) * model.u[element.index * 2 + j]
+                     for j in range(3))
+        tau = qoi.computeTau(element, x)
+        expected += 0.5 * np.exp(x) * tau / element.h * p(x) * grad_u * normal
+
+    assert np.isclose(jumps[1][-1], expected, rtol=1e-12)
+
+
+def test_error_estimator_time_step():
+    # In a transient solve tau is limited by the time step, also at the
+    # element ends of the jump term.
+    mesh = Mesh.non_uniform_grid(0, 1, 5, 1.3)
+    p = lambda x: 1e-2 * (1 + x)
+    r = lambda x: 1 + 0 * x
+    model = VMSModel(mesh, p, 0.0, r, np.cos, 1, 0.0, 0.0, 3, 2)
+    model.time_step = 0.05
+    model.solve()
+
+    qoi = QoI(model, np.exp, np.sin, 3)
+    jump = qoi.error_estimator().jump
+
+    element = list(model.elements())[-1]
+    expected = 0.0
+    for x, normal in ((element.x_left, -1.0), (element.x_left + element.h, 1.0)):
+        grad_u = sum(element.basis_gradient(x=x, local_node=j) * model.u[element.index * 2 + j]
+                     for j in range(3))
+        tau = model.computeTau(element, x)
+        expected += 0.5 * np.exp(x) * tau / element.h * p(x) * grad_u * normal
+
+    assert np.isclose(jump[-1], expected, rtol=1e-12)
+
+    # The steady tau is larger.
+    steady = stabilization_parameter(element.h / 2, p(element.x_left), 1.0)
+    assert model.computeTau(element, element.x_left) < 0.9 * steady
+
+
+def main():
+    test_compute_matches_loop()
+    test_compute_polynomial()
+    test_error_estimator_contributions()
+    test_error_estimator_advection_diffusion()
+    test_error_estimator_jump()
+    test_error_estimator_time_step()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import sys
+import pickle
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.quadrature_rule import QuadratureRule
+
+
+def test_rules_are_shared_and_read_only():
+    rule = QuadratureRule(5)
+
+    assert QuadratureRule(5) is rule
+    assert QuadratureRule(5, "lobatto") is not rule
+    assert pickle.loads(pickle.dumps(rule)) is rule
+    assert not rule.xi_q.flags.writeable
+
+    try:
+        rule.xi_q = np.zeros(5)
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("QuadratureRule should be read-only")
+
+
+def test_exactness():
+    for n in range(2, 9):
+        legendre = QuadratureRule(n)
+        lobatto = QuadratureRule(n, "lobatto")
+
+        assert np.isclose(lobatto.xi_q[0], -1.0) and np.isclose(lobatto.xi_q[-1], 1.0)
+
+        for degree in range(2 * n):
+            exact = (1.0 - (-1.0)**(degree + 1)) / (degree + 1)
+            assert np.isclose(np.dot(legendre.w_q, legendre.xi_q**degree), exact)
+            if degree <= 2 * n - 3:
+                assert np.isclose(np.dot(lobatto.w_q, lobatto.xi_q**degree), exact)
+
+
+def main():
+    test_rules_are_shared_and_read_only()
+    test_exactness()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
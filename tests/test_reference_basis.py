@@ -0,0 +1,33 @@
+import sys
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.element import LinearElement, reference_basis
+
+
+def test_matches_physical_basis():
+    element = LinearElement(0, 0.3, 0.8)
+    table = reference_basis(1, 3)
+    x = element.x_left + 0.5 * (1 + table.xi) * element.h
+
+    for i in range(element.num_nodes):
+        assert np.allclose(table.basis[:, i], element.basis_function(x, i))
+        assert np.allclose(table.basis_xi[:, i] * 2.0 / element.h,
+                           element.basis_gradient(x, i))
+
+
+def test_table_is_cached_and_read_only():
+    table = reference_basis(1, 4)
+
+    assert reference_basis(1, 4) is table
+    assert not table.basis.flags.writeable
+    assert not table.products["BB"].flags.writeable
+
+
+def main():
+    test_matches_physical_basis()
+    test_table_is_cached_and_read_only()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import sys
+import math
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.vms_model import stabilization_parameter, SMALL_PECLET
+
+
+def direct(h, p, r):
+    Pe = h * r / (2.0 * p)
+    return h / (2.0 * r) * (1.0 / math.tanh(Pe) - 1.0 / Pe)
+
+
+def test_matches_formula():
+    h, p = 0.1, 1.0
+
+    for Pe in (0.5, 3.0, 50.0):
+        r = 2.0 * p * Pe / h
+        assert np.isclose(stabilization_parameter(h, p, r), direct(h, p, r), rtol=1e-14)
+        assert np.isclose(stabilization_parameter(h, p, -r), direct(h, p, r), rtol=1e-14)
+
+
+def test_series_is_continuous():
+    h, p = 0.1, 1.0
+    r = 2.0 * p * SMALL_PECLET / h
+    below = stabilization_parameter(h, p, r * (1 - 1e-12))
+    above = stabilization_parameter(h, p, r * (1 + 1e-12))
+
+    assert np.isclose(below, above, rtol=1e-12)
+
+
+def test_limits():
+    h = np.array([0.1, 0.2])
+
+    assert np.allclose(stabilization_parameter(h, 2.0, 0.0), h**2 / 24.0)
+    assert np.allclose(stabilization_parameter(h, 0.0, 3.0), h / 6.0)
+
+
+def main():
+    test_matches_formula()
+    test_series_is_continuous()
+    test_limits()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
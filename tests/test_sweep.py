@@ -0,0 +1,102 @@
+import os
+import io
+import sys
+import csv
+import time
+import tempfile
+sys.path.insert(0, "..")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "OC_examples"))
+from sweep import read_grid, expand_grid, read_cases, sweep, COLUMNS
+
+
+CASE = {"NELEM": 20.0, "VELOCITY": 1.0, "DIFFUSION": 0.01, "REACTION": 0.0,
+        "SOURCE": 1.0}
+
+
+def write(text, suffix):
+    handle, filename = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(handle, 'w') as file:
+        file.write(text)
+    return filename
+
+
+def test_read_grid():
+    filename = write("NELEM = 10, 20\nVELOCITY = 1.0\n# comment\n"
+                     "DIFFUSION = 0.1, 0.01, 0.001,\nREACTION = 0.0\nSOURCE = 1.0\n",
+                     ".cfg")
+    grid = read_grid(filename)
+
+    assert grid["NELEM"] == [10.0, 20.0]
+    assert grid["DIFFUSION"] == [0.1, 0.01, 0.001]
+    assert len(grid) == 5
+
+    cases = expand_grid(grid)
+    assert len(cases) == 6
+    assert cases[0] == {"NELEM": 10.0, "VELOCITY": 1.0, "DIFFUSION": 0.1,
+                        "REACTION": 0.0, "SOURCE": 1.0}
+    assert cases[-1]["NELEM"] == 20.0 and cases[-1]["DIFFUSION"] == 0.001
+
+
+def test_expand_grid_missing():
+    try:
+        expand_grid({"NELEM": [10.0]})
+    except ValueError as error:
+        assert "VELOCITY" in str(error)
+    else:
+        assert False
+
+
+def test_read_cases():
+    filename = write("NELEM,VELOCITY,DIFFUSION,REACTION,SOURCE\n"
+                     "10,1.0,0.1,0.0,1.0\n40,-1.0,0.01,0.5,2.0\n", ".csv")
+    cases = read_cases(filename)
+
+    assert len(cases) == 2
+    assert cases[1] == {"NELEM": 40.0, "VELOCITY": -1.0, "DIFFUSION": 0.01,
+                        "REACTION": 0.5, "SOURCE": 2.0}
+
+
+def test_sweep():
+    cases = [dict(CASE, NELEM=n) for n in (10.0, 20.0, 40.0)]
+    # No elements fails in the worker, and is reported in STATUS.
+    cases.append(dict(CASE, NELEM=0.0))
+    output = io.StringIO()
+
+    results = sorted(sweep(cases, processes=2, output=output),
+                     key=lambda results: results["CASE"])
+
+    assert [results["CASE"] for results in results] == [0, 1, 2, 3]
+    assert [results["STATUS"] for results in results[:3]] == ["ok"] * 3
+    assert results[3]["STATUS"] != "ok"
+    assert results[2]["ERROR_VMS"] < results[0]["ERROR_VMS"]
+
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert len(rows) == 4
+    assert tuple(rows[0].keys()) == COLUMNS
+
+
+def test_sweep_early_exit():
+    # Closing the generator cancels the remaining cases.
+    cases = [dict(CASE, NELEM=1e5)] * 8
+    results = sweep(cases, processes=1, chunksize=1)
+
+    start = time.perf_counter()
+    next(results)
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results.close()
+    assert time.perf_counter() - start < max(2.0 * first, 1.0)
+
+
+def main():
+    test_read_grid()
+    test_expand_grid_missing()
+    test_read_cases()
+    test_sweep()
+    test_sweep_early_exit()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import os
+import sys
+import tempfile
+import numpy as np
+sys.path.insert(0, "..")
+from fem1d.mesh import Mesh
+from fem1d.model import Model
+from fem1d.vms_model import VMSModel
+from fem1d.transient import TransientSolver, load_snapshots
+
+
+def u_exact(x, t):
+    return np.sin(np.pi * x) * np.cos(t)
+
+
+def source(x, t):
+    # du/dt - u'' + u' for u_exact.
+    return np.sin(np.pi * x) * ( np.pi**2 * np.cos(t) - np.sin(t) ) + \
+        np.pi * np.cos(np.pi * x) * np.cos(t)
+
+
+def errors(method, theta, storage="banded"):
+    mesh = Mesh.uniform_grid(0, 1, 40)
+    result = []
+
+    for num_steps in (10, 20, 40):
+        model = Model(mesh, 1.0, 0.0, 1.0, 0.0, 1, 0.0, 0.0, 4, 3,
+                      storage=storage)
+        solver = TransientSolver(model, 1.0 / num_steps, method, theta,
+                                 source=source, u0=lambda x: u_exact(x, 0.0))
+        u = solver.run(num_steps)
+        result.append(np.abs(u - u_exact(mesh.dof_coordinates(3), 1.0)).max())
+
+    return np.log2(np.array(result[:-1]) / result[1:]), solver
+
+
+def test_mass_matrix():
+    mesh = Mesh.non_uniform_grid(0, 2, 5, 1.3)
+
+    for order in (1, 2):
+        model = Model(mesh, 1.0, 0.0, 0.0, 0.0, 4, 0.0, 0.0, order + 1, order)
+        M = model.mass_matrix().to_dense()
+        x = mesh.dof_coordinates(order)
+
+        # int 1 * 1 and int 1 * x over [0, 2].
+        assert np.isclose(M.sum(), 2.0)
+        assert np.isclose(np.dot(M, x).sum(), 2.0)
+
+
+def test_convergence_order():
+    rates, solver = errors("theta", 1.0)
+    assert np.all(rates > 0.9)
+    assert solver.num_factorizations == 1
+
+    rates, solver = errors("theta", 0.5, "dense")
+    assert np.all(rates > 1.9)
+
+    # BDF2 factorizes the backward Euler start and its own matrix.
+    rates, solver = errors("bdf2", None)
+    assert np.all(rates > 1.9)
+    assert solver.num_factorizations == 2
+
+
+def test_steady_state():
+    for model_class in (Model, VMSModel):
+        for bc_type in (1, 2):
+            model = model_class(Mesh.uniform_grid(0, 1, 50), 0.01, 0.5, 1.0,
+                                np.cos, bc_type, 0.2, 0.1)
+            steady = model_class(Mesh.uniform_grid(0, 1, 50), 0.01, 0.5, 1.0,
+                                 np.cos, bc_type, 0.2, 0.1)
+            steady.solve()
+
+            # tau tends to its steady value for large time steps.
+            u = TransientSolver(model, 1e6, "theta", 1.0).run(3)
+            assert np.allclose(u, steady.u)
+
+
+def test_model_unchanged():
+    # A steady solve after a transient run uses the steady tau.
+    model = VMSModel(Mesh.uniform_grid(0, 1, 20), 0.01, 0.0, 1.0, 1.0, 1, 0.0, 0.0)
+    model.solve()
+    steady = model.u.copy()
+
+    solver = TransientSolver(model, 0.01)
+    solver.run(2)
+
+    assert model.time_step is None
+    assert solver.model.time_step == 0.01
+
+    model.solve()
+    assert np.array_equal(model.u, steady)
+
+
+def test_snapshots():
+    model = VMSModel(Mesh.uniform_grid(0, 1, 20), 0.01, 0.0, 1.0, 1.0, 1,
+                     0.0, lambda t: np.sin(t))
+    solver = TransientSolver(model, 0.1, "bdf2")
+    filename = os.path.join(tempfile.mkdtemp(), "snapshots.npy")
+
+    u = solver.run(7, output=filename, every=3)
+    t, snapshots = load_snapshots(filename)
+
+    assert np.allclose(t, [0.0, 0.3, 0.6])
+    assert snapshots.shape == (3, 21)
+    assert np.isclose(snapshots[2, -1], np.sin(0.6))
+    assert np.isclose(solver.time, 0.7)
+    assert np.isclose(u[-1], np.sin(0.7))
+
+
+def main():
+    test_mass_matrix()
+    test_convergence_order()
+    test_steady_state()
+    test_model_unchanged()
+    test_snapshots()
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()